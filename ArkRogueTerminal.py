@@ -1,4 +1,5 @@
 import datetime
+import multiprocessing
 import os
 import sys
 import traceback
@@ -12,10 +13,13 @@ def error_log(msg):
         f.write(f"{msg}\n")
 
 
-try:
-    from main import main
+# 批量导入时头像在子进程中处理, 子进程会重新导入本文件, 不能启动界面
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    try:
+        from main import main
 
-    main()
-except Exception:
-    error_log(traceback.format_exc())
-    sys.exit(1)
+        main()
+    except Exception:
+        error_log(traceback.format_exc())
+        sys.exit(1)
@@ -0,0 +1,294 @@
+import argparse
+import os
+import time
+import unicodedata
+from typing import Iterable, Mapping
+
+import numpy as np
+from loguru import logger
+
+from exporter import iter_players
+from scoring import parse_entry
+
+KINDS = ("", "add", "sub", "multi")  # 计分明细类型编码, 与 parse_entry 一致
+
+
+class Codes:
+    # 字符串到整数编码, 按首次出现的顺序
+    def __init__(self):
+        self.index: dict[str, int] = {}
+        self.names: list[str] = []
+
+    def __call__(self, name: str) -> int:
+        code = self.index.get(name)
+        if code is None:
+            code = self.index[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def rule_of(text: str) -> str:
+    """
+    计分明细所属的规则, 即 add_score_change 的第一个词, 如 "紧急关卡" "禁用干员"
+    """
+    return text.split(" ", 1)[0]
+
+
+class RecordTable:
+    # 全部有效记录的列式存储: 每条记录一行 (score 等), 每条计分明细一行 (entry_*)
+    def __init__(self, players: Iterable):
+        self.players, self.operators, self.teams, self.rules = (
+            Codes(),
+            Codes(),
+            Codes(),
+            Codes(),
+        )
+        score, base, player, operator, team, stamp = [], [], [], [], [], []
+        entry_record, entry_rule, entry_kind, entry_value = [], [], [], []
+        parsed: dict[str, tuple[int, int, float]] = {}  # 相同的明细文本只解析一次
+        i = 0
+        for p in players:
+            player_code = self.players(p.name)
+            for record in p.records:
+                if not record.valid:
+                    continue
+                score.append(record.score)
+                base.append(record.base_score)
+                player.append(player_code)
+                operator.append(self.operators(record.start_operator))
+                team.append(self.teams(record.start_team))
+                stamp.append(record.time)
+                for text in record.data:
+                    entry = parsed.get(text)
+                    if entry is None:
+                        kind, value = parse_entry(text)
+                        entry = parsed[text] = (
+                            self.rules(rule_of(text)),
+                            KINDS.index(kind),
+                            -value if kind == "sub" else value,
+                        )
+                    entry_record.append(i)
+                    entry_rule.append(entry[0])
+                    entry_kind.append(entry[1])
+                    entry_value.append(entry[2])
+                i += 1
+        self.score = np.array(score, dtype=np.float64)
+        self.base_score = np.array(base, dtype=np.int64)
+        self.player = np.array(player, dtype=np.int32)
+        self.operator = np.array(operator, dtype=np.int32)
+        self.team = np.array(team, dtype=np.int32)
+        self.time = np.array(stamp, dtype=np.int64)
+        self.entry_record = np.array(entry_record, dtype=np.int32)
+        self.entry_rule = np.array(entry_rule, dtype=np.int32)
+        self.entry_kind = np.array(entry_kind, dtype=np.int8)
+        self.entry_value = np.array(entry_value, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.score)
+
+    @classmethod
+    def from_players(cls, players: Mapping) -> "RecordTable":
+        return cls(iter_players(players))
+
+
+def score_summary(table: RecordTable) -> dict:
+    if len(table) == 0:
+        return {"count": 0}
+    p25, median, p75 = np.percentile(table.score, [25, 50, 75])
+    return {
+        "count": len(table),
+        "mean": float(table.score.mean()),
+        "std": float(table.score.std()),
+        "min": float(table.score.min()),
+        "p25": float(p25),
+        "median": float(median),
+        "p75": float(p75),
+        "max": float(table.score.max()),
+    }
+
+
+def score_histogram(
+    table: RecordTable, bins: int = 10
+) -> tuple[np.ndarray, np.ndarray]:
+    if len(table) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.histogram(table.score, bins=bins)
+
+
+def group_stats(table: RecordTable, column: np.ndarray, names: list[str]) -> list[dict]:
+    """
+    按某一列分组统计记录数, 平均分和最高分, 按平均分从高到低排序
+    """
+    n = len(names)
+    if n == 0:
+        return []
+    count = np.bincount(column, minlength=n)
+    total = np.bincount(column, weights=table.score, minlength=n)
+    best = np.full(n, -np.inf)
+    np.maximum.at(best, column, table.score)
+    mean = total / np.maximum(count, 1)
+    order = np.argsort(-mean, kind="stable")
+    return [
+        {
+            "name": names[i],
+            "count": int(count[i]),
+            "mean": float(mean[i]),
+            "max": float(best[i]),
+        }
+        for i in order
+        if count[i]
+    ]
+
+
+def rule_stats(table: RecordTable) -> list[dict]:
+    """
+    每条规则的贡献: 出现次数, 涉及的记录数, 加减分之和, 乘算倍率之和,
+    以及使用/未使用该规则的记录的平均分, 按加减分之和从高到低排序
+    """
+    n = len(table.rules)
+    if n == 0:
+        return []
+    rule, kind, value = table.entry_rule, table.entry_kind, table.entry_value
+    is_multi = kind == KINDS.index("multi")
+    entries = np.bincount(rule, minlength=n)
+    points = np.bincount(rule, weights=np.where(is_multi, 0, value), minlength=n)
+    multi = np.bincount(rule, weights=np.where(is_multi, value, 0), minlength=n)
+    # 同一条记录多次使用同一规则只算一次
+    pairs = np.unique(rule.astype(np.int64) * len(table) + table.entry_record)
+    pair_rule, pair_record = pairs // len(table), pairs % len(table)
+    records = np.bincount(pair_rule, minlength=n)
+    score_with = np.bincount(
+        pair_rule, weights=table.score[pair_record], minlength=n
+    ) / np.maximum(records, 1)
+    total = table.score.sum()
+    without = len(table) - records
+    score_without = np.where(
+        without > 0,
+        (total - score_with * records) / np.maximum(without, 1),
+        np.nan,
+    )
+    order = np.argsort(-points, kind="stable")
+    return [
+        {
+            "rule": table.rules.names[i],
+            "entries": int(entries[i]),
+            "records": int(records[i]),
+            "points": float(points[i]),
+            "multi": float(multi[i]),
+            "score_with": float(score_with[i]),
+            "score_without": float(score_without[i]),
+        }
+        for i in order
+    ]
+
+
+def _num(value: float) -> str:
+    if np.isnan(value):
+        return "-"
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def _pad(text: str, width: int, right: bool = False) -> str:
+    # 按显示宽度对齐, 中文占两列
+    size = sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+    space = " " * max(width - size, 0)
+    return space + text if right else text + space
+
+
+def report(table: RecordTable, top: int = 20) -> str:
+    """
+    生成文本报表, 供终端内查看和命令行输出
+    """
+    summary = score_summary(table)
+    lines = [f"有效记录 {summary['count']} 条, 选手 {len(table.players)} 名"]
+    if not summary["count"]:
+        return lines[0]
+    lines.append(
+        "总分  平均 {mean}  标准差 {std}  最低 {min}  P25 {p25}  "
+        "中位数 {median}  P75 {p75}  最高 {max}".format(
+            **{k: _num(v) for k, v in summary.items() if k != "count"}
+        )
+    )
+
+    lines += ["", "== 总分分布 =="]
+    counts, edges = score_histogram(table)
+    width = max(counts.max(), 1)
+    for i, count in enumerate(counts):
+        bar = "#" * int(round(count / width * 40))
+        lines.append(f"{_num(edges[i]):>8} ~ {_num(edges[i + 1]):<8}{count:>5}  {bar}")
+
+    lines += ["", "== 规则贡献 =="]
+    lines.append(
+        _pad("规则", 16)
+        + "".join(
+            _pad(h, w, True)
+            for h, w in (
+                ("次数", 6),
+                ("记录", 6),
+                ("加减分", 10),
+                ("倍率", 8),
+                ("使用时均分", 12),
+                ("未使用均分", 12),
+            )
+        )
+    )
+    for row in rule_stats(table)[:top]:
+        lines.append(
+            f"{_pad(row['rule'], 16)}{row['entries']:>6}{row['records']:>6}"
+            f"{_num(row['points']):>10}{row['multi']:>8.2f}"
+            f"{_num(row['score_with']):>12}{_num(row['score_without']):>12}"
+        )
+
+    for title, column, codes in (
+        ("开局干员", table.operator, table.operators),
+        ("开局分队", table.team, table.teams),
+        ("选手", table.player, table.players),
+    ):
+        lines += ["", f"== {title} =="]
+        lines.append(
+            _pad("名称", 24)
+            + _pad("记录", 6, True)
+            + _pad("平均分", 10, True)
+            + _pad("最高分", 10, True)
+        )
+        for row in group_stats(table, column, codes.names)[:top]:
+            lines.append(
+                f"{_pad(row['name'], 24)}{row['count']:>6}"
+                f"{_num(row['mean']):>10}{_num(row['max']):>10}"
+            )
+    return "\n".join(lines)
+
+
+def analyze(players: Mapping) -> str:
+    t0 = time.perf_counter()
+    table = RecordTable.from_players(players)
+    t1 = time.perf_counter()
+    text = report(table)
+    t2 = time.perf_counter()
+    logger.info(
+        f"Analytics over {len(table)} records: "
+        f"load {t1 - t0:.3f}s, compute {t2 - t1:.3f}s"
+    )
+    return text
+
+
+def main():
+    from main import DATABASE_PATH, SNAPSHOT_PATH, open_players
+
+    parser = argparse.ArgumentParser(description="统计全部选手记录")
+    parser.add_argument(
+        "--db",
+        default=SNAPSHOT_PATH if os.path.exists(SNAPSHOT_PATH) else DATABASE_PATH,
+        help="选手快照或旧数据库的路径",
+    )
+    args = parser.parse_args()
+
+    with open_players(args.db) as db:
+        print(analyze(db))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-./.venv/Scripts/python.exe -m nuitka  --windows-disable-console --show-progress --standalone --enable-plugin=pyside6 --include-module=dbm --include-module=dbm.dumb --output-dir=build --windows-icon-from-ico=.\icon.png --jobs=16 .\ArkRogueTerminal.py --onefile-windows-splash-screen-image=booting.png --include-data-files=icon.png=icon.png --onefile --quiet --noinclude-qt-translations --noinclude-dlls=libQt6Charts* --noinclude-dlls=libQt6Quick3D* --noinclude-dlls=libQt6Sensors* --noinclude-dlls=libQt6Test* --noinclude-dlls=libQt6WebEngine* --noinclude-dlls=qt6web* --noinclude-dlls=qt6pdf*
+./.venv/Scripts/python.exe -m nuitka  --windows-disable-console --show-progress --standalone --enable-plugin=pyside6 --include-module=dbm --include-module=dbm.dumb --output-dir=build --windows-icon-from-ico=.\icon.png --jobs=16 .\ArkRogueTerminal.py --onefile-windows-splash-screen-image=booting.png --include-data-files=icon.png=icon.png --include-data-files=overlay.html=overlay.html --include-data-files=lower.html=lower.html --onefile --quiet --noinclude-qt-translations --noinclude-dlls=libQt6Charts* --noinclude-dlls=libQt6Quick3D* --noinclude-dlls=libQt6Sensors* --noinclude-dlls=libQt6Test* --noinclude-dlls=libQt6WebEngine* --noinclude-dlls=qt6web* --noinclude-dlls=qt6pdf*
 
-# ./.venv/Scripts/python.exe -m nuitka  --show-progress --standalone --enable-plugin=pyside6 --output-dir=build --windows-icon-from-ico=.\icon.png --jobs=16 .\ArkRogueTerminal.py --include-data-files=icon.png=icon.png --quiet --noinclude-qt-translations --noinclude-dlls=libQt6Charts* --noinclude-dlls=libQt6Quick3D* --noinclude-dlls=libQt6Sensors* --noinclude-dlls=libQt6Test* --noinclude-dlls=libQt6WebEngine* --noinclude-dlls=qt6web* --noinclude-dlls=qt6pdf* --include-module=dbm --include-module=dbm.dumb
+# ./.venv/Scripts/python.exe -m nuitka  --show-progress --standalone --enable-plugin=pyside6 --output-dir=build --windows-icon-from-ico=.\icon.png --jobs=16 .\ArkRogueTerminal.py --include-data-files=icon.png=icon.png --include-data-files=overlay.html=overlay.html --include-data-files=lower.html=lower.html --quiet --noinclude-qt-translations --noinclude-dlls=libQt6Charts* --noinclude-dlls=libQt6Quick3D* --noinclude-dlls=libQt6Sensors* --noinclude-dlls=libQt6Test* --noinclude-dlls=libQt6WebEngine* --noinclude-dlls=qt6web* --noinclude-dlls=qt6pdf* --include-module=dbm --include-module=dbm.dumb
 
 Move-Item -Path .\build\ArkRogueTerminal.exe -Destination .\ArkRogueTerminal.exe -Force
@@ -0,0 +1,198 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import time
+from typing import Iterable, Iterator, Literal, Mapping
+
+from loguru import logger
+from PySide6.QtCore import QThread, Signal
+
+from scoring import parse_entry
+
+CSV_FIELDS = [
+    "player",
+    "uuid",
+    "note",
+    "slot",
+    "valid",
+    "base_score",
+    "score",
+    "start_operator",
+    "start_team",
+    "time",
+    "time_str",
+    "entry_index",
+    "entry",
+    "entry_kind",
+    "entry_value",
+]
+
+
+def _time_str(timestamp: int) -> str:
+    if timestamp <= 0:
+        return ""
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def iter_players(players: Mapping) -> Iterator:
+    """
+    逐个产出玩家, players 可以是内存中的字典或打开的 shelve
+
+    只预先取出键名, 玩家对象按需读取, shelve 下每次只反序列化一个玩家
+    """
+    for name in list(players.keys()):
+        if name.startswith("__"):  # __version__ 等元数据
+            continue
+        try:
+            player = players[name]
+        except KeyError:  # 导出过程中被删除
+            continue
+        yield player
+
+
+def iter_records(players: Iterable, only_valid: bool = True) -> Iterator[dict]:
+    """
+    产出每条作战记录, 包含逐条计分明细
+    """
+    for player in players:
+        for slot, record in enumerate(player.records):
+            if only_valid and not record.valid:
+                continue
+            entries = []
+            for text in list(record.data):
+                kind, value = parse_entry(text)
+                entries.append({"text": text, "kind": kind, "value": value})
+            yield {
+                "player": player.name,
+                "uuid": player.uuid,
+                "note": player.note,
+                "slot": slot + 1,
+                "valid": record.valid,
+                "base_score": record.base_score,
+                "score": record.score,
+                "start_operator": record.start_operator,
+                "start_team": record.start_team,
+                "time": record.time,
+                "time_str": _time_str(record.time),
+                "entries": entries,
+            }
+
+
+def iter_csv_rows(records: Iterable[dict]) -> Iterator[dict]:
+    """
+    将记录展开为每条计分明细一行, 无明细的记录输出一行空明细
+    """
+    for record in records:
+        base = {k: v for k, v in record.items() if k != "entries"}
+        if not record["entries"]:
+            yield {
+                **base,
+                "entry_index": "",
+                "entry": "",
+                "entry_kind": "",
+                "entry_value": "",
+            }
+            continue
+        for i, entry in enumerate(record["entries"]):
+            yield {
+                **base,
+                "entry_index": i + 1,
+                "entry": entry["text"],
+                "entry_kind": entry["kind"],
+                "entry_value": entry["value"],
+            }
+
+
+def export_records(
+    players: Mapping,
+    path: str,
+    fmt: Literal["csv", "jsonl"] = "csv",
+    only_valid: bool = True,
+) -> int:
+    """
+    流式导出全部记录到 CSV / JSON Lines, 返回导出的记录数
+
+    先写入临时文件, 完成后再替换目标文件, 避免导出中断留下半个文件
+    """
+    records = iter_records(iter_players(players), only_valid)
+    count = 0
+    temp_path = path + ".part"
+    try:
+        if fmt == "csv":
+            # utf-8-sig 方便 Excel 直接打开中文
+            with open(temp_path, "w", newline="", encoding="utf-8-sig") as f:
+                writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+                writer.writeheader()
+                for record in records:
+                    count += 1
+                    writer.writerows(iter_csv_rows((record,)))
+        elif fmt == "jsonl":
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for record in records:
+                    count += 1
+                    f.write(json.dumps(record, ensure_ascii=False))
+                    f.write("\n")
+        else:
+            raise ValueError(f"Unknown export format: {fmt}")
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return count
+
+
+def guess_format(path: str) -> Literal["csv", "jsonl"]:
+    ext = os.path.splitext(path)[1].lower()
+    return "jsonl" if ext in (".jsonl", ".json", ".ndjson") else "csv"
+
+
+class ExportThread(QThread):
+    # 在后台线程导出, 不阻塞终端
+    exported = Signal(str, int, float)  # 路径, 记录数, 耗时
+    failed = Signal(str, str)  # 路径, 错误信息
+
+    def __init__(self, players: Mapping, path: str, fmt: str, only_valid: bool = True):
+        super().__init__()
+        self.players = players
+        self.path = path
+        self.fmt = fmt
+        self.only_valid = only_valid
+
+    def run(self):
+        t0 = time.perf_counter()
+        try:
+            count = export_records(self.players, self.path, self.fmt, self.only_valid)
+        except Exception as e:
+            logger.exception(f"Export to {self.path} failed")
+            self.failed.emit(self.path, str(e))
+            return
+        cost = time.perf_counter() - t0
+        logger.success(f"Exported {count} records to {self.path} in {cost:.3f}s")
+        self.exported.emit(self.path, count, cost)
+
+
+def main():
+    from main import DATABASE_PATH, SNAPSHOT_PATH, open_players
+
+    parser = argparse.ArgumentParser(description="导出全部选手记录")
+    parser.add_argument("output", help="输出文件, .csv 或 .jsonl")
+    parser.add_argument(
+        "--db",
+        default=SNAPSHOT_PATH if os.path.exists(SNAPSHOT_PATH) else DATABASE_PATH,
+        help="选手快照或旧数据库的路径",
+    )
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None)
+    parser.add_argument("--all", action="store_true", help="包括无效(空)记录")
+    args = parser.parse_args()
+
+    fmt = args.format or guess_format(args.output)
+    t0 = time.perf_counter()
+    with open_players(args.db) as db:
+        count = export_records(db, args.output, fmt, not args.all)
+    print(f"Exported {count} records to {args.output} in {time.perf_counter()-t0:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import ClassVar
+
+from loguru import logger
+
+HISTORY_VERSION = 1
+
+# 命令对记录的修改, 界面据此增量更新:
+# ("insert", 位置, 文本) / ("remove", 位置, 文本) / ("base", 基础分)
+# ("start", 属性名, 值) / ("reset",) 需要整体重新载入记录
+Change = tuple
+
+
+class HistoryError(Exception):
+    # 记录的当前状态与命令不一致, 无法撤销/重做
+    pass
+
+
+@dataclass
+class Command(ABC):
+    uuid: str  # 玩家UUID (昵称可能被修改)
+    slot: int  # 记录槽位
+    before: tuple[bool, int]  # 执行前 (valid, time)
+    after: tuple[bool, int]  # 执行后 (valid, time)
+
+    kind: ClassVar[str] = ""
+    registry: ClassVar[dict[str, type["Command"]]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        Command.registry[cls.kind] = cls
+
+    @property
+    def text(self) -> str:
+        return self.kind
+
+    def check(self, record, undo: bool):
+        """
+        执行前检查记录状态, 与命令不一致时抛出 HistoryError
+        """
+        pass
+
+    def list_change(self, undo: bool) -> Change | None:
+        """
+        执行前预告对记录条目的增删, 供列表模型发出通知
+        """
+        return None
+
+    def redo(self, record) -> list[Change]:
+        self.check(record, False)
+        changes = self._redo(record)
+        record.valid, record.time = self.after
+        return changes
+
+    def undo(self, record) -> list[Change]:
+        self.check(record, True)
+        changes = self._undo(record)
+        record.valid, record.time = self.before
+        return changes
+
+    @abstractmethod
+    def _redo(self, record) -> list[Change]:
+        pass
+
+    @abstractmethod
+    def _undo(self, record) -> list[Change]:
+        pass
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, **asdict(self)}
+
+    @staticmethod
+    def from_dict(data: dict) -> "Command":
+        data = dict(data)
+        cls = Command.registry[data.pop("kind")]
+        data["before"] = tuple(data["before"])
+        data["after"] = tuple(data["after"])
+        return cls(**data)
+
+
+def _check_entry(record, index: int, text: str):
+    if index >= len(record.data) or record.data[index] != text:
+        raise HistoryError(f"Entry {index} is not {text!r}")
+
+
+@dataclass
+class AddEntry(Command):
+    index: int = 0
+    entry: str = ""
+
+    kind: ClassVar[str] = "add_entry"
+
+    @property
+    def text(self) -> str:
+        return f"添加 {self.entry}"
+
+    def check(self, record, undo: bool):
+        if undo:
+            _check_entry(record, self.index, self.entry)
+
+    def list_change(self, undo: bool) -> Change:
+        return ("remove" if undo else "insert", self.index, self.entry)
+
+    def _redo(self, record) -> list[Change]:
+        record.data.insert(self.index, self.entry)
+        return [("insert", self.index, self.entry)]
+
+    def _undo(self, record) -> list[Change]:
+        record.data.pop(self.index)
+        return [("remove", self.index, self.entry)]
+
+
+@dataclass
+class RemoveEntry(Command):
+    index: int = 0
+    entry: str = ""
+
+    kind: ClassVar[str] = "remove_entry"
+
+    @property
+    def text(self) -> str:
+        return f"删除 {self.entry}"
+
+    def check(self, record, undo: bool):
+        if not undo:
+            _check_entry(record, self.index, self.entry)
+
+    def list_change(self, undo: bool) -> Change:
+        return ("insert" if undo else "remove", self.index, self.entry)
+
+    def _redo(self, record) -> list[Change]:
+        record.data.pop(self.index)
+        return [("remove", self.index, self.entry)]
+
+    def _undo(self, record) -> list[Change]:
+        record.data.insert(self.index, self.entry)
+        return [("insert", self.index, self.entry)]
+
+
+@dataclass
+class SetBaseScore(Command):
+    old: int = 0
+    new: int = 0
+
+    kind: ClassVar[str] = "base_score"
+
+    @property
+    def text(self) -> str:
+        return f"基础分 {self.old} -> {self.new}"
+
+    def _redo(self, record) -> list[Change]:
+        record.base_score = self.new
+        return [("base", self.new)]
+
+    def _undo(self, record) -> list[Change]:
+        record.base_score = self.old
+        return [("base", self.old)]
+
+
+@dataclass
+class SetStart(Command):
+    attr: str = "start_operator"  # start_operator / start_team
+    old: str = ""
+    new: str = ""
+
+    kind: ClassVar[str] = "start"
+
+    @property
+    def text(self) -> str:
+        name = "开局干员" if self.attr == "start_operator" else "开局队伍"
+        return f"{name} {self.old} -> {self.new}"
+
+    def _redo(self, record) -> list[Change]:
+        setattr(record, self.attr, self.new)
+        return [("start", self.attr, self.new)]
+
+    def _undo(self, record) -> list[Change]:
+        setattr(record, self.attr, self.old)
+        return [("start", self.attr, self.old)]
+
+
+@dataclass
+class ClearRecord(Command):
+    # 清零记录, 保存清零前的完整内容
+    data: list[str] = field(default_factory=list)
+    base_score: int = 0
+    score: float = 0
+    start_operator: str = "未知"
+    start_team: str = "未知"
+
+    kind: ClassVar[str] = "clear"
+
+    @property
+    def text(self) -> str:
+        return f"清零记录 {self.slot + 1}"
+
+    def check(self, record, undo: bool):
+        if undo and record.data:
+            raise HistoryError("Record is not empty")
+
+    def list_change(self, undo: bool) -> Change:
+        return ("reset",)
+
+    def _redo(self, record) -> list[Change]:
+        record.data.clear()
+        record.base_score = 0
+        record.score = 0
+        record.start_operator = "未知"
+        record.start_team = "未知"
+        return [("reset",)]
+
+    def _undo(self, record) -> list[Change]:
+        record.data.extend(self.data)
+        record.base_score = self.base_score
+        record.score = self.score
+        record.start_operator = self.start_operator
+        record.start_team = self.start_team
+        return [("reset",)]
+
+
+class CommandStack:
+    # 撤销/重做栈, 随数据库一起保存到磁盘
+    def __init__(self, limit: int = 200):
+        self.limit = limit
+        self.undo_stack: list[Command] = []
+        self.redo_stack: list[Command] = []
+        self.dirty = False
+
+    def can_undo(self) -> bool:
+        return bool(self.undo_stack)
+
+    def can_redo(self) -> bool:
+        return bool(self.redo_stack)
+
+    def push(self, cmd: Command):
+        """
+        记录一条已执行的命令, 清空重做栈
+        """
+        self.undo_stack.append(cmd)
+        if len(self.undo_stack) > self.limit:
+            del self.undo_stack[0]
+        self.redo_stack.clear()
+        self.dirty = True
+
+    def pop_undo(self) -> Command:
+        cmd = self.undo_stack.pop()
+        self.redo_stack.append(cmd)
+        self.dirty = True
+        return cmd
+
+    def pop_redo(self) -> Command:
+        cmd = self.redo_stack.pop()
+        self.undo_stack.append(cmd)
+        self.dirty = True
+        return cmd
+
+    def discard(self, cmd: Command):
+        """
+        丢弃无法执行的命令
+        """
+        for stack in (self.undo_stack, self.redo_stack):
+            stack[:] = [c for c in stack if c is not cmd]
+        self.dirty = True
+
+    def save(self, path: str):
+        if not self.dirty:
+            return
+        data = {
+            "version": HISTORY_VERSION,
+            "undo": [cmd.to_dict() for cmd in self.undo_stack],
+            "redo": [cmd.to_dict() for cmd in self.redo_stack],
+        }
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        self.dirty = False
+
+    def load(self, path: str) -> "CommandStack":
+        if not os.path.exists(path):
+            return self
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != HISTORY_VERSION:
+                raise ValueError(f"version {data.get('version')}")
+            self.undo_stack = [Command.from_dict(d) for d in data["undo"]]
+            self.redo_stack = [Command.from_dict(d) for d in data["redo"]]
+        except Exception as e:
+            logger.warning(f"History load failed, starting empty: {e}")
+            self.undo_stack, self.redo_stack = [], []
+        self.dirty = False
+        logger.info(
+            f"History loaded: {len(self.undo_stack)} undo, "
+            f"{len(self.redo_stack)} redo"
+        )
+        return self
@@ -0,0 +1,212 @@
+import csv
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import NamedTuple
+
+from loguru import logger
+from PySide6.QtCore import QThread, Signal
+
+# 名单的列名, 不区分大小写
+NAME_COLUMNS = ("name", "昵称", "干员", "选手", "player")
+NOTE_COLUMNS = ("note", "备注")
+AVATAR_COLUMNS = ("avatar", "头像")
+AVATAR_EXTS = ("jpg", "jpeg", "png")  # 与载入头像时的查找顺序一致
+AVATAR_MIN_SIZE = 64  # 小于这个尺寸的头像视为无效
+MAX_AVATAR_PIXELS = 50_000_000  # 超过则拒绝解码, 防止超大图片占满内存
+
+
+class RosterEntry(NamedTuple):
+    line: int  # 名单中的行号 (JSON 为序号), 用于报告错误
+    name: str
+    note: str
+    avatar: str  # 名单中指定的头像文件, 为空时按昵称查找
+
+
+class AvatarJob(NamedTuple):
+    name: str
+    source: str
+    outputs: tuple[tuple[str, int], ...]  # (输出路径, 边长)
+
+
+@dataclass
+class ImportResult:
+    players: list  # 待加入的选手对象, 由调用方创建
+    staged: dict[str, list[tuple[str, str]]]  # 选手名 -> [(暂存文件, 最终路径)]
+    failures: list[tuple[str, str]] = field(default_factory=list)  # (对象, 原因)
+    requested: int = 0  # 找到的头像数
+    avatars: int = 0  # 处理成功的头像数
+    cost: float = 0
+
+    def summary(self, added: int) -> str:
+        lines = [
+            f"新增干员 {added} 名, 头像 {self.avatars}/{self.requested} 张, "
+            f"耗时 {self.cost:.2f}s"
+        ]
+        if self.failures:
+            lines += ["", f"失败 {len(self.failures)} 项:"]
+            lines += [f"  {who}: {reason}" for who, reason in self.failures]
+        return "\n".join(lines)
+
+
+def pick_column(fields, aliases) -> str | None:
+    for name in fields or ():
+        if name and name.strip().casefold() in aliases:
+            return name
+    return None
+
+
+def read_rows(path: str) -> list[tuple[int, dict]]:
+    """
+    读取名单的行: CSV 需要表头; JSON 为对象或昵称的列表 (也可以是 {"players": [...]}), 或 JSON Lines
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            return [(reader.line_num, row) for row in reader]
+    with open(path, encoding="utf-8-sig") as f:
+        if ext in (".jsonl", ".ndjson"):
+            items = [json.loads(line) for line in f if line.strip()]
+        else:
+            items = json.load(f)
+    if isinstance(items, dict):
+        items = items.get("players", [])
+    if not isinstance(items, list):
+        raise ValueError("JSON 名单应为列表")
+    return [
+        (i + 1, item if isinstance(item, dict) else {"name": str(item)})
+        for i, item in enumerate(items)
+    ]
+
+
+def parse_roster(path: str) -> tuple[list[RosterEntry], list[tuple[str, str]]]:
+    """
+    解析名单, 返回有效的条目和被跳过的行 (空昵称, 名单内重复)
+    """
+    rows = read_rows(path)
+    fields = {key for _, row in rows for key in row}
+    name_key = pick_column(fields, NAME_COLUMNS)
+    if rows and name_key is None:
+        raise ValueError(f"名单缺少昵称列 ({', '.join(NAME_COLUMNS)})")
+    note_key = pick_column(fields, NOTE_COLUMNS)
+    avatar_key = pick_column(fields, AVATAR_COLUMNS)
+    entries, failures, seen = [], [], set()
+    for line, row in rows:
+        name = str(row.get(name_key) or "").strip()
+        if not name:
+            failures.append((f"第 {line} 行", "昵称为空"))
+            continue
+        if name in seen:
+            failures.append((name, f"第 {line} 行与前面的昵称重复"))
+            continue
+        seen.add(name)
+        note = str(row.get(note_key) or "").strip() if note_key else ""
+        avatar = str(row.get(avatar_key) or "").strip() if avatar_key else ""
+        entries.append(RosterEntry(line, name, note, avatar))
+    return entries, failures
+
+
+def find_avatar(folder: str, entry: RosterEntry) -> str:
+    """
+    名单指定的头像文件 (相对于头像文件夹), 否则按 昵称.jpg/jpeg/png 查找, 找不到返回空
+    """
+    if entry.avatar:
+        path = os.path.join(folder, entry.avatar)
+        return path if os.path.isfile(path) else ""
+    for ext in AVATAR_EXTS:
+        path = os.path.join(folder, f"{entry.name}.{ext}")
+        if os.path.isfile(path):
+            return path
+    return ""
+
+
+def process_avatar(job: AvatarJob) -> str | None:
+    """
+    在子进程中执行: 解码并校验头像, 居中裁剪为正方形后缩放到各个尺寸, 返回错误信息
+    """
+    try:
+        from PIL import Image, ImageOps
+
+        Image.MAX_IMAGE_PIXELS = MAX_AVATAR_PIXELS
+        with Image.open(job.source) as image:
+            image.verify()  # 检查文件是否完整, 之后需要重新打开
+        with Image.open(job.source) as image:
+            image = ImageOps.exif_transpose(image)
+            if min(image.size) < AVATAR_MIN_SIZE:
+                return f"头像太小 ({image.width}x{image.height})"
+            image = image.convert("RGBA")
+            for path, size in job.outputs:
+                square = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+                square.save(path, "PNG")
+    except Exception as e:
+        return f"头像无效: {e}"
+    return None
+
+
+class ImportThread(QThread):
+    # 在进程池中并行处理头像, 结果暂存, 由主线程一次性加入选手并移动头像
+    progress = Signal(int, int)  # 已完成, 总数
+    imported = Signal(object)  # ImportResult
+
+    def __init__(self, result: ImportResult, jobs: list[AvatarJob]):
+        super().__init__()
+        self.result = result
+        self.jobs = jobs
+
+    def run(self):
+        t0 = time.perf_counter()
+        self.result.requested = len(self.jobs)
+        errors = {}
+        try:
+            if self.jobs:
+                errors = self.process_all()
+        except Exception as e:
+            logger.exception("Avatar import failed")
+            errors = {job.name: f"处理失败: {e}" for job in self.jobs}
+        for job in self.jobs:
+            if job.name in errors:
+                self.result.failures.append((job.name, errors[job.name]))
+                self.result.staged.pop(job.name, None)
+            else:
+                self.result.avatars += 1
+        self.result.cost = time.perf_counter() - t0
+        logger.success(
+            f"Avatar import: {self.result.avatars}/{len(self.jobs)} processed "
+            f"in {self.result.cost:.2f}s"
+        )
+        self.imported.emit(self.result)
+
+    def process_all(self) -> dict[str, str]:
+        """
+        返回处理失败的头像, 进程池无法启动时在本线程中依次处理
+        """
+        errors, done = {}, set()
+        workers = min(len(self.jobs), os.cpu_count() or 1)
+        try:
+            # 与 Windows 一致使用 spawn, 不 fork 带有 Qt 线程的进程
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(workers, mp_context=context) as pool:
+                futures = {pool.submit(process_avatar, job): job for job in self.jobs}
+                for future in as_completed(futures):
+                    job = futures[future]
+                    error = future.result()
+                    if error:
+                        errors[job.name] = error
+                    done.add(job.name)
+                    self.progress.emit(len(done), len(self.jobs))
+        except Exception as e:
+            # process_avatar 自己捕获解码错误, 这里只会是进程池本身的问题
+            logger.warning(f"Process pool unavailable: {e}, processing serially")
+            for job in self.jobs:
+                if job.name in done:
+                    continue
+                error = process_avatar(job)
+                if error:
+                    errors[job.name] = error
+                done.add(job.name)
+                self.progress.emit(len(done), len(self.jobs))
+        return errors
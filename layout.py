@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Callable
+
+from loguru import logger
+
+MAIN_SCENE = "main"
+
+# 终端在主场景中控制的源, 连接OBS时检查是否存在
+REQUIRED_SOURCES = (
+    "text_score",
+    "text_player1",
+    "text_player2",
+    "text_player3",
+    "icon_player",
+    "icon_team",
+    "icon_operator",
+    "lower_group",
+    "lower_text_a",
+    "lower_text_b",
+    "lower_text_c",
+    "lower_text_d",
+    "lower_bk",
+)
+
+
+@dataclass(frozen=True)
+class Anchor:
+    # 文字的对齐中心, 终端根据文字宽度计算位置
+    mid_x: float
+    y: float
+
+
+# 场景中没有可推导的对齐信息时使用的对齐中心 (1920x1080 主场景的像素坐标)
+DEFAULT_ANCHORS = {
+    "text_score": Anchor(625, 963),
+    "text_player1": Anchor(130, 390),
+    "text_player2": Anchor(130, 377),  # 两行时的第一行, 只有一行时 y 见 PLAYER_Y_SINGLE
+    "text_player3": Anchor(130, 415),
+}
+PLAYER_Y_SINGLE = 395  # 选手名只占第二行时的Y
+PLAYER_X_MIN = 28  # 选手名的左换行边界
+SCORE_CHAR_WIDTH = 35  # 分数每个字符的宽度
+SCORE_DOT_WIDTH = 14  # 小数点比数字窄的宽度
+PLAYER_TEXT_SOURCES = ("text_player1", "text_player2", "text_player3")
+TEXT_LAYOUT_VERSION = 1  # 测量方式或选手名排版改变时加一, 旧的宽度缓存全部失效
+
+
+def split_name(name: str) -> tuple[str, str]:
+    """
+    选手名太长时分成两行
+    """
+    return name[: len(name) // 2 + 1], name[len(name) // 2 + 1 :]
+
+
+def player_text_jobs(name: str) -> list[tuple[str, str]]:
+    """
+    排版选手名可能需要测量的 (源, 文字)
+    """
+    text1, text2 = split_name(name)
+    return [
+        ("text_player1", name),
+        ("text_player2", name),
+        ("text_player2", text1),
+        ("text_player3", text2),
+    ]
+
+
+@dataclass
+class TextStyle:
+    # 影响文字宽度的全部因素: 输入类型, 除文字外的设置 (字体, 描边等) 和缩放
+    kind: str
+    settings: dict
+    scale: float = 1
+
+    @property
+    def key(self) -> str:
+        data = json.dumps(
+            [self.kind, self.settings, self.scale], sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()[:12]
+
+
+class TextLayoutCache:
+    # 文字在OBS中的显示宽度, 键为 (字体样式, 文字), 保存在数据文件夹中跨会话使用
+    # 字体样式由源的设置和缩放计算 (见 ReqClientEx.load_text_styles), 修改字体后自动失效
+    def __init__(self, path: str):
+        self.path = path
+        self.widths: dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.widths)
+
+    @staticmethod
+    def key(style: str, text: str) -> str:
+        return f"{style}:{text}"
+
+    def load(self) -> "TextLayoutCache":
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return self
+        if data.get("version") == TEXT_LAYOUT_VERSION:
+            self.widths = data.get("widths", {})
+        return self
+
+    def get(self, style: str, text: str) -> float | None:
+        return self.widths.get(self.key(style, text))
+
+    def put(self, style: str, text: str, width: float):
+        with self.lock:
+            self.widths[self.key(style, text)] = width
+            self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {"version": TEXT_LAYOUT_VERSION, "widths": dict(self.widths)}
+            self.dirty = False
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+
+@dataclass
+class SourceLayout:
+    name: str
+    scene: str  # 所在的场景, 分组内的源为分组名
+    item_id: int
+    kind: str = ""  # OBS 输入类型, 如 text_gdiplus
+    group: str = ""  # 所属分组
+    x: float = 0
+    y: float = 0
+    scale: float = 1
+    font: str = ""
+    font_size: int = 0
+    align: str = ""
+    extents_width: int = 0  # 开启文字框时的宽度, 否则为0
+
+
+@dataclass
+class SceneLayout:
+    # 预先计算的源表: 名字 -> 场景, 场景项ID, 分组, 位置, 字体
+    # 可以由场景集合 JSON (导入OBS的配置) 或连接后OBS返回的场景项列表生成
+    scene: str = MAIN_SCENE
+    sources: dict[str, SourceLayout] = field(default_factory=dict)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sources
+
+    def get(self, name: str) -> SourceLayout | None:
+        return self.sources.get(name)
+
+    def missing(self, required=REQUIRED_SOURCES) -> list[str]:
+        return [name for name in required if name not in self.sources]
+
+    def anchor(self, name: str) -> Anchor:
+        """
+        居中且开启文字框的文字可以由场景位置推导对齐中心, 否则使用默认值
+        """
+        source = self.sources.get(name)
+        if source is not None and source.align == "center" and source.extents_width:
+            return Anchor(
+                source.x + source.extents_width * source.scale / 2,
+                DEFAULT_ANCHORS[name].y if name in DEFAULT_ANCHORS else source.y,
+            )
+        return DEFAULT_ANCHORS[name]
+
+    @classmethod
+    def from_collection(cls, path: str, scene: str = MAIN_SCENE) -> "SceneLayout":
+        """
+        从OBS导出的场景集合 JSON 读取场景中的源, 分组内的源同时记录分组
+        """
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        inputs = {s["name"]: s for s in data["sources"]}
+        groups = {g["name"]: g for g in data.get("groups", [])}
+        layout = cls(scene)
+        if scene not in inputs:
+            logger.warning(f"Scene {scene} not found in {path}")
+            return layout
+
+        def add(item: dict, scene_name: str, group: str):
+            settings = inputs.get(item["name"], {}).get("settings", {})
+            font = settings.get("font", {})
+            layout.sources[item["name"]] = SourceLayout(
+                name=item["name"],
+                scene=scene_name,
+                item_id=item["id"],
+                kind=inputs.get(item["name"], {}).get("id", ""),
+                group=group,
+                x=item["pos"]["x"],
+                y=item["pos"]["y"],
+                scale=item["scale"]["x"],
+                font=font.get("face", ""),
+                font_size=font.get("size", 0),
+                align=settings.get("align", ""),
+                extents_width=settings.get("extents_cx", 0)
+                if settings.get("extents")
+                else 0,
+            )
+
+        for item in inputs[scene]["settings"]["items"]:
+            if item["name"] not in layout.sources:
+                add(item, scene, "")
+        for name, group in groups.items():
+            if name not in layout.sources:
+                continue
+            for item in group["settings"]["items"]:
+                add(item, name, name)
+        return layout
+
+    @classmethod
+    def from_scene_items(
+        cls,
+        scene: str,
+        items: list[dict],
+        group_items: Callable[[str], list[dict]],
+    ) -> "SceneLayout":
+        """
+        由 GetSceneItemList 的结果生成, 分组的成员通过 group_items 获取
+        """
+        layout = cls(scene)
+
+        def add(item: dict, scene_name: str, group: str):
+            transform = item.get("sceneItemTransform", {})
+            layout.sources[item["sourceName"]] = SourceLayout(
+                name=item["sourceName"],
+                scene=scene_name,
+                item_id=item["sceneItemId"],
+                kind=item.get("inputKind") or "",
+                group=group,
+                x=transform.get("positionX", 0),
+                y=transform.get("positionY", 0),
+                scale=transform.get("scaleX", 1),
+            )
+
+        for item in items:
+            add(item, scene, "")
+        for item in items:
+            if item.get("isGroup"):
+                for child in group_items(item["sourceName"]):
+                    add(child, item["sourceName"], item["sourceName"])
+        return layout
+
+    def merge_styles(self, collection: "SceneLayout"):
+        """
+        OBS 返回的场景项不含字体, 从场景集合中补全
+        """
+        for name, source in self.sources.items():
+            saved = collection.get(name)
+            if saved is None:
+                continue
+            source.font = saved.font
+            source.font_size = saved.font_size
+            source.align = saved.align
+            source.extents_width = saved.extents_width
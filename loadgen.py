@@ -0,0 +1,314 @@
+"""
+计分压力测试: 在 offscreen 模式下驱动真实的 MainWindow, 按设定的频率模拟直播中的操作
+
+    python loadgen.py --duration 30 --score-rate 5 --toast-storm 20
+
+数据写入临时文件夹, 不影响 ark_data 中的正式数据
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np  # noqa: E402
+from loguru import logger  # noqa: E402
+from PySide6.QtCore import QTimer  # noqa: E402
+from PySide6.QtWidgets import QApplication, QMessageBox  # noqa: E402
+
+import main  # noqa: E402
+from overlay import OverlayServer  # noqa: E402
+
+HEARTBEAT_INTERVAL = 0.01  # UI线程心跳间隔(s)
+STALL_THRESHOLD = 0.05  # 心跳延迟超过这个时间记为卡顿(s)
+
+SCORE_ACTIONS = [
+    ("临时招募", "六星干员", 50),
+    ("临时招募", "五星干员", 20),
+    ("紧急关卡", "冰海疑影", 20),
+    ("隐藏BOSS", "BOSS-呼吸", 50),
+    ("击杀狗/鸭/熊", "", 10),
+    ("自定义", "失误", -20),
+]
+
+
+def use_data_dir(path: str):
+    """
+    把终端的数据文件夹指向 path, 资源文件夹保持不变
+    """
+    main.DATA_PATH = path
+    main.AVATAR_PATH = os.path.join(path, main.AVATAR_DIR_NAME)
+    main.OBS_TEMP_PATH = os.path.join(path, main.OBS_TEMP_DIR_NAME)
+    main.ICON_CACHE_PATH = os.path.join(main.OBS_TEMP_PATH, main.ICON_CACHE_DIR_NAME)
+    main.DATABASE_PATH = os.path.join(path, main.DATABASE_NAME)
+    main.DATABASE_BACKUP_PATH = os.path.join(path, main.DATABASE_BACKUP_NAME)
+    main.SNAPSHOT_PATH = os.path.join(path, main.SNAPSHOT_NAME)
+    main.LOGFILE_PATH = os.path.join(path, main.LOGFILE_NAME)
+    main.RESOURCE_MANIFEST_PATH = os.path.join(path, main.RESOURCE_MANIFEST_NAME)
+    main.HISTORY_PATH = os.path.join(path, main.HISTORY_NAME)
+    main.SYNC_STATE_PATH = os.path.join(path, main.SYNC_STATE_NAME)
+    main.TEXT_LAYOUT_PATH = os.path.join(path, main.TEXT_LAYOUT_NAME)
+    for p in (main.AVATAR_PATH, main.OBS_TEMP_PATH):
+        os.makedirs(p, exist_ok=True)
+
+
+def percentiles(values: list[float]) -> str:
+    if not values:
+        return "n=0"
+    a = np.array(values) * 1000
+    p50, p95, p99 = np.percentile(a, [50, 95, 99])
+    return (
+        f"n={len(a)} p50={p50:.2f}ms p95={p95:.2f}ms "
+        f"p99={p99:.2f}ms max={a.max():.2f}ms"
+    )
+
+
+class TimedOverlay(OverlayServer):
+    # 推送的消息带上触发它的操作的开始时间, 用于计算端到端延迟
+    action_started = 0.0
+
+    def push(self, msg: dict):
+        super().push({**msg, "t": self.action_started})
+
+
+class OverlayProbe(threading.Thread):
+    # 模拟 OBS 浏览器源, 记录每条消息从操作开始到页面收到的延迟
+    def __init__(self, url: str):
+        super().__init__(daemon=True)
+        import websocket  # obsws-python 的依赖
+
+        self.ws = websocket.create_connection(url)
+        self.latency: dict[str, list[float]] = {}
+
+    def run(self):
+        import json
+
+        try:
+            while True:
+                msg = json.loads(self.ws.recv())
+                if "t" in msg:
+                    delay = time.perf_counter() - msg["t"]
+                    self.latency.setdefault(msg["type"], []).append(delay)
+        except Exception:
+            pass
+
+    def close(self):
+        self.ws.close()
+
+
+class LoadGenerator:
+    def __init__(self, win: main.MainWindow, args: argparse.Namespace):
+        self.win = win
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.action_time: dict[str, list[float]] = {}
+        self.heartbeat_delay: list[float] = []
+        self.schedule = self.build_schedule()
+        self.next_index = 0
+        self.lateness: list[float] = []  # 操作实际执行时间比计划晚多少
+
+    def build_schedule(self) -> list[tuple[float, str]]:
+        """
+        按泊松过程生成操作时间表, 弹幕风暴为短时间内连续计分
+        """
+        args = self.args
+        events = []
+        for name, rate in (
+            ("score", args.score_rate),
+            ("switch_player", args.switch_rate),
+            ("switch_record", args.switch_rate),
+            ("clear", args.clear_rate),
+            ("undo", args.undo_rate),
+        ):
+            t = 0.0
+            while rate > 0:
+                t += self.rng.expovariate(rate)
+                if t >= args.duration:
+                    break
+                events.append((t, name))
+        if args.toast_storm:
+            t = 0.0
+            while True:
+                t += args.storm_interval
+                if t >= args.duration:
+                    break
+                for i in range(args.toast_storm):
+                    events.append((t + i * 0.01, "score"))
+        events.sort()
+        return events
+
+    def setup_players(self):
+        win = self.win
+        for i in range(self.args.players):
+            name = f"压力测试选手{i + 1:03d}"
+            if name in win.players:
+                continue
+            win.players[name] = main.Player(
+                name,
+                main.DEFAULT_NOTE,
+                main.generate_uuid(name),
+                main.RecordSlots(main.MAX_SLOT),
+            )
+            win.index().add(win.players[name])
+            win.comboBoxSelPlayer.addItem(name)
+
+    def run_action(self, name: str):
+        win = self.win
+        if win.overlay is not None:
+            win.overlay.action_started = time.perf_counter()
+        t0 = time.perf_counter()
+        if name == "score":
+            info1, info2, change = self.rng.choice(SCORE_ACTIONS)
+            win.add_score_change(info1, info2, change)
+        elif name == "switch_player":
+            win.comboBoxSelPlayer.setCurrentIndex(
+                self.rng.randrange(win.comboBoxSelPlayer.count())
+            )
+        elif name == "switch_record":
+            win.comboBoxSelRecord.setCurrentIndex(self.rng.randrange(main.MAX_SLOT))
+        elif name == "clear":
+            win.on_pushButtonClrRecord_clicked()
+        elif name == "undo":
+            win.undo()
+        self.action_time.setdefault(name, []).append(time.perf_counter() - t0)
+
+    def tick(self):
+        """
+        执行所有到期的操作, 再预约下一个操作
+        """
+        now = time.perf_counter() - self.t0
+        while self.next_index < len(self.schedule):
+            at, name = self.schedule[self.next_index]
+            if at > now:
+                break
+            self.lateness.append(now - at)
+            self.run_action(name)
+            self.next_index += 1
+            now = time.perf_counter() - self.t0
+        if self.next_index < len(self.schedule):
+            delay = self.schedule[self.next_index][0] - now
+            QTimer.singleShot(max(int(delay * 1000), 0), self.tick)
+        else:
+            QTimer.singleShot(500, self.finish)  # 等待最后的推送到达
+
+    def heartbeat(self):
+        now = time.perf_counter()
+        self.heartbeat_delay.append(now - self.last_beat - HEARTBEAT_INTERVAL)
+        self.last_beat = now
+
+    def timed_save(self):
+        t0 = time.perf_counter()
+        self.original_save()
+        self.action_time.setdefault("save_database", []).append(
+            time.perf_counter() - t0
+        )
+
+    def start(self):
+        # 计时保存数据库, 缩短自动保存间隔以覆盖保存的开销
+        self.original_save = self.win.save_database
+        self.win.db_timer.timeout.disconnect()
+        self.win.db_timer.timeout.connect(self.timed_save)
+        self.win.db_timer.start(int(self.args.save_interval * 1000))
+
+        self.beat_timer = QTimer()
+        self.beat_timer.timeout.connect(self.heartbeat)
+        self.last_beat = time.perf_counter()
+        self.beat_timer.start(int(HEARTBEAT_INTERVAL * 1000))
+        self.t0 = time.perf_counter()
+        QTimer.singleShot(0, self.tick)
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.t0
+        self.beat_timer.stop()
+        QApplication.instance().quit()
+
+    def report(self, probe: OverlayProbe | None) -> str:
+        stalls = [d for d in self.heartbeat_delay if d > STALL_THRESHOLD]
+        lines = [
+            f"Executed {self.next_index} actions in {self.elapsed:.2f}s "
+            f"({self.next_index / self.elapsed:.1f}/s)",
+            f"UI stalls > {STALL_THRESHOLD * 1000:.0f}ms: {len(stalls)}, "
+            f"total {sum(stalls):.3f}s, "
+            f"max {max(self.heartbeat_delay, default=0) * 1000:.1f}ms",
+            f"Schedule lateness: {percentiles(self.lateness)}",
+            "",
+            "UI thread time per action:",
+        ]
+        for name, values in sorted(self.action_time.items()):
+            lines.append(f"  {name:<16}{percentiles(values)}")
+        if probe is not None:
+            lines += ["", "Action -> overlay page latency:"]
+            for name, values in sorted(probe.latency.items()):
+                lines.append(f"  {name:<16}{percentiles(values)}")
+        if self.win.connected:
+            pending = self.win.obs.pending()
+            lines += ["", f"OBS worker actions still queued: {pending}"]
+        return "\n".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="计分压力测试")
+    parser.add_argument("--duration", type=float, default=20, help="测试时长(s)")
+    parser.add_argument("--players", type=int, default=50, help="选手数")
+    parser.add_argument("--score-rate", type=float, default=5, help="计分 次/s")
+    parser.add_argument("--switch-rate", type=float, default=0.5, help="切换 次/s")
+    parser.add_argument("--clear-rate", type=float, default=0.05, help="清零 次/s")
+    parser.add_argument("--undo-rate", type=float, default=0.2, help="撤销 次/s")
+    parser.add_argument("--toast-storm", type=int, default=20, help="每次风暴的弹幕数")
+    parser.add_argument("--storm-interval", type=float, default=5, help="风暴间隔(s)")
+    parser.add_argument("--save-interval", type=float, default=2, help="保存间隔(s)")
+    parser.add_argument(
+        "--obs", default="", help="同时压测OBS, 如 127.0.0.1:4455, 多个用逗号分隔"
+    )
+    parser.add_argument("--no-overlay", action="store_true", help="不启动网页叠加层")
+    parser.add_argument("--data", default="", help="数据文件夹, 默认使用临时文件夹")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def run():
+    args = parse_args()
+    data_dir = args.data or tempfile.mkdtemp(prefix="ark_loadgen_")
+    use_data_dir(data_dir)
+    logger.remove()
+    logger.add(main.LOGFILE_PATH, level="INFO", enqueue=True)
+    # 所有确认对话框直接选"是"
+    QMessageBox.question = staticmethod(lambda *a, **k: QMessageBox.Yes)
+    QMessageBox.information = staticmethod(lambda *a, **k: QMessageBox.Ok)
+    QMessageBox.warning = staticmethod(lambda *a, **k: QMessageBox.Ok)
+
+    app = QApplication([])
+    win = main.MainWindow()
+    win.show()
+    win.checkBoxEnLowers.setChecked(True)
+
+    probe = None
+    if not args.no_overlay:
+        win.overlay = TimedOverlay([data_dir, main.RESOURCE_PATH], port=0)
+        win.overlay.start()
+        probe = OverlayProbe(win.overlay.url.replace("http", "ws") + "ws")
+        probe.start()
+    if args.obs:
+        win.lineEditServer.setText(args.obs)
+        win.on_pushButtonConnect_clicked()
+
+    gen = LoadGenerator(win, args)
+    gen.setup_players()
+    logger.info(f"Load generator: {len(gen.schedule)} actions over {args.duration}s")
+    gen.start()
+    app.exec()
+
+    print(gen.report(probe))
+    print(f"Data and log in {data_dir}")
+    if probe is not None:
+        probe.close()
+    win.close()
+    logger.remove()
+
+
+if __name__ == "__main__":
+    run()
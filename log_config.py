@@ -0,0 +1,80 @@
+import datetime
+import logging
+import os
+import sys
+
+from loguru import logger
+
+from log_redirect import redirect_logging
+
+
+class SizeTimeRotation:
+    # 日志文件超过指定大小或距上次轮转超过指定时间时轮转
+    def __init__(self, max_size: int, interval: datetime.timedelta):
+        self.max_size = max_size
+        self.interval = interval
+        self.next_time = None
+
+    @staticmethod
+    def created_time(file) -> datetime.datetime:
+        """
+        日志文件的创建时间, Windows 下为 st_ctime, 有 st_birthtime 的系统优先使用
+        """
+        stat = os.stat(file.name)
+        created = getattr(stat, "st_birthtime", stat.st_ctime)
+        return datetime.datetime.fromtimestamp(created).astimezone()
+
+    def __call__(self, message, file) -> bool:
+        record_time = message.record["time"]
+        if self.next_time is None:
+            # 重启后沿用当前文件的创建时间, 否则频繁重启时永远不会按时间轮转
+            try:
+                self.next_time = self.created_time(file) + self.interval
+            except OSError:
+                self.next_time = record_time + self.interval
+        if record_time >= self.next_time:
+            self.next_time = record_time + self.interval
+            return True
+        file.seek(0, 2)
+        if file.tell() + len(message) > self.max_size:
+            self.next_time = record_time + self.interval
+            return True
+        return False
+
+
+def setup_logging(
+    path: str,
+    console: bool = False,
+    max_size: int = 10 * 1024 * 1024,
+    interval: datetime.timedelta = datetime.timedelta(days=1),
+    retention: int = 20,
+    serialize: bool = False,
+):
+    """
+    配置日志: 异步写入文件, 按大小/时间轮转, 旧日志压缩为 zip 并保留最近 retention 个
+
+    所有 sink 都使用 enqueue, 调用方只需格式化并入队, 写文件在后台线程完成
+    serialize 为 True 时文件日志为每行一个 JSON 的结构化格式
+    """
+    logger.remove()
+    logger.add(
+        path,
+        level="DEBUG",
+        enqueue=True,
+        rotation=SizeTimeRotation(max_size, interval),
+        retention=retention,
+        compression="zip",
+        serialize=serialize,
+        encoding="utf-8",
+    )
+    if console:
+        logger.add(sys.stderr, level="DEBUG", enqueue=True)
+    redirect_logging("INFO")
+
+
+def shutdown_logging():
+    """
+    等待队列中的日志写完并关闭文件
+    """
+    logging.shutdown()  # 关闭转发处理器, 汇报还没有汇报的丢弃数
+    logger.remove()
@@ -1,29 +1,116 @@
 import inspect
 import logging
 import re
+import threading
+import time
 
 from loguru import logger
 
+# remove timestamp like [19/Sep/2023 14:08:16] and terminal color code
+CLEAN_PATTERN = re.compile(r"\[\d+/\w+/\d{4} \d{2}:\d{2}:\d{2}\] |\x1b\[\d+(?:;\d+)?m")
+
+RATE_LIMIT = 20  # 每个logger每个时间窗口最多转发的条数 (ERROR及以上不限)
+RATE_WINDOW = 1.0  # 限流时间窗口(s)
+
 
 class InterceptHandler(logging.Handler):
-    def emit(self, record: logging.LogRecord) -> None:
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.level_cache: dict[str, str | int] = {}  # levelname -> loguru level
+        self.depth_cache: dict[tuple, int] = {}  # 调用位置 -> 栈深度
+        self.rate_state: dict[str, list] = {}  # logger -> [窗口开始时间, 条数, 丢弃数]
+        self.flusher: threading.Thread = None  # 第一次丢弃时启动, 定时汇报丢弃数
+        self.stopped = threading.Event()
+
+    def loguru_level(self, record: logging.LogRecord) -> str | int:
         # Get corresponding Loguru level if it exists.
+        level = self.level_cache.get(record.levelname)
+        if level is None:
+            try:
+                level = logger.level(record.levelname).name
+            except ValueError:
+                level = record.levelno
+            self.level_cache[record.levelname] = level
+        return level
+
+    def rate_limited(self, record: logging.LogRecord) -> bool:
+        """
+        按logger限流, 被丢弃的条数由后台线程在窗口结束后汇报 (见 flush_suppressed)
+        """
+        if record.levelno >= logging.ERROR:
+            return False
+        now = time.monotonic()
+        state = self.rate_state.get(record.name)
+        if state is None or now - state[0] >= RATE_WINDOW:
+            if state is not None and state[2]:
+                logger.warning(f"Suppressed {state[2]} log records from {record.name}")
+            self.rate_state[record.name] = [now, 1, 0]
+            return False
+        state[1] += 1
+        if state[1] > RATE_LIMIT:
+            state[2] += 1
+            if self.flusher is None:
+                self.flusher = threading.Thread(
+                    target=self.flush_loop, name="log-rate-flush", daemon=True
+                )
+                self.flusher.start()
+            return True
+        return False
+
+    def flush_loop(self):
+        while not self.stopped.wait(RATE_WINDOW):
+            self.flush_suppressed()
+
+    def flush_suppressed(self, force: bool = False):
+        """
+        汇报时间窗口已经结束的丢弃条数, force 为真时汇报全部 (关闭时)
+        不等下一条日志, 否则日志停止后最后一个窗口的丢弃数永远不会出现
+        """
+        now = time.monotonic()
+        reports = []
+        # emit 在处理器的锁内调用, 同一把锁保护限流状态
+        self.acquire()
         try:
-            level = logger.level(record.levelname).name
-        except ValueError:
-            level = record.levelno
-
-        # Find caller from where originated the logged message.
-        frame, depth = inspect.currentframe(), 0
-        while frame and (depth == 0 or frame.f_code.co_filename == logging.__file__):
-            frame = frame.f_back
-            depth += 1
+            for name, state in self.rate_state.items():
+                if state[2] and (force or now - state[0] >= RATE_WINDOW):
+                    reports.append((name, state[2]))
+                    state[2] = 0
+        finally:
+            self.release()
+        for name, count in reports:
+            logger.warning(f"Suppressed {count} log records from {name}")
+
+    def close(self):
+        self.stopped.set()
+        self.flush_suppressed(force=True)
+        super().close()
+
+    def caller_depth(self, record: logging.LogRecord) -> int:
+        """
+        查找日志调用位置的栈深度, 同一调用位置的深度固定, 只需要查找一次
+        """
+        key = (record.pathname, record.lineno, record.funcName)
+        depth = self.depth_cache.get(key)
+        if depth is None:
+            # Find caller from where originated the logged message.
+            frame, depth = inspect.currentframe().f_back, 0  # 从 emit 开始
+            while frame and (
+                depth == 0 or frame.f_code.co_filename == logging.__file__
+            ):
+                frame = frame.f_back
+                depth += 1
+            self.depth_cache[key] = depth
+        return depth
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # 先过滤, 再格式化
+        if self.rate_limited(record):
+            return
+        level = self.loguru_level(record)
+        depth = self.caller_depth(record)
         message = record.getMessage()
-        # remove timestamp like [19/Sep/2023 14:08:16]
-        message = re.sub(r"\[\d+/\w+/\d{4} \d{2}:\d{2}:\d{2}\] ", "", message)
-        # remove terminal color code
-        message = re.sub(r"\x1b\[\d+m", "", message)
-        message = re.sub(r"\x1b\[\d+;\d+m", "", message)
+        if "[" in message or "\x1b" in message:
+            message = CLEAN_PATTERN.sub("", message)
         logger.opt(depth=depth, exception=record.exc_info).log(level, message)
 
 
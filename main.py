@@ -1,38 +1,81 @@
+from startup import timeline  # 最先导入, 作为启动计时起点
+
 import datetime
 import os
-import shelve
 import sys
 import tempfile
 import uuid
 from copy import copy
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
 from loguru import logger
 from PySide6.QtCore import QFile, QPoint, Qt, QTimer, Slot
-from PySide6.QtGui import QCloseEvent, QIcon, QPixmap
+from PySide6.QtGui import QCloseEvent, QIcon, QKeySequence, QPixmap
 from PySide6.QtWidgets import (
     QApplication,
     QCheckBox,
+    QFileDialog,
     QInputDialog,
+    QLineEdit,
     QMainWindow,
     QMenu,
     QMessageBox,
 )
 
-from log_redirect import redirect_logging
-from ui import MainUITemplate
-from utils import ReqClientExQThread
+from history import (
+    AddEntry,
+    ClearRecord,
+    Command,
+    CommandStack,
+    HistoryError,
+    RemoveEntry,
+    SetBaseScore,
+    SetStart,
+)
+from layout import TextLayoutCache
+from log_config import setup_logging, shutdown_logging
+from resources import (
+    IconCache,
+    IconPrepareThread,
+    ResourceManifest,
+    fill_combobox,
+    set_combobox_icons,
+)
+from scoring import ScoreAggregate, calc_score, format_score
+from ui import (
+    MainUITemplate,
+    PlayerFinder,
+    RecordListModel,
+    TextReportDialog,
+    count_widgets,
+)
+
+# 以下模块在首次绘制前用不到, 在使用时才导入 (见 main 和各个槽函数)
+if TYPE_CHECKING:
+    from exporter import ExportThread
+    from importer import ImportResult, ImportThread
+    from overlay import OverlayServer
+    from search import PlayerIndex
+    from snapshot import PlayerRow, PlayerStore
+    from stall_watchdog import StallWatchdog
+    from sync import SyncClient, SyncHub, SyncState
+    from utils import ReqClientExGroup
 
-"""
-qdarktheme import after QT
-"""
-import qdarktheme
+timeline.mark("import")
 
 UUID_NAMESPACE = uuid.UUID("1b671a64-40d5-491e-99b0-da01ff1f3341")
 VERSION = "1.0.0"
 AVATAR_SIZE = 140  # 软件内头像大小
 OBS_AVATAR_SIZE = 180  # OBS头像大小
+OBS_OPERATOR_ICON_SIZE = 180  # OBS开局干员图标大小
+OBS_TEAM_ICON_SIZE = 160  # OBS开局队伍图标大小
+ICON_THUMB_SIZE = 24  # 软件内下拉框缩略图大小
 DARK_THEME = True  # 是否使用暗色主题
+LOG_MAX_SIZE = 10 * 1024 * 1024  # 单个日志文件最大大小
+LOG_ROTATION_INTERVAL = datetime.timedelta(days=1)  # 日志轮转间隔
+LOG_RETENTION = 20  # 保留的历史日志数 (zip压缩)
+LOG_JSON = False  # 是否以JSON格式记录日志
 MAX_SLOT = 16  # 最大记录槽位
 DEFAULT_NOTE = "无备注信息"  # 默认备注信息
 DATA_DIR_NAME = "ark_data"  # 数据文件夹
@@ -40,14 +83,23 @@ RESOURCE_DIR_NAME = "resource"  # 资源文件夹
 
 AVATAR_DIR_NAME = "avatar"  # 头像文件夹
 OBS_TEMP_DIR_NAME = "obstemp"  # OBS素材临时文件夹
+ICON_CACHE_DIR_NAME = "icons"  # 预缩放图标缓存文件夹 (位于OBS素材临时文件夹内)
 START_OPERATOR_DIR_NAME = "operator"  # 开局干员文件夹
 START_TEAM_DIR_NAME = "team"  # 开局队伍文件夹
 OBS_TOAST_PLUS_IMG_NAME = "plus.png"  # OBS弹幕加分图片
 OBS_TOAST_MINUS_IMG_NAME = "minus.png"  # OBS弹幕减分图片
+SCENE_COLLECTION_NAME = "那啥杯直播间.json"  # 导入OBS的场景集合
 LOGFILE_NAME = "log.txt"  # 日志文件名
+RESOURCE_MANIFEST_NAME = "resource_manifest.json"  # 资源清单缓存
 DATABASE_NAME = "players.db"  # 数据库前缀
 DATABASE_BACKUP_NAME = "players_backup.db"  # 数据库备份前缀
+SNAPSHOT_NAME = "players.snap"  # 选手快照, 取代旧的 shelve 数据库
 OBS_TOAST_DURATION = 2  # OBS弹幕显示时间
+HISTORY_NAME = "history.json"  # 撤销/重做记录文件名
+HISTORY_LIMIT = 200  # 最多可撤销的操作数
+SYNC_STATE_NAME = "sync_state.json"  # 多终端同步状态文件名
+TEXT_LAYOUT_NAME = "text_layout.json"  # 选手名在OBS中的宽度缓存
+PROFILE_NAME = "profile_{:%Y%m%d_%H%M%S}.folded"  # 性能采样文件名 (折叠栈格式)
 
 PATH = os.path.dirname(os.path.abspath(__file__))  # 打包后的临时路径
 ARGV_PATH = os.path.dirname(os.path.abspath(sys.argv[0]))  # 实际上的运行路径
@@ -57,36 +109,49 @@ RESOURCE_PATH = os.path.join(ARGV_PATH, RESOURCE_DIR_NAME)
 
 AVATAR_PATH = os.path.join(DATA_PATH, AVATAR_DIR_NAME)
 OBS_TEMP_PATH = os.path.join(DATA_PATH, OBS_TEMP_DIR_NAME)
+ICON_CACHE_PATH = os.path.join(OBS_TEMP_PATH, ICON_CACHE_DIR_NAME)
 DATABASE_PATH = os.path.join(DATA_PATH, DATABASE_NAME)
 DATABASE_BACKUP_PATH = os.path.join(DATA_PATH, DATABASE_BACKUP_NAME)
+SNAPSHOT_PATH = os.path.join(DATA_PATH, SNAPSHOT_NAME)
 LOGFILE_PATH = os.path.join(DATA_PATH, LOGFILE_NAME)
+RESOURCE_MANIFEST_PATH = os.path.join(DATA_PATH, RESOURCE_MANIFEST_NAME)
+HISTORY_PATH = os.path.join(DATA_PATH, HISTORY_NAME)
+SYNC_STATE_PATH = os.path.join(DATA_PATH, SYNC_STATE_NAME)
+TEXT_LAYOUT_PATH = os.path.join(DATA_PATH, TEXT_LAYOUT_NAME)
 START_OPERATOR_PATH = os.path.join(RESOURCE_PATH, START_OPERATOR_DIR_NAME)
+SCENE_COLLECTION_PATH = os.path.join(RESOURCE_PATH, SCENE_COLLECTION_NAME)
 START_TEAM_PATH = os.path.join(RESOURCE_PATH, START_TEAM_DIR_NAME)
 
-if not os.path.exists(DATA_PATH):
-    os.makedirs(DATA_PATH)
-if not os.path.exists(AVATAR_PATH):
-    os.makedirs(AVATAR_PATH)
-if not os.path.exists(OBS_TEMP_PATH):
-    os.makedirs(OBS_TEMP_PATH)
-if not os.path.exists(START_OPERATOR_PATH):
-    os.makedirs(START_OPERATOR_PATH)
-if not os.path.exists(START_TEAM_PATH):
-    os.makedirs(START_TEAM_PATH)
 
-logger.remove()
-logger.add(LOGFILE_PATH, level="DEBUG")
-if os.path.samefile(PATH, ARGV_PATH):  # 直接运行
-    logger.add(sys.stderr, level="DEBUG")
+def init_environment():
+    """
+    创建数据文件夹并配置日志, 仅在启动终端时调用, 导入本模块不产生副作用
+    """
+    for path in (
+        DATA_PATH,
+        AVATAR_PATH,
+        OBS_TEMP_PATH,
+        START_OPERATOR_PATH,
+        START_TEAM_PATH,
+    ):
+        os.makedirs(path, exist_ok=True)
+
+    setup_logging(
+        LOGFILE_PATH,
+        console=os.path.samefile(PATH, ARGV_PATH),  # 直接运行
+        max_size=LOG_MAX_SIZE,
+        interval=LOG_ROTATION_INTERVAL,
+        retention=LOG_RETENTION,
+        serialize=LOG_JSON,
+    )
 
-redirect_logging("INFO")
 
 generate_uuid = lambda name: str(
     uuid.uuid5(UUID_NAMESPACE, name + str(datetime.datetime.now()))
 ).upper()
 
 
-@dataclass
+@dataclass(slots=True)
 class Record:
     data: list[str]  # 记录数据
     base_score: int = 0  # 基础分
@@ -96,54 +161,264 @@ class Record:
     time: int = 0  # 时间戳
     valid: bool = False  # 是否是有效记录
 
+    def is_empty(self) -> bool:
+        return (
+            not self.valid
+            and not self.data
+            and self.base_score == 0
+            and self.start_operator == "未知"
+            and self.start_team == "未知"
+        )
+
+    def __getstate__(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        """
+        兼容旧数据库: 旧版本的 Record 是普通 dataclass, 状态为 __dict__
+        """
+        if isinstance(state, tuple):  # (None, slots)
+            state = state[1]
+        defaults = Record(list())
+        for name in self.__slots__:
+            setattr(self, name, state.get(name, getattr(defaults, name)))
+
+
+class RecordSlots:
+    # 记录槽位, 访问某个槽位时才创建记录, 保存时只保存非空的记录
+    __slots__ = ("size", "slots")
+
+    def __init__(self, size: int = MAX_SLOT):
+        self.size = size
+        self.slots: dict[int, Record] = {}
+
+    @classmethod
+    def from_list(cls, records: list[Record]) -> "RecordSlots":
+        slots = cls(max(len(records), MAX_SLOT))
+        slots.slots = {i: r for i, r in enumerate(records) if not r.is_empty()}
+        return slots
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> Record:
+        """
+        取出槽位的记录, 不存在则创建, 返回的记录可以直接修改
+        """
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError(f"Record slot {index} out of range")
+        record = self.slots.get(index)
+        if record is None:
+            record = self.slots[index] = Record(list())
+        return record
+
+    def __iter__(self):
+        """
+        按槽位顺序遍历, 未使用的槽位产出临时的空记录 (不保存, 修改无效)
+        """
+        for i in range(self.size):
+            record = self.slots.get(i)
+            yield record if record is not None else Record(list())
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, RecordSlots):
+            return NotImplemented
+        return self.__getstate__() == other.__getstate__()
+
+    def used(self) -> list[tuple[int, Record]]:
+        """
+        已创建的槽位 (槽位, 记录), 按槽位排序
+        """
+        return sorted(self.slots.items())
+
+    def __getstate__(self) -> dict:
+        return {
+            "size": self.size,
+            "slots": {i: r for i, r in self.slots.items() if not r.is_empty()},
+        }
+
+    def __setstate__(self, state: dict):
+        self.size = state["size"]
+        self.slots = state["slots"]
+
 
 @dataclass
 class Player:
     name: str  # 昵称
     note: str  # 备注
     uuid: str  # UUID
-    records: list[Record]  # 作战记录
+    records: RecordSlots  # 作战记录
+
+    def __setstate__(self, state: dict):
+        # 兼容旧数据库: 旧版本的 records 是 MAX_SLOT 个 Record 的列表
+        self.__dict__.update(state)
+        if isinstance(self.records, list):
+            self.records = RecordSlots.from_list(self.records)
+
+
+def migrate_unversioned(player: Player) -> Player:
+    """
+    没有版本号的旧数据库: 补全UUID, 槽位数补足 MAX_SLOT
+    """
+    if not getattr(player, "uuid", ""):
+        player.uuid = generate_uuid(player.name)
+    player.records.size = max(player.records.size, MAX_SLOT)
+    return player
+
+
+# 数据库迁移, 按版本号排序, 修改 Record/Player 的字段后在这里添加一步
+def database_migrations() -> list:
+    from migrations import Migration
+
+    return [
+        Migration("1.0.0", "fill uuid and record slots", migrate_unversioned),
+    ]
+
+
+def check_player(name: str, player) -> bool:
+    return (
+        isinstance(player, Player)
+        and player.name == name
+        and isinstance(player.records, RecordSlots)
+    )
+
+
+def player_to_row(player: Player) -> "PlayerRow":
+    from snapshot import PlayerRow, RecordRow
+
+    records = [
+        RecordRow(
+            slot,
+            record.data,
+            record.base_score,
+            record.score,
+            record.start_operator,
+            record.start_team,
+            record.time,
+            record.valid,
+        )
+        for slot, record in player.records.used()
+        if not record.is_empty()
+    ]
+    return PlayerRow(
+        player.name, player.note, player.uuid, player.records.size, records
+    )
+
+
+def player_from_row(row: "PlayerRow") -> Player:
+    records = RecordSlots(row.size)
+    for r in row.records:
+        records.slots[r.slot] = Record(
+            r.data,
+            r.base_score,
+            r.score,
+            r.start_operator,
+            r.start_team,
+            r.time,
+            r.valid,
+        )
+    return Player(row.name, row.note, row.uuid, records)
+
+
+def open_players(path: str):
+    """
+    只读打开选手快照或旧的 shelve 数据库, 返回的对象可以用 with 关闭
+    """
+    from snapshot import PlayerStore, is_snapshot
+
+    if is_snapshot(path):
+        return PlayerStore.open(path, player_from_row, player_to_row)
+    import shelve
+
+    return shelve.open(path, "r")
 
 
 TEMP_PLAYER = Player(
     "临时招募·迷迭香",
     "超大杯, 信我!",
     generate_uuid("临时招募·迷迭香"),
-    [Record(list()) for _ in range(MAX_SLOT)],
+    RecordSlots(MAX_SLOT),
 )
 
 
 class MainWindow(QMainWindow, MainUITemplate):
     def __init__(self, parent=None):
         super(MainWindow, self).__init__(parent)
-        self.setupUi(self)
+        with timeline.stage("ui setup"):
+            self.setupUi(self)
+        logger.debug(f"UI setup created {count_widgets(self)} widgets")
 
         self.setWindowTitle(f"罗德岛裁判终端 Beta - 萨米肉鸽 - {VERSION} by Ellu")
         self.setWindowIcon(QIcon(os.path.join(PATH, "icon.png")))
 
-        self.players: dict[str, Player] = {}
+        from snapshot import PlayerStore
+
+        self.players = PlayerStore(player_from_row, player_to_row)
+        self.player_index: "PlayerIndex" = None  # 第一次搜索或修改选手时建立
         self.connected = False
-        self.obs: ReqClientExQThread = None
+        self.obs: "ReqClientExGroup" = None
+        self.export_thread: "ExportThread" = None
+        self.import_thread: "ImportThread" = None
+        self.sync_state: "SyncState" = None  # 第一次连接同步时载入
+        self.sync_client: "SyncClient" = None
+        self.sync_hub: "SyncHub" = None
+        self.sync_secret = ""  # 本次运行使用的同步口令, 用于下次填入对话框
+        self.overlay: "OverlayServer" = None
+
+        # 记录列表直接显示当前记录的条目
+        self.record_model = RecordListModel(self)
+        self.listRecord.setModel(self.record_model)
 
         for i in range(MAX_SLOT):
             self.comboBoxSelRecord.addItem(f"{i+1}")
         self.frameAvatar.setMinimumSize(AVATAR_SIZE + 8, AVATAR_SIZE + 8)
 
-        # 添加开局干员
-        for file in os.listdir(START_OPERATOR_PATH):
-            if file.endswith(".png"):
-                self.comboBoxStartOperator.addItem(os.path.splitext(file)[0])
-        # 添加开局队伍
-        for file in os.listdir(START_TEAM_PATH):
-            if file.endswith(".png"):
-                self.comboBoxStartTeam.addItem(os.path.splitext(file)[0])
+        # 添加开局干员和开局队伍, 第0项为"未知"
+        with timeline.stage("resource manifest"):
+            self.operator_manifest = ResourceManifest(
+                START_OPERATOR_PATH, RESOURCE_MANIFEST_PATH
+            ).load()
+            self.team_manifest = ResourceManifest(
+                START_TEAM_PATH, RESOURCE_MANIFEST_PATH
+            ).load()
+        fill_combobox(self.comboBoxStartOperator, self.operator_manifest.names)
+        fill_combobox(self.comboBoxStartTeam, self.team_manifest.names)
+
+        # 后台预缩放图标, 完成后设置下拉框缩略图
+        self.icon_cache = IconCache(ICON_CACHE_PATH)
+        self.icon_thread = IconPrepareThread(
+            self.icon_cache,
+            [
+                (self.operator_manifest, OBS_OPERATOR_ICON_SIZE),
+                (self.team_manifest, OBS_TEAM_ICON_SIZE),
+                (self.operator_manifest, ICON_THUMB_SIZE),
+                (self.team_manifest, ICON_THUMB_SIZE),
+            ],
+        )
+        self.icon_thread.prepared.connect(self.on_icons_prepared)
+        self.icon_thread.start()
 
         # 移除鼠标滚轮事件防止误操作
         self.comboBoxSelRecord.wheelEvent = lambda _: None
         self.comboBoxSelPlayer.wheelEvent = lambda _: None
 
-        # 载入数据库
-        self.load_database()
+        # 选手搜索框, 放在选手下拉框右侧, Ctrl+F 聚焦
+        self.player_finder = PlayerFinder(self.search_players, self.frame)
+        self.player_finder.setMaximumWidth(140)
+        self.player_finder.chosen.connect(self.comboBoxSelPlayer.setCurrentText)
+        self.horizontalLayout_4.insertWidget(
+            self.horizontalLayout_4.indexOf(self.comboBoxSelPlayer) + 1,
+            self.player_finder,
+        )
+
+        # 载入数据库和撤销记录
+        self.history = CommandStack(HISTORY_LIMIT)
+        with timeline.stage("database load"):
+            self.load_database()
+            self.history.load(HISTORY_PATH)
+            self.text_cache = TextLayoutCache(TEXT_LAYOUT_PATH).load()
 
         # 创建一个定时器, 自动保存数据库
         self.db_timer = QTimer(self)
@@ -152,6 +427,59 @@ class MainWindow(QMainWindow, MainUITemplate):
 
         self.listRecord.setContextMenuPolicy(Qt.CustomContextMenu)
 
+        # 菜单栏
+        menu_edit = self.menuBar().addMenu("编辑")
+        self.actionUndo = menu_edit.addAction("撤销", self.undo)
+        self.actionUndo.setShortcut(QKeySequence.StandardKey.Undo)
+        self.actionRedo = menu_edit.addAction("重做", self.redo)
+        self.actionRedo.setShortcuts(
+            [QKeySequence.StandardKey.Redo, QKeySequence("Ctrl+Shift+Z")]
+        )
+        menu_edit.addSeparator()
+        self.actionFind = menu_edit.addAction("搜索干员", self.player_finder.setFocus)
+        self.actionFind.setShortcut(QKeySequence.StandardKey.Find)
+        self.update_history_actions()
+        menu_data = self.menuBar().addMenu("数据")
+        menu_data.addAction("批量导入干员...", self.import_players)
+        menu_data.addSeparator()
+        menu_data.addAction("导出记录为 CSV", lambda: self.export_records("csv"))
+        menu_data.addAction(
+            "导出记录为 JSON Lines", lambda: self.export_records("jsonl")
+        )
+        menu_data.addSeparator()
+        menu_data.addAction("赛季统计", self.show_analytics)
+        menu_sync = self.menuBar().addMenu("同步")
+        self.actionSyncHost = menu_sync.addAction("作为同步主机", self.host_sync)
+        self.actionSyncConnect = menu_sync.addAction(
+            "连接同步主机...", self.connect_sync
+        )
+        self.actionSyncDisconnect = menu_sync.addAction("断开同步", self.stop_sync)
+        self.update_sync_actions()
+        menu_overlay = self.menuBar().addMenu("叠加层")
+        self.actionOverlay = menu_overlay.addAction("启动网页叠加层")
+        self.actionOverlay.setCheckable(True)
+        self.actionOverlay.toggled.connect(self.toggle_overlay)
+        self.actionOverlayUrl = menu_overlay.addAction(
+            "复制叠加层地址", self.copy_overlay_url
+        )
+        self.actionOverlayUrl.setEnabled(False)
+        # 直播机以外的电脑上的OBS (如录制机) 需要通过局域网打开页面
+        self.actionOverlayLan = menu_overlay.addAction("允许局域网访问")
+        self.actionOverlayLan.setCheckable(True)
+        self.actionOverlayLan.toggled.connect(self.toggle_overlay_lan)
+        menu_debug = self.menuBar().addMenu("诊断")
+        self.actionProfile = menu_debug.addAction("性能采样")
+        self.actionProfile.setCheckable(True)
+        self.actionProfile.toggled.connect(self.toggle_profiling)
+
+        # 定时检查各个OBS的连接状态
+        self.obs_health_timer = QTimer(self)
+        self.obs_health_timer.timeout.connect(self.update_obs_health)
+
+        # 主线程卡顿时记录调用栈, 首次绘制后再启动
+        self.watchdog: "StallWatchdog" = None
+        QTimer.singleShot(0, self.start_watchdog)
+
     def closeEvent(self, event: QCloseEvent) -> None:
         """
         重写关闭事件, 保存数据库并关闭OBS连接
@@ -159,17 +487,100 @@ class MainWindow(QMainWindow, MainUITemplate):
         self.save_database()
         if self.connected:
             self.obs.stop()
+            self.save_text_cache()  # 后台测量在断开前可能还写入了宽度
+        self.icon_thread.wait()
+        if self.export_thread is not None:
+            self.export_thread.wait()
+        if self.import_thread is not None:
+            self.import_thread.wait()
+        self.stop_sync()
+        if self.overlay is not None:
+            self.overlay.stop()
+        if self.watchdog is not None:
+            if self.watchdog.profiling:
+                self.actionProfile.setChecked(False)
+            self.watchdog.stop()
+        self.players.close()
         logger.info("Application closed")
         event.accept()
 
     def load_database(self):
         """
-        从数据库载入数据, 如果数据库不存在则创建一个新的数据库
+        载入选手: 优先内存映射快照, 选手在第一次访问时才解码;
+        没有快照时从旧的 shelve 数据库载入, 下次保存时写入快照
         """
-        self.players = {}
+        from snapshot import PlayerStore, SnapshotError
+
+        self.players = None
+        if os.path.exists(SNAPSHOT_PATH):
+            try:
+                self.migrate_snapshot()
+                self.players = PlayerStore.open(
+                    SNAPSHOT_PATH, player_from_row, player_to_row
+                )
+            except (OSError, SnapshotError) as e:
+                logger.exception(f"Snapshot load failed: {e}")
+                # 保留损坏的快照以便排查, 下次保存时写入新的快照
+                bad_path = SNAPSHOT_PATH + ".bad"
+                os.replace(SNAPSHOT_PATH, bad_path)
+                QMessageBox.warning(
+                    self,
+                    "快照读取失败",
+                    f"选手快照读取失败, 已移动到 {bad_path}, 将从旧数据库载入:\n{e}",
+                )
+        if self.players is None:
+            self.players = PlayerStore(player_from_row, player_to_row)
+            self.load_legacy_database()
+        else:
+            logger.info(
+                f"Snapshot mapped from {SNAPSHOT_PATH}: {len(self.players)} players"
+            )
+        if len(self.players) == 0:
+            self.players[TEMP_PLAYER.name] = TEMP_PLAYER
+        self.player_index = None
+        self.comboBoxSelPlayer.clear()
+        for name in self.players:
+            self.comboBoxSelPlayer.addItem(name)
+        self.comboBoxSelPlayer.setCurrentIndex(0)
+
+    def index(self) -> "PlayerIndex":
+        """
+        选手搜索索引, 第一次搜索或修改选手时才导入 search 并登记全部选手
+        """
+        if self.player_index is None:
+            from search import PlayerIndex
+
+            self.player_index = PlayerIndex(DEFAULT_NOTE)
+            self.player_index.rebuild(self.players.headers())
+        return self.player_index
+
+    def search_players(self, query: str) -> list[str]:
+        return self.index().search(query)
+
+    def load_legacy_database(self):
+        """
+        从 shelve 数据库载入全部选手, 如果数据库不存在则创建一个新的数据库
+        """
+        import shelve
+
+        from migrations import migrate_database
+
+        try:
+            migrate_database(
+                DATABASE_PATH, VERSION, database_migrations(), check_player
+            )
+        except Exception as e:
+            logger.exception(f"Database migration failed: {e}")
+            QMessageBox.warning(
+                self,
+                "数据库升级失败",
+                f"数据库升级失败, 将按原样载入旧数据:\n{e}",
+            )
+
         with shelve.open(DATABASE_PATH) as db:
             if "__version__" not in db:
-                db["__version__"] = "0.0.0"
+                # 新建的数据库直接使用当前版本
+                db["__version__"] = VERSION if len(db) == 0 else "0.0.0"
             if db["__version__"] != VERSION:
                 logger.warning(
                     f"Database version mismatch, expect {VERSION}, got {db['__version__']}"
@@ -178,27 +589,47 @@ class MainWindow(QMainWindow, MainUITemplate):
                 if name == "__version__":
                     continue
                 self.players[name] = db[name]
-        if len(self.players) == 0:
-            self.players[TEMP_PLAYER.name] = TEMP_PLAYER
-        self.comboBoxSelPlayer.clear()
-        for name in self.players:
-            self.comboBoxSelPlayer.addItem(name)
-        self.comboBoxSelPlayer.setCurrentIndex(0)
         logger.info(f"Database loaded from {DATABASE_PATH}")
         # logger.debug(f"Players={self.players}")
 
+    def migrate_snapshot(self):
+        """
+        快照的版本低于当前版本时升级快照文件, 失败时原快照不变, 按原样载入
+        """
+        from migrations import migrate_snapshot
+        from snapshot import SnapshotError
+
+        try:
+            migrate_snapshot(
+                SNAPSHOT_PATH,
+                VERSION,
+                database_migrations(),
+                player_from_row,
+                player_to_row,
+                check_player,
+            )
+        except SnapshotError:
+            # 快照损坏, 交给 load_database 处理
+            raise
+        except Exception as e:
+            logger.exception(f"Snapshot migration failed: {e}")
+            QMessageBox.warning(
+                self,
+                "快照升级失败",
+                f"选手快照升级失败, 将按原样载入旧数据:\n{e}",
+            )
+
     def save_database(self):
         """
-        保存数据到数据库, 如果保存失败则备份到另一个数据库
+        保存选手快照, 如果保存失败则备份到 shelve 数据库
         """
+        import shelve
+
         # t0 = time.perf_counter()
         try:
-            with shelve.open(DATABASE_PATH, "n") as db:
-                for name in self.players:
-                    db[name] = self.players[name]
-                db["__version__"] = VERSION
+            self.players.save(SNAPSHOT_PATH, VERSION)
         except Exception as e:
-            logger.error(f"Database save failed: {e}, try save to backup")
+            logger.error(f"Snapshot save failed: {e}, try save to backup")
             try:
                 with shelve.open(DATABASE_BACKUP_PATH, "n") as db:
                     for name in self.players:
@@ -208,9 +639,25 @@ class MainWindow(QMainWindow, MainUITemplate):
             except Exception as e:
                 logger.exception("Database backup save failed")
             return
+        try:
+            self.history.save(HISTORY_PATH)
+        except Exception as e:
+            logger.error(f"History save failed: {e}")
+        try:
+            if self.sync_state is not None:
+                self.sync_state.save()
+        except Exception as e:
+            logger.error(f"Sync state save failed: {e}")
         # t1 = time.perf_counter()
         # logger.debug(f"Database saved, cost {t1-t0:.5f}s")
         # logger.debug(f"Players={self.players}")
+        self.save_text_cache()
+
+    def save_text_cache(self):
+        try:
+            self.text_cache.save()
+        except Exception as e:
+            logger.error(f"Text layout cache save failed: {e}")
 
     def update_player_info(self):
         """
@@ -219,14 +666,14 @@ class MainWindow(QMainWindow, MainUITemplate):
         self.lineEditPlayerName.setText(self.player_now.name)
         self.lineEditPlayerNote.setText(self.player_now.note)
         self.labelPlayerUUID.setText(self.player_now.uuid)
-        valid_num = 0
+        valid_slots = []
         max_score = -1
         max_index = -1
         latest_time = -1
         latest_index = -1
-        for i, record in enumerate(self.player_now.records):
+        for i, record in self.player_now.records.used():
             if record.valid:
-                valid_num += 1
+                valid_slots.append(i)
                 if record.time > latest_time:
                     latest_time = record.time
                     latest_index = i
@@ -234,11 +681,8 @@ class MainWindow(QMainWindow, MainUITemplate):
                     max_score = record.score
                     max_index = i
         self.labelPlayerRecordNum.setText(
-            "Slot "
-            + ", ".join(
-                str(i + 1) for i in range(MAX_SLOT) if self.player_now.records[i].valid
-            )
-            if valid_num
+            "Slot " + ", ".join(str(i + 1) for i in valid_slots)
+            if valid_slots
             else "无记录"
         )
         self.labelPlayerLastSaveTime.setText(
@@ -247,7 +691,7 @@ class MainWindow(QMainWindow, MainUITemplate):
             if latest_time > 0
             else "N/A"
         )
-        score = f"{max_score:.4f}".rstrip("0").rstrip(".")
+        score = format_score(max_score)
         self.labelPlayerMaxRecord.setText(
             f"{score} ( Slot {max_index+1} )" if max_score >= 0 else "N/A"
         )
@@ -258,19 +702,56 @@ class MainWindow(QMainWindow, MainUITemplate):
 
         skip_sync_name: 是否跳过同步干员名字(耗时, 因为要计算文本对齐)
         """
-        if not self.connected:
+        targets = self.overlay_targets()
+        if not targets:
             return
-        if not skip_sync_name:
-            self.obs.fake.set_player(self.player_now.name, self.avatar_obs_path)
-        self.obs.fake.set_start(
-            os.path.join(START_TEAM_PATH, f"{self.record.start_team}.png")
-            if self.record.start_team != "未知"
-            else "",
-            os.path.join(START_OPERATOR_PATH, f"{self.record.start_operator}.png")
-            if self.record.start_operator != "未知"
-            else "",
+        team_path = self.start_icon_path(
+            self.team_manifest, self.record.start_team, OBS_TEAM_ICON_SIZE
+        )
+        operator_path = self.start_icon_path(
+            self.operator_manifest, self.record.start_operator, OBS_OPERATOR_ICON_SIZE
+        )
+        score = format_score(self.record.score)
+        for target in targets:
+            if not skip_sync_name:
+                target.set_player(self.player_now.name, self.avatar_obs_path)
+            target.set_start(team_path, operator_path)
+            target.set_score(score)
+
+    def overlay_targets(self) -> list:
+        """
+        需要同步的直播画面: OBS客户端和网页叠加层
+        """
+        targets = []
+        if self.connected:
+            targets.append(self.obs.fake)
+        if self.overlay is not None:
+            targets.append(self.overlay)
+        return targets
+
+    def start_icon_path(self, manifest: ResourceManifest, name: str, size: int) -> str:
+        """
+        开局干员/队伍图标路径, 优先使用预缩放的图标, "未知"返回空字符串
+        """
+        if name not in manifest:
+            return ""
+        return self.icon_cache.path(manifest[name], size)
+
+    def on_icons_prepared(self, count: int, cost: float):
+        set_combobox_icons(
+            self.comboBoxStartOperator,
+            self.operator_manifest,
+            self.icon_cache,
+            ICON_THUMB_SIZE,
+            offset=1,
+        )
+        set_combobox_icons(
+            self.comboBoxStartTeam,
+            self.team_manifest,
+            self.icon_cache,
+            ICON_THUMB_SIZE,
+            offset=1,
         )
-        self.obs.fake.set_score(f"{self.record.score:.4f}".rstrip("0").rstrip("."))
 
     def load_player(self, name: str):
         """
@@ -343,25 +824,27 @@ class MainWindow(QMainWindow, MainUITemplate):
         载入记录
         """
         logger.info(f"Loading record {index+1} for {self.player_now.name}")
+        self.slot = index
         self.record = self.player_now.records[index]
-        self.listRecord.clear()
-        for item in self.record.data:
-            self.listRecord.addItem(item)
-        if self.record.start_operator in [
-            self.comboBoxStartOperator.itemText(i)
-            for i in range(self.comboBoxStartOperator.count())
-        ]:
-            self.comboBoxStartOperator.setCurrentText(self.record.start_operator)
-        else:
-            self.comboBoxStartOperator.setCurrentIndex(0)
-        if self.record.start_team in [
-            self.comboBoxStartTeam.itemText(i)
-            for i in range(self.comboBoxStartTeam.count())
-        ]:
-            self.comboBoxStartTeam.setCurrentText(self.record.start_team)
-            self.comboBoxStartOperator.setCurrentText(self.record.start_operator)
+        self.record_model.set_entries(self.record.data)
+        self.show_start("start_operator", self.record.start_operator)
+        self.show_start("start_team", self.record.start_team)
         self.spinBoxBaseScore.setValue(self.record.base_score)
         self.recalc_score()
+        self.sync_obs_player_info(True)
+
+    def show_start(self, attr: str, name: str):
+        """
+        显示开局干员/队伍, 不触发修改记录的信号
+        """
+        if attr == "start_operator":
+            combobox, manifest = self.comboBoxStartOperator, self.operator_manifest
+        else:
+            combobox, manifest = self.comboBoxStartTeam, self.team_manifest
+        combobox.blockSignals(True)
+        # 不存在的资源 index_of 返回 -1, 对应第0项"未知"
+        combobox.setCurrentIndex(manifest.index_of(name) + 1)
+        combobox.blockSignals(False)
 
     @Slot()
     def on_pushButtonClrRecord_clicked(self):
@@ -374,17 +857,16 @@ class MainWindow(QMainWindow, MainUITemplate):
         )
         if reply != QMessageBox.Yes:
             return
-        self.record.valid = False
-        self.record.data.clear()
-        self.record.base_score = 0
-        self.record.score = 0
-        self.record.time = 0
-        self.record.start_operator = "未知"
-        self.record.start_team = "未知"
-        self.spinBoxBaseScore.setValue(0)
-        self.listRecord.clear()
-        self.recalc_score()
-        self.update_player_info()
+        self.execute(
+            ClearRecord(
+                *self.command_target(valid=False, time=0),
+                data=list(self.record.data),
+                base_score=self.record.base_score,
+                score=self.record.score,
+                start_operator=self.record.start_operator,
+                start_team=self.record.start_team,
+            )
+        )
         logger.info(f"Record {self.comboBoxSelRecord.currentText()} cleared")
 
     @Slot(int)
@@ -414,11 +896,13 @@ class MainWindow(QMainWindow, MainUITemplate):
                 return
         name = self.player_now.name
         del self.players[name]
+        self.index().remove(name)
         self.comboBoxSelPlayer.removeItem(self.comboBoxSelPlayer.currentIndex())
         logger.info(f"Player {name} deleted")
         self.comboBoxSelPlayer.setCurrentIndex(-1)
         if len(self.players) == 0:
             self.players[TEMP_PLAYER.name] = copy(TEMP_PLAYER)
+            self.index().add(TEMP_PLAYER)
             self.comboBoxSelPlayer.addItem(TEMP_PLAYER.name)
         self.comboBoxSelPlayer.setCurrentIndex(0)
 
@@ -437,8 +921,9 @@ class MainWindow(QMainWindow, MainUITemplate):
             name,
             DEFAULT_NOTE,
             generate_uuid(name),
-            [Record(list()) for _ in range(MAX_SLOT)],
+            RecordSlots(MAX_SLOT),
         )
+        self.index().add(self.players[name])
         self.comboBoxSelPlayer.addItem(name)
         self.comboBoxSelPlayer.setCurrentText(name)
         logger.info(f"Player {name} added")
@@ -466,6 +951,7 @@ class MainWindow(QMainWindow, MainUITemplate):
         self.player_now.name = name
         del self.players[old_name]
         self.players[name] = self.player_now
+        self.index().rename(old_name, self.player_now)
         self.comboBoxSelPlayer.setItemText(self.comboBoxSelPlayer.currentIndex(), name)
         self.comboBoxSelPlayer.setCurrentText(name)
         self.load_player(name)
@@ -482,35 +968,354 @@ class MainWindow(QMainWindow, MainUITemplate):
         if note == self.player_now.note:
             return
         self.player_now.note = note
+        self.index().add(self.player_now)
         logger.info(f"Player {self.player_now.name} note updated: {note}")
 
     @Slot(int)
     def on_comboBoxStartOperator_currentIndexChanged(self, index: int):
         name = self.comboBoxStartOperator.currentText()
-        self.record.start_operator = name
-        self.sync_obs_player_info(True)
+        if name == self.record.start_operator:
+            return
+        self.execute(
+            SetStart(
+                *self.command_target(),
+                attr="start_operator",
+                old=self.record.start_operator,
+                new=name,
+            )
+        )
         logger.info(f"Start operator updated: {name}")
 
     @Slot(int)
     def on_comboBoxStartTeam_currentIndexChanged(self, index: int):
         name = self.comboBoxStartTeam.currentText()
-        self.record.start_team = name
-        self.sync_obs_player_info(True)
+        if name == self.record.start_team:
+            return
+        self.execute(
+            SetStart(
+                *self.command_target(),
+                attr="start_team",
+                old=self.record.start_team,
+                new=name,
+            )
+        )
         logger.info(f"Start team updated: {name}")
 
+    ############## 以下为撤销/重做 ##############
+
+    def command_target(self, valid: bool = None, time: int = None) -> tuple:
+        """
+        当前记录的命令公共参数 (uuid, slot, before, after)
+
+        valid/time 为执行后的值, 不传则保持不变
+        """
+        before = (self.record.valid, self.record.time)
+        after = (
+            before[0] if valid is None else valid,
+            before[1] if time is None else time,
+        )
+        return self.player_now.uuid, self.slot, before, after
+
+    def run_command(self, cmd: Command, undo: bool = False) -> list:
+        """
+        执行或撤销命令, 对条目的增删包在列表模型的变更通知之间
+        """
+        cmd.check(self.record, undo)
+        with self.record_model.changing(cmd.list_change(undo)):
+            return cmd.undo(self.record) if undo else cmd.redo(self.record)
+
+    def execute(self, cmd: Command):
+        """
+        执行命令并记入撤销栈
+        """
+        self.apply_changes(self.run_command(cmd))
+        self.history.push(cmd)
+        self.update_history_actions()
+        self.publish(cmd, False)
+
+    def apply_changes(self, changes: list):
+        """
+        按命令返回的修改增量更新总分和OBS, 不需要重新计算整条记录
+        """
+        for change in changes:
+            if change[0] == "insert":
+                self.aggregate.update(change[2])
+            elif change[0] == "remove":
+                self.aggregate.update(change[2], -1)
+            elif change[0] == "base":
+                self.aggregate.base_score = change[1]
+                self.spinBoxBaseScore.setValue(change[1])
+            elif change[0] == "start":
+                self.show_start(change[1], change[2])
+                self.sync_obs_player_info(True)
+            elif change[0] == "reset":
+                self.load_record(self.slot)
+                return
+        self.refresh_score()
+
+    def find_player(self, uuid: str) -> Player | None:
+        # 只比较UUID, 不解码其他选手的记录
+        for header in self.players.headers():
+            if header.uuid == uuid:
+                return self.players[header.name]
+        return None
+
+    def goto_record(self, uuid: str, slot: int) -> bool:
+        """
+        切换到命令所属的玩家和记录
+        """
+        if self.player_now.uuid != uuid:
+            player = self.find_player(uuid)
+            if player is None:
+                return False
+            self.comboBoxSelPlayer.setCurrentText(player.name)
+        if self.slot != slot:
+            self.comboBoxSelRecord.setCurrentIndex(slot)
+        return True
+
+    def run_history(self, undo: bool):
+        stack = self.history.undo_stack if undo else self.history.redo_stack
+        if not stack:
+            return
+        cmd = stack[-1]
+        try:
+            if not self.goto_record(cmd.uuid, cmd.slot):
+                raise HistoryError("Player not found")
+            changes = self.run_command(cmd, undo)
+        except HistoryError as e:
+            logger.warning(f"Discard history {cmd.text}: {e}")
+            self.history.discard(cmd)
+            self.update_history_actions()
+            QMessageBox.warning(self, "无法撤销", f"{cmd.text}\n记录已被修改或删除")
+            return
+        if undo:
+            self.history.pop_undo()
+        else:
+            self.history.pop_redo()
+        self.apply_changes(changes)
+        self.update_history_actions()
+        self.publish(cmd, undo)
+        logger.info(f"{'Undo' if undo else 'Redo'}: {cmd.text}")
+
+    def undo(self):
+        self.run_history(True)
+
+    def redo(self):
+        self.run_history(False)
+
+    def update_history_actions(self):
+        undo, redo = self.history.undo_stack, self.history.redo_stack
+        self.actionUndo.setEnabled(bool(undo))
+        self.actionUndo.setText(f"撤销 {undo[-1].text}" if undo else "撤销")
+        self.actionRedo.setEnabled(bool(redo))
+        self.actionRedo.setText(f"重做 {redo[-1].text}" if redo else "重做")
+
+    ############## 以下为多终端同步 ##############
+
+    def host_sync(self):
+        """
+        在本机启动同步主机并连接, 其他终端使用相同的口令连接本机即可
+        """
+        from sync import SYNC_PORT, SyncHub
+
+        if self.sync_hub is None:
+            secret, ok = QInputDialog.getText(
+                self,
+                "作为同步主机",
+                "同步口令 (其他终端连接时需要输入)",
+                text=self.sync_secret or os.urandom(3).hex(),
+            )
+            secret = secret.strip()
+            if not ok:
+                return
+            if not secret:
+                QMessageBox.warning(self, "启动失败", "同步口令不能为空")
+                return
+            try:
+                self.sync_hub = SyncHub(secret, port=SYNC_PORT)
+            except OSError as e:
+                logger.error(f"Sync hub start failed: {e}")
+                QMessageBox.warning(self, "启动失败", f"无法监听端口 {SYNC_PORT}\n{e}")
+                return
+            self.sync_hub.start()
+            self.sync_secret = secret
+        self.start_sync("127.0.0.1", SYNC_PORT, self.sync_hub.secret)
+
+    def connect_sync(self):
+        from sync import SYNC_PORT
+
+        text, ok = QInputDialog.getText(
+            self, "连接同步主机", "主机地址 (IP:端口)", text=f"127.0.0.1:{SYNC_PORT}"
+        )
+        if not ok or not text:
+            return
+        host, _, port = text.strip().rpartition(":")
+        if not host or not port.isdigit():
+            host, port = text.strip(), str(SYNC_PORT)
+        secret, ok = QInputDialog.getText(
+            self,
+            "连接同步主机",
+            "同步口令 (主机上设置的口令)",
+            QLineEdit.EchoMode.Password,
+            self.sync_secret,
+        )
+        if not ok or not secret.strip():
+            return
+        self.start_sync(host, int(port), secret.strip())
+
+    def start_sync(self, host: str, port: int, secret: str):
+        from sync import SyncClient, SyncState
+
+        if self.sync_state is None:
+            self.sync_state = SyncState(SYNC_STATE_PATH)
+        if self.sync_client is not None:
+            self.sync_client.stop()
+        client = SyncClient(host, port, self.sync_state.node, secret)
+        try:
+            client.connect_hub()
+        except OSError as e:
+            logger.error(f"Sync connection to {host}:{port} failed: {e}")
+            QMessageBox.warning(self, "连接失败", f"无法连接到: {host}:{port}\n{e}")
+            return
+        self.sync_secret = secret
+        client.received.connect(self.apply_remote)
+        client.control.connect(self.on_sync_control)
+        client.state_changed.connect(self.on_sync_state_changed)
+        self.sync_client = client
+        client.start()
+        self.update_sync_actions()
+        logger.success(f"Sync connected to {host}:{port} as {self.sync_state.node}")
+
+    def stop_sync(self):
+        if self.sync_client is not None:
+            client, self.sync_client = self.sync_client, None
+            client.stop()
+        if self.sync_hub is not None:
+            self.sync_hub.stop()
+            self.sync_hub = None
+        self.update_sync_actions()
+
+    def on_sync_state_changed(self, connected: bool, info: str):
+        if connected:
+            self.statusBar().showMessage(f"同步已连接: {info}")
+            return
+        client = self.sender()
+        if client is self.sync_client:  # 连接意外断开
+            self.sync_client = None
+            client.wait()
+            self.update_sync_actions()
+        self.statusBar().showMessage(f"同步已断开: {info}")
+
+    def update_sync_actions(self):
+        connected = self.sync_client is not None
+        self.actionSyncHost.setEnabled(self.sync_hub is None)
+        self.actionSyncConnect.setEnabled(not connected)
+        self.actionSyncDisconnect.setEnabled(connected or self.sync_hub is not None)
+
+    def publish(self, cmd: Command, undo: bool):
+        """
+        把本地执行/撤销的命令作为增量发送给其他终端
+        """
+        if self.sync_client is None:
+            return
+        player = self.player_now
+        msg = self.sync_state.local_event(
+            cmd.to_dict(),
+            undo,
+            {"name": player.name, "note": player.note, "uuid": player.uuid},
+        )
+        self.sync_client.send(msg)
+
+    def remote_player(self, info: dict) -> Player:
+        """
+        按UUID查找远端事件所属的玩家, 本地没有则创建
+        """
+        player = self.find_player(info["uuid"])
+        if player is not None:
+            return player
+        name = info["name"]
+        if name in self.players:
+            name = f"{name} ({info['uuid'][:4]})"
+        player = Player(name, info["note"], info["uuid"], RecordSlots(MAX_SLOT))
+        self.players[name] = player
+        self.index().add(player)
+        self.comboBoxSelPlayer.addItem(name)
+        logger.info(f"Player {name} added by sync")
+        return player
+
+    def apply_remote(self, msg: dict):
+        """
+        应用其他终端的命令, 不记入本地撤销栈
+        """
+        request = self.sync_state.replay_request(msg)
+        if request is not None and self.sync_client is not None:
+            self.sync_client.send(request)
+        ok, conflict = self.sync_state.accept(msg)
+        if not ok:
+            return
+        undo = msg["undo"]
+        cmd = Command.from_dict(msg["cmd"])
+        player = self.remote_player(msg["player"])
+        record = player.records[cmd.slot]
+        if isinstance(cmd, AddEntry) and not undo:
+            cmd.index = min(cmd.index, len(record.data))  # 并发追加时可能越界
+        try:
+            if player is self.player_now and cmd.slot == self.slot:
+                self.apply_changes(self.run_command(cmd, undo))
+            else:
+                cmd.undo(record) if undo else cmd.redo(record)
+                record.score = calc_score(record.base_score, record.data)
+                if player is self.player_now:
+                    self.update_player_info()
+        except HistoryError as e:
+            logger.warning(f"Sync skipped {cmd.text} from {msg['node']}: {e}")
+            conflict = True
+        else:
+            logger.info(
+                f"Sync {'undo' if undo else 'apply'} {cmd.text} "
+                f"for {player.name} slot {cmd.slot + 1} from {msg['node']}"
+            )
+        if conflict:
+            logger.warning(
+                f"Sync conflict on {player.name} slot {cmd.slot + 1}: {cmd.text}"
+            )
+            self.statusBar().showMessage(
+                f"同步冲突: {player.name} 记录 {cmd.slot + 1} 被多个终端同时修改, 请核对",
+                10000,
+            )
+
+    def on_sync_control(self, msg: dict):
+        """
+        其他终端缺少本机的事件时补发; 发送方已无法补发的事件跳过并提示核对
+        """
+        if msg["type"] == "replay" and msg["node"] == self.sync_state.node:
+            events = self.sync_state.replay(msg["after"])
+            logger.info(f"Sync replaying {len(events)} events to {msg['from']}")
+            for event in events:
+                if self.sync_client is None or not self.sync_client.send(event):
+                    return
+        elif msg["type"] == "gap" and self.sync_state.skip(msg):
+            self.statusBar().showMessage(
+                f"终端 {msg['node']} 的部分修改已无法同步, 请核对各终端的记录", 10000
+            )
+
     # listRecord 删除
     def __list_del_item(self):
-        row = self.listRecord.currentRow()
-        cnt = self.listRecord.count()
+        current = self.listRecord.currentIndex()
+        row = current.row() if current.isValid() else -1
+        cnt = self.record_model.rowCount()
         if cnt == 0:
             return
         if row == -1:
             row = cnt - 1
-        self.listRecord.takeItem(row)
-        self.record.data.pop(row)
-        self.record.time = int(datetime.datetime.now().timestamp())
-        self.listRecord.setCurrentRow(max(row - 1, 0))
-        self.recalc_score()
+        self.execute(
+            RemoveEntry(
+                *self.command_target(time=int(datetime.datetime.now().timestamp())),
+                index=row,
+                entry=self.record.data[row],
+            )
+        )
+        self.listRecord.setCurrentIndex(self.record_model.index(max(row - 1, 0)))
 
     @Slot(QPoint)  # listRecord 右键菜单
     def on_listRecord_customContextMenuRequested(self, pos: QPoint):
@@ -519,35 +1324,25 @@ class MainWindow(QMainWindow, MainUITemplate):
         menu.exec(self.listRecord.mapToGlobal(pos))
 
     def recalc_score(self):
-        score = self.record.base_score
-        score_multi = 0
-        for i in range(self.listRecord.count()):
-            item = self.listRecord.item(i)
-            text = item.text()
-            if "x" in text:
-                score_multi += float(text.split("x")[-1])
-            elif "+" in text:
-                score += int(text.split("+")[-1])
-            elif "-" in text:
-                score -= int(text.split("-")[-1])
-        if score_multi != 0:
-            score *= 1 + score_multi
-        self.labelScore.setText(f"{score:.4f}".rstrip("0").rstrip("."))
+        """
+        从头计算当前记录的总分, 之后的修改由 apply_changes 增量更新
+        """
+        self.aggregate = ScoreAggregate(self.record.base_score, self.record.data)
+        self.refresh_score()
+
+    def refresh_score(self):
+        score = self.aggregate.score
+        self.labelScore.setText(format_score(score))
         self.record.score = score
         self.update_player_info()
         logger.info(f"Score recalculated: {score:.4f}")
-        if self.connected:
-            self.obs.fake.set_score(f"{score:.4f}".rstrip("0").rstrip("."))
+        for target in self.overlay_targets():
+            target.set_score(format_score(score))
         ###### 以下为额外逻辑 ######
-        six, five, four = 0, 0, 0
-        for text in self.record.data:
-            if "六星" in text:
-                six += 1
-            elif "五星" in text:
-                five += 1
-            elif "四星" in text:
-                four += 1
-        self.labelHeaderTemp.setText(f"// 六星: {six} 五星: {five} 四星: {four} //")
+        stars = self.aggregate.stars
+        self.labelHeaderTemp.setText(
+            f"// 六星: {stars['六星']} 五星: {stars['五星']} 四星: {stars['四星']} //"
+        )
 
     def add_score_change(
         self, info1: str, info2: str, change: float, is_multi: bool = False
@@ -561,14 +1356,20 @@ class MainWindow(QMainWindow, MainUITemplate):
             change = 0
         else:
             text += f" {change:+}"
-        self.listRecord.addItem(text)
-        self.record.data.append(text)
-        self.record.valid = True
-        self.record.time = int(datetime.datetime.now().timestamp())
+        self.execute(
+            AddEntry(
+                *self.command_target(
+                    valid=True, time=int(datetime.datetime.now().timestamp())
+                ),
+                index=len(self.record.data),
+                entry=text,
+            )
+        )
         logger.info(f"Score change added: {text}")
-        self.recalc_score()
-        if self.connected and self.checkBoxEnLowers.isChecked():
-            self.obs.fake.display_lower(
+        if not self.checkBoxEnLowers.isChecked():
+            return
+        for target in self.overlay_targets():
+            target.display_lower(
                 info1.split(" ")[0],
                 info2,
                 change,
@@ -579,13 +1380,22 @@ class MainWindow(QMainWindow, MainUITemplate):
 
     @Slot()
     def on_spinBoxBaseScore_editingFinished(self):
-        self.record.base_score = self.spinBoxBaseScore.value()
-        self.record.time = int(datetime.datetime.now().timestamp())
-        self.record.valid = True
+        value = self.spinBoxBaseScore.value()
+        if value != self.record.base_score or not self.record.valid:
+            self.execute(
+                SetBaseScore(
+                    *self.command_target(
+                        valid=True, time=int(datetime.datetime.now().timestamp())
+                    ),
+                    old=self.record.base_score,
+                    new=value,
+                )
+            )
         logger.info(f"Base score changed to {self.record.base_score}")
-        self.recalc_score()
-        if self.connected and self.checkBoxEnLowers.isChecked():
-            self.obs.fake.display_lower(
+        if not self.checkBoxEnLowers.isChecked():
+            return
+        for target in self.overlay_targets():
+            target.display_lower(
                 "基础分数",
                 f"+{self.record.base_score}",
                 0,
@@ -597,47 +1407,352 @@ class MainWindow(QMainWindow, MainUITemplate):
     @Slot()
     def on_pushButtonConnect_clicked(self):
         if self.connected:
+            self.obs_health_timer.stop()
             self.obs.stop()
             self.pushButtonConnect.setText("连接OBS")
             self.connected = False
             self.labelConState.setText("/// PRTS 未连接 ///")
             self.labelConState.setStyleSheet("")
+            self.labelConState.setToolTip("")
         else:
-            addr = self.lineEditServer.text()
-            port = self.spinBoxConPort.value()
+            # obsws_python 较重, 首次连接时导入
+            from layout import SceneLayout
+            from utils import ReqClientExGroup, parse_endpoints
+
+            # 多个OBS用逗号分隔, 没有写端口的使用端口框中的端口
+            endpoints = parse_endpoints(
+                self.lineEditServer.text(), self.spinBoxConPort.value()
+            )
+            if not endpoints:
+                QMessageBox.warning(self, "连接失败", "请输入OBS的地址")
+                return
             try:
-                self.obs = ReqClientExQThread(addr, port, "", timeout=5)
-            except Exception as e:
-                logger.error(f"OBS Client connection failed: {e}")
+                collection = SceneLayout.from_collection(SCENE_COLLECTION_PATH)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Scene collection not loaded: {e}")
+                collection = None
+            group, failures = ReqClientExGroup.connect(
+                endpoints,
+                "",
+                timeout=5,
+                collection=collection,
+                text_cache=self.text_cache,
+            )
+            if failures:
+                errors = "\n".join(f"{addr}: {e}" for addr, e in failures)
                 QMessageBox.warning(
                     self,
                     "连接失败",
-                    f"无法连接到: {addr}:{port}\n发生错误: {e}\n"
+                    f"无法连接到:\n{errors}\n"
                     "请检查OBS Websocket服务器是否已启动并设置正确的端口号\n(请不要开启身份验证!)",
                 )
+            if len(group) == 0:
                 return
+            missing = group.missing()
+            if missing:
+                lines = "\n".join(
+                    f"{addr}: {', '.join(names)}" for addr, names in missing.items()
+                )
+                QMessageBox.warning(
+                    self,
+                    "场景不完整",
+                    f"以下源在OBS的 main 场景中不存在, 相关的显示会被跳过:\n{lines}\n"
+                    "请检查是否导入了正确的场景集合",
+                )
+            self.obs = group
             self.pushButtonConnect.setText("断开OBS")
             self.connected = True
-            self.labelConState.setText("/// PRTS 已连接 ///")
-            self.labelConState.setStyleSheet("color: #93bd7a")
+            self.update_obs_health()
+            self.obs_health_timer.start(1000)
             self.obs.set_pause(self.checkBoxPause.isChecked())
             self.sync_obs_player_info()
+            # 后台测量所有选手名的宽度, 之后切换选手不再等待OBS排版
+            self.obs.prefill_text_layouts(list(self.players))
+            self.point_web_lower()
+
+    def update_obs_health(self):
+        """
+        连接状态: 全部正常为绿色, 有OBS连续请求失败时为橙色, 悬停显示每个OBS的状态
+        """
+        if not self.connected:
+            return
+        total = len(self.obs)
+        unhealthy = len(self.obs.unhealthy())
+        count = f" {total - unhealthy}/{total}" if total > 1 or unhealthy else ""
+        self.labelConState.setText(f"/// PRTS 已连接{count} ///")
+        self.labelConState.setStyleSheet(
+            "color: #e0a04a" if unhealthy else "color: #93bd7a"
+        )
+        self.labelConState.setToolTip(self.obs.status())
+
+    def export_records(self, fmt: str):
+        """
+        在后台线程流式导出全部记录, 导出期间终端可正常使用
+        """
+        if self.export_thread is not None and self.export_thread.isRunning():
+            QMessageBox.warning(self, "请稍等", "上一次导出还没有完成")
+            return
+        now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        path, _ = QFileDialog.getSaveFileName(
+            self,
+            "导出记录",
+            os.path.join(DATA_PATH, f"records_{now}.{fmt}"),
+            "CSV (*.csv)" if fmt == "csv" else "JSON Lines (*.jsonl)",
+        )
+        if not path:
+            return
+        from exporter import ExportThread
+
+        self.export_thread = ExportThread(self.players, path, fmt)
+        self.export_thread.exported.connect(
+            lambda path, count, cost: QMessageBox.information(
+                self, "导出完成", f"已导出 {count} 条记录到\n{path}"
+            )
+        )
+        self.export_thread.failed.connect(
+            lambda path, err: QMessageBox.warning(
+                self, "导出失败", f"导出到 {path} 失败\n发生错误: {err}"
+            )
+        )
+        self.export_thread.start()
+        logger.info(f"Exporting records to {path}")
+
+    def import_players(self):
+        """
+        从 CSV/JSON 名单批量添加干员, 头像在后台进程池中处理, 完成后一次性加入
+        """
+        if self.import_thread is not None and self.import_thread.isRunning():
+            QMessageBox.warning(self, "请稍等", "上一次导入还没有完成")
+            return
+        path, _ = QFileDialog.getOpenFileName(
+            self, "导入干员名单", DATA_PATH, "名单 (*.csv *.json *.jsonl)"
+        )
+        if not path:
+            return
+        # 取消选择则不导入头像
+        avatar_dir = QFileDialog.getExistingDirectory(
+            self, "选择头像文件夹", os.path.dirname(path)
+        )
+        from importer import (
+            AvatarJob,
+            ImportResult,
+            ImportThread,
+            find_avatar,
+            parse_roster,
+        )
+
+        try:
+            entries, failures = parse_roster(path)
+        except (OSError, ValueError) as e:
+            logger.exception(f"Roster {path} load failed")
+            QMessageBox.warning(self, "导入失败", f"无法读取名单 {path}\n{e}")
+            return
+        # 头像先写入暂存文件夹, 选手确定加入后再移动到头像文件夹
+        staging = tempfile.mkdtemp(prefix="import_", dir=OBS_TEMP_PATH)
+        result = ImportResult([], {}, failures)
+        jobs = []
+        for entry in entries:
+            if entry.name in self.players:
+                result.failures.append((entry.name, "干员已存在"))
+                continue
+            player = Player(
+                entry.name,
+                entry.note or DEFAULT_NOTE,
+                generate_uuid(entry.name),
+                RecordSlots(MAX_SLOT),
+            )
+            result.players.append(player)
+            if not avatar_dir:
+                continue
+            source = find_avatar(avatar_dir, entry)
+            if not source:
+                result.failures.append((entry.name, "未找到头像"))
+                continue
+            # 头像文件夹中保存两种尺寸中较大的, 界面和OBS使用时都只需缩小
+            staged = [
+                (
+                    os.path.join(staging, f"{player.uuid}_avatar.png"),
+                    os.path.join(AVATAR_PATH, f"{entry.name}.png"),
+                    max(AVATAR_SIZE, OBS_AVATAR_SIZE),
+                ),
+                (
+                    os.path.join(staging, f"{player.uuid}_obs.png"),
+                    os.path.join(
+                        OBS_TEMP_PATH, f"avatar_{OBS_AVATAR_SIZE}_{player.uuid}.png"
+                    ),
+                    OBS_AVATAR_SIZE,
+                ),
+            ]
+            result.staged[entry.name] = [(temp, final) for temp, final, _ in staged]
+            jobs.append(
+                AvatarJob(
+                    entry.name, source, tuple((temp, size) for temp, _, size in staged)
+                )
+            )
+        logger.info(
+            f"Importing {len(result.players)} players from {path}, "
+            f"{len(jobs)} avatars from {avatar_dir or '-'}"
+        )
+        self.import_thread = ImportThread(result, jobs)
+        self.import_thread.progress.connect(
+            lambda done, total: self.statusBar().showMessage(
+                f"正在处理头像 {done}/{total}"
+            )
+        )
+        self.import_thread.imported.connect(
+            lambda result: self.finish_import(result, path, staging)
+        )
+        self.import_thread.start()
+
+    def finish_import(self, result: "ImportResult", path: str, staging: str):
+        """
+        一次性加入导入的选手并保存; 导入期间新建了同名选手的跳过, 其头像也不移动
+        """
+        import shutil
+
+        added = []
+        for player in result.players:
+            if player.name in self.players:
+                result.failures.append((player.name, "干员已存在"))
+                continue
+            for temp, final in result.staged.get(player.name, []):
+                try:
+                    os.replace(temp, final)
+                except OSError as e:
+                    result.failures.append((player.name, f"头像保存失败: {e}"))
+                    break
+            self.players[player.name] = player
+            self.index().add(player)
+            added.append(player.name)
+        self.comboBoxSelPlayer.addItems(added)
+        shutil.rmtree(staging, ignore_errors=True)
+        self.save_database()
+        self.statusBar().clearMessage()
+        logger.success(
+            f"Imported {len(added)} players from {path}, "
+            f"{len(result.failures)} failures"
+        )
+        TextReportDialog(
+            "导入结果", lambda: f"{path}\n\n{result.summary(len(added))}", self
+        ).exec()
+
+    def show_analytics(self):
+        """
+        统计全部有效记录, 直接使用内存中的数据, 不读取数据库
+        """
+        from analytics import analyze  # numpy 较重, 使用时才导入
+
+        TextReportDialog("赛季统计", lambda: analyze(self.players), self).exec()
 
     @Slot()
     def on_pushButtonClrLowers_clicked(self):
-        if not self.connected:
+        if not self.connected and self.overlay is None:
             logger.warning("OBS not connected")
             return
-        self.obs.clear()
+        if self.connected:
+            self.obs.clear()
+        if self.overlay is not None:
+            self.overlay.clear()
 
     @Slot()
     def on_checkBoxPause_toggled(self):
-        if not self.connected:
+        if not self.connected and self.overlay is None:
             return
-        self.obs.set_pause(self.checkBoxPause.isChecked())
+        if self.connected:
+            self.obs.set_pause(self.checkBoxPause.isChecked())
+        if self.overlay is not None:
+            self.overlay.set_pause(self.checkBoxPause.isChecked())
         if not self.checkBoxPause.isChecked():
             self.sync_obs_player_info()
 
+    def toggle_overlay(self, enabled: bool):
+        """
+        启动/关闭内置的网页叠加层 (包括场景中字幕条使用的 /lower), 默认关闭
+        在OBS中添加浏览器源打开显示的地址即可
+        """
+        if not enabled:
+            if self.overlay is not None:
+                self.overlay.stop()
+                self.overlay = None
+            self.actionOverlayUrl.setEnabled(False)
+            return
+        from overlay import LAN_HOST, LOCAL_HOST, OVERLAY_PORT, OverlayServer
+
+        host = LAN_HOST if self.actionOverlayLan.isChecked() else LOCAL_HOST
+        try:
+            self.overlay = OverlayServer(
+                [DATA_PATH, RESOURCE_PATH], host=host, port=OVERLAY_PORT
+            )
+        except OSError as e:
+            logger.error(f"Overlay server start failed: {e}")
+            QMessageBox.warning(self, "启动失败", f"无法监听端口 {OVERLAY_PORT}\n{e}")
+            self.actionOverlay.blockSignals(True)
+            self.actionOverlay.setChecked(False)
+            self.actionOverlay.blockSignals(False)
+            return
+        self.overlay.set_pause(self.checkBoxPause.isChecked())
+        self.overlay.start()
+        self.actionOverlayUrl.setEnabled(True)
+        self.sync_obs_player_info()
+        self.point_web_lower()
+        QMessageBox.information(
+            self,
+            "网页叠加层已启动",
+            f"在OBS中添加 1920x1080 的浏览器源, 地址为\n{self.overlay.url}",
+        )
+
+    def toggle_overlay_lan(self, enabled: bool):
+        """
+        修改监听地址, 叠加层已启动时重新启动
+        """
+        if self.overlay is not None:
+            self.actionOverlay.setChecked(False)
+            self.actionOverlay.setChecked(True)
+
+    def point_web_lower(self):
+        """
+        把各个OBS场景中的字幕条指向叠加层的 /lower, 其他电脑上的OBS使用本机的局域网地址
+        """
+        if not self.connected or self.overlay is None:
+            return
+        unreachable = self.obs.point_web_lower(self.overlay.lower_url)
+        if unreachable:
+            logger.warning(f"Lower thirds page unreachable from OBS {unreachable}")
+            self.statusBar().showMessage(
+                f"{', '.join(unreachable)} 不是本机的OBS, "
+                "需要在菜单 叠加层 中允许局域网访问才能显示字幕条"
+            )
+
+    def start_watchdog(self):
+        from stall_watchdog import StallWatchdog
+
+        self.watchdog = StallWatchdog(self)
+        self.watchdog.start()
+
+    def toggle_profiling(self, enabled: bool):
+        """
+        开始/停止性能采样, 停止时把主线程的折叠栈写入数据文件夹
+        可以用 flamegraph.pl 或 https://www.speedscope.app 查看
+        """
+        if self.watchdog is None:
+            self.start_watchdog()
+        if enabled:
+            self.watchdog.start_profile()
+            self.statusBar().showMessage("性能采样中...")
+            return
+        path = os.path.join(DATA_PATH, PROFILE_NAME.format(datetime.datetime.now()))
+        try:
+            samples = self.watchdog.stop_profile(path)
+        except OSError as e:
+            logger.error(f"Profile save failed: {e}")
+            QMessageBox.warning(self, "错误", f"性能采样保存失败:\n{e}")
+            return
+        self.statusBar().showMessage(f"性能采样已保存: {path} ({samples} 次采样)")
+
+    def copy_overlay_url(self):
+        if self.overlay is not None:
+            QApplication.clipboard().setText(self.overlay.url)
+
     ############## 以下为分数逻辑 ##############
 
     @Slot(int)
@@ -854,7 +1969,15 @@ def clear_splash():
             os.unlink(splash_filename)
 
 
+def on_first_paint():
+    # 事件循环首次空闲时窗口已完成首次绘制, 可以响应操作
+    timeline.mark("first paint")
+    timeline.log_report()
+
+
 def main() -> int:
+    with timeline.stage("environment"):
+        init_environment()
     argv = sys.argv
     if DARK_THEME:
         argv += [
@@ -864,11 +1987,18 @@ def main() -> int:
             "Windows",
         ]  # or "Fusion" ?
     app = QApplication(argv)
+    timeline.mark("qapplication")
     win = MainWindow()
-    qdarktheme.setup_theme(theme="dark" if DARK_THEME else "light")
+    with timeline.stage("theme"):
+        import qdarktheme  # qdarktheme import after QT
+
+        qdarktheme.setup_theme(theme="dark" if DARK_THEME else "light")
     win.show()
     clear_splash()
-    return app.exec()
+    QTimer.singleShot(0, on_first_paint)
+    ret = app.exec()
+    shutdown_logging()
+    return ret
 
 
 if __name__ == "__main__":
@@ -0,0 +1,315 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import TYPE_CHECKING, Callable, NamedTuple
+
+from loguru import logger
+
+# shelve 和 snapshot 只在需要迁移时才导入, 不拖慢启动
+if TYPE_CHECKING:
+    from snapshot import PlayerRow
+
+VERSION_KEY = "__version__"
+UNVERSIONED = "0.0.0"  # 没有版本号的旧数据库
+DBM_SUFFIXES = ("", ".db", ".dat", ".dir", ".bak", ".pag")  # 各种 dbm 后端的文件
+TEMP_SUFFIX = ".migrating"
+JOURNAL_SUFFIX = ".migrating.json"  # 替换文件前写入, 中断后下次启动继续替换
+
+
+class MigrationError(Exception):
+    # 迁移后的数据库校验失败, 原数据库保持不变
+    pass
+
+
+class Migration(NamedTuple):
+    version: str  # 迁移后的版本, 低于这个版本的数据库需要执行
+    description: str
+    apply: Callable[[object], object]  # 输入旧的选手对象, 返回新的选手对象
+
+
+def parse_version(version: str) -> tuple[int, ...]:
+    return tuple(int(part) for part in version.split("."))
+
+
+def db_files(prefix: str) -> list[str]:
+    """
+    shelve 数据库对应的所有文件, 不同的 dbm 后端文件名后缀不同
+    """
+    files = []
+    for path in glob.glob(glob.escape(prefix) + "*"):
+        if path[len(prefix) :] in DBM_SUFFIXES:
+            files.append(path)
+    return sorted(files)
+
+
+def remove_db(prefix: str):
+    for path in db_files(prefix):
+        os.remove(path)
+
+
+def stored_version(path: str) -> str | None:
+    if not db_files(path):
+        return None
+    import shelve
+
+    with shelve.open(path, "r") as db:
+        return db.get(VERSION_KEY, UNVERSIONED)
+
+
+def pending(migrations: list[Migration], version: str, target: str) -> list[Migration]:
+    """
+    从 version 升级到 target 需要依次执行的迁移
+    """
+    current, final = parse_version(version), parse_version(target)
+    steps = [m for m in migrations if current < parse_version(m.version) <= final]
+    return sorted(steps, key=lambda m: parse_version(m.version))
+
+
+def verify(path: str, count: int, version: str, check: Callable[[str, object], bool]):
+    """
+    逐个重新读取迁移后的选手, 检查数量, 版本号和内容
+    """
+    import shelve
+
+    with shelve.open(path, "r") as db:
+        if db.get(VERSION_KEY) != version:
+            raise MigrationError(f"version is {db.get(VERSION_KEY)}, expect {version}")
+        n = 0
+        for key in db.keys():
+            if key == VERSION_KEY:
+                continue
+            if not check(key, db[key]):
+                raise MigrationError(f"player {key} failed verification")
+            n += 1
+    if n != count:
+        raise MigrationError(f"{n} players after migration, expect {count}")
+
+
+def write_journal(path: str, journal: dict):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(journal, f)
+    os.replace(temp_path, path)
+
+
+def finish_swap(path: str, journal: dict):
+    """
+    原数据库移到备份, 新数据库移到原位置, 每一步都可以重复执行
+    """
+    temp = path + TEMP_SUFFIX
+    if all(os.path.exists(temp + suffix) for suffix in journal["suffixes"]):
+        # 新文件还没有开始移动, 原位置的都是旧文件
+        for file in db_files(path):
+            os.replace(file, journal["backup"] + file[len(path) :])
+    for suffix in journal["suffixes"]:
+        if os.path.exists(temp + suffix):
+            os.replace(temp + suffix, path + suffix)
+    os.remove(path + JOURNAL_SUFFIX)
+
+
+def recover(path: str):
+    """
+    上次迁移在替换文件时中断, 继续完成替换; 没有写入日志的临时文件直接删除
+    """
+    journal_path = path + JOURNAL_SUFFIX
+    if os.path.exists(journal_path):
+        with open(journal_path, encoding="utf-8") as f:
+            journal = json.load(f)
+        logger.warning(f"Resuming interrupted database migration of {path}")
+        finish_swap(path, journal)
+    remove_db(path + TEMP_SUFFIX)
+
+
+def migrate_database(
+    path: str,
+    target: str,
+    migrations: list[Migration],
+    check: Callable[[str, object], bool] = lambda key, value: True,
+) -> bool:
+    """
+    把数据库升级到 target 版本, 返回是否进行了迁移
+
+    选手逐个读出, 依次经过所有迁移后写入新数据库, 内存中同时只有一个选手;
+    新数据库校验通过后替换原数据库, 原数据库保留为 <path>.v<旧版本>
+    迁移失败时原数据库不变, 抛出异常
+    """
+    import shelve
+
+    recover(path)
+    version = stored_version(path)
+    if version is None or parse_version(version) >= parse_version(target):
+        return False
+    steps = pending(migrations, version, target)
+    if not steps:
+        with shelve.open(path) as db:
+            db[VERSION_KEY] = target
+        logger.info(f"Database version {version} -> {target}, no migration needed")
+        return True
+
+    logger.info(
+        f"Migrating database {version} -> {target}: "
+        + ", ".join(f"{m.version} {m.description}" for m in steps)
+    )
+    temp = path + TEMP_SUFFIX
+    t0 = time.perf_counter()
+    count = 0
+    try:
+        with shelve.open(path, "r") as old, shelve.open(temp, "n") as new:
+            for key in old.keys():
+                if key == VERSION_KEY:
+                    continue
+                value = old[key]
+                for step in steps:
+                    value = step.apply(value)
+                new[key] = value
+                count += 1
+            new[VERSION_KEY] = target
+        t1 = time.perf_counter()
+        verify(temp, count, target, check)
+    except Exception:
+        remove_db(temp)
+        raise
+    t2 = time.perf_counter()
+
+    size = sum(os.path.getsize(file) for file in db_files(path))
+    journal = {
+        "suffixes": [file[len(temp) :] for file in db_files(temp)],
+        "backup": f"{path}.v{version}",
+    }
+    write_journal(path + JOURNAL_SUFFIX, journal)
+    finish_swap(path, journal)
+    elapsed = max(t1 - t0, 1e-9)
+    logger.success(
+        f"Database migrated {version} -> {target}: {count} players, "
+        f"convert {t1 - t0:.3f}s ({count / elapsed:.0f} players/s, "
+        f"{size / elapsed / 1e6:.1f} MB/s), verify {t2 - t1:.3f}s, "
+        f"old database kept as {journal['backup']}"
+    )
+    return True
+
+
+def row_digest(row: "PlayerRow") -> bytes:
+    """
+    选手行的校验和, 与字符串是否已解码, 计分明细是列表还是元组无关
+    """
+    text = lambda v: v.decode("utf-8") if isinstance(v, bytes) else v
+    records = [
+        (
+            r.slot,
+            [text(item) for item in r.data],
+            r.base_score,
+            r.score,
+            text(r.start_operator),
+            text(r.start_team),
+            r.time,
+            r.valid,
+        )
+        for r in row.records
+    ]
+    canonical = (text(row.name), text(row.note), text(row.uuid), row.size, records)
+    return hashlib.blake2b(repr(canonical).encode("utf-8"), digest_size=16).digest()
+
+
+def verify_snapshot(
+    path: str,
+    version: str,
+    digests: list[tuple[str, bytes]],
+    decode: Callable[["PlayerRow"], object],
+    check: Callable[[str, object], bool],
+):
+    """
+    重新映射迁移后的快照, 按顺序核对每个选手的名字和写入时的校验和
+    """
+    from snapshot import SnapshotReader
+
+    reader = SnapshotReader(path)
+    try:
+        if reader.version != version:
+            raise MigrationError(f"version is {reader.version}, expect {version}")
+        if len(reader) != len(digests):
+            raise MigrationError(
+                f"{len(reader)} players after migration, expect {len(digests)}"
+            )
+        for i, (name, digest) in enumerate(digests):
+            row = reader.row(i)
+            if row.name != name or row_digest(row) != digest:
+                raise MigrationError(f"player {name} checksum mismatch")
+            if not check(name, decode(row)):
+                raise MigrationError(f"player {name} failed verification")
+    finally:
+        reader.close()
+
+
+def migrate_snapshot(
+    path: str,
+    target: str,
+    migrations: list[Migration],
+    decode: Callable[["PlayerRow"], object],
+    encode: Callable[[object], "PlayerRow"],
+    check: Callable[[str, object], bool] = lambda key, value: True,
+) -> bool:
+    """
+    把选手快照升级到 target 版本, 返回是否进行了迁移
+
+    选手逐个解码, 依次经过所有迁移后编码写入临时快照, 同时记录校验和;
+    核对选手数与原快照一致, 每个选手的校验和一致后替换原快照, 原快照保留为 <path>.v<旧版本>
+    迁移失败时原快照不变, 抛出异常
+    """
+    from snapshot import SnapshotReader, write_snapshot
+
+    temp = path + TEMP_SUFFIX
+    if os.path.exists(temp):
+        # 上次迁移在校验完成前中断
+        os.remove(temp)
+    source = SnapshotReader(path)
+    try:
+        version = source.version
+        if parse_version(version) >= parse_version(target):
+            return False
+        steps = pending(migrations, version, target)
+        logger.info(
+            f"Migrating snapshot {version} -> {target}: "
+            + ", ".join(f"{m.version} {m.description}" for m in steps)
+        )
+        digests: list[tuple[str, bytes]] = []
+
+        def rows():
+            for i in range(len(source)):
+                player = decode(source.row(i))
+                for step in steps:
+                    player = step.apply(player)
+                row = encode(player)
+                digests.append((row.name, row_digest(row)))
+                yield row
+
+        t0 = time.perf_counter()
+        try:
+            count = write_snapshot(temp, target, rows())
+            t1 = time.perf_counter()
+            if count != len(source):
+                raise MigrationError(
+                    f"{count} players after migration, expect {len(source)}"
+                )
+            verify_snapshot(temp, target, digests, decode, check)
+        except Exception:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        t2 = time.perf_counter()
+    finally:
+        # Windows 下不能替换正在映射的文件
+        source.close()
+
+    backup = f"{path}.v{version}"
+    shutil.copy2(path, backup)
+    os.replace(temp, path)
+    elapsed = max(t1 - t0, 1e-9)
+    logger.success(
+        f"Snapshot migrated {version} -> {target}: {count} players, "
+        f"convert {t1 - t0:.3f}s ({count / elapsed:.0f} players/s), "
+        f"verify {t2 - t1:.3f}s, old snapshot kept as {backup}"
+    )
+    return True
@@ -0,0 +1,403 @@
+import base64
+import hashlib
+import ipaddress
+import json
+import os
+import socket
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty as QueueEmptyError
+from queue import Full as QueueFullError
+from queue import Queue
+from urllib.parse import parse_qs, quote, urlsplit
+
+from loguru import logger
+
+OVERLAY_PORT = 4470  # 默认叠加层端口
+OVERLAY_DIR = os.path.dirname(os.path.abspath(__file__))
+OVERLAY_PAGE = os.path.join(OVERLAY_DIR, "overlay.html")
+LOWER_PAGE = os.path.join(OVERLAY_DIR, "lower.html")  # 本地字幕条
+LOWER_PATH = "/lower"
+LOCAL_HOST = "127.0.0.1"  # 默认只有本机的OBS可以访问
+LAN_HOST = "0.0.0.0"  # 允许局域网访问时监听所有网卡, 其他电脑的OBS也能打开页面
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+SEND_TIMEOUT = 1  # 浏览器超过这个时间收不下数据就断开
+OUTBOX_SIZE = 256  # 每个页面待发送的消息数上限, 超过说明页面卡住了, 直接断开 (页面会自动重连)
+RETAINED = ("player", "start", "score")  # 新连接的页面会立即收到这些状态
+
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+}
+
+
+def lan_address() -> str:
+    """
+    本机在局域网中的地址 (默认路由所在网卡), 获取失败时返回 127.0.0.1
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        try:
+            s.connect(("10.255.255.255", 1))  # UDP 不会真的发送数据
+            return s.getsockname()[0]
+        except OSError:
+            return LOCAL_HOST
+
+
+def is_loopback(host: str) -> bool:
+    if host.lower() == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class _WebSocket:
+    # 最简单的服务端 WebSocket, 只发送文本帧, 收到的数据帧直接忽略
+    # 推送的消息先放入发件队列, 由每个连接自己的发送线程写入, 主线程从不等待网络
+    def __init__(self, connection: socket.socket):
+        self.connection = connection
+        self.lock = threading.Lock()
+        self.outbox: Queue[str | None] = Queue(OUTBOX_SIZE)
+        self.closed = threading.Event()
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+
+    def send_frame(self, opcode: int, payload: bytes):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        with self.lock:
+            self.connection.sendall(header + payload)
+
+    def send_text(self, text: str):
+        self.send_frame(0x1, text.encode("utf-8"))
+
+    def queue_text(self, text: str) -> bool:
+        """
+        放入发件队列, 不等待发送, 队列已满或连接已关闭时返回 False
+        """
+        if self.closed.is_set():
+            return False
+        try:
+            self.outbox.put_nowait(text)
+        except QueueFullError:
+            return False
+        return True
+
+    def write_loop(self):
+        while not self.closed.is_set():
+            try:
+                text = self.outbox.get(timeout=1)
+            except QueueEmptyError:
+                continue
+            if text is None:
+                return
+            try:
+                self.send_text(text)
+            except OSError as e:
+                if not self.closed.is_set():
+                    logger.warning(f"Overlay page send failed: {e}")
+                self.close()
+                return
+
+    def close(self):
+        """
+        关闭连接, 读取线程和发送线程随之退出, 可以重复调用
+        """
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        try:
+            self.outbox.put_nowait(None)
+        except QueueFullError:
+            pass  # 发送线程没有在等待队列, 发送失败或检查标志后退出
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def recv_exact(self, size: int) -> bytes:
+        # 连接设置了发送超时, 读取时忽略超时继续等待
+        data = b""
+        while len(data) < size:
+            try:
+                chunk = self.connection.recv(size - len(data))
+            except socket.timeout:
+                continue
+            if not chunk:
+                raise ConnectionError("closed")
+            data += chunk
+        return data
+
+    def read_frame(self) -> tuple[int, bytes]:
+        head = self.recv_exact(2)
+        opcode = head[0] & 0x0F
+        length = head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self.recv_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self.recv_exact(8))[0]
+        mask = self.recv_exact(4) if head[1] & 0x80 else b""
+        payload = self.recv_exact(length)
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return opcode, payload
+
+    def serve(self):
+        """
+        处理浏览器发来的控制帧, 直到连接关闭
+        """
+        while True:
+            opcode, payload = self.read_frame()
+            if opcode == 0x8:  # close
+                self.send_frame(0x8, payload[:2])
+                return
+            if opcode == 0x9:  # ping
+                self.send_frame(0xA, payload)
+
+
+class _OverlayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.trace(f"Overlay {self.address_string()} {format % args}")
+
+    def send_body(self, body: bytes, content_type: str, cache: bool = False):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "max-age=86400" if cache else "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        overlay: OverlayServer = self.server.overlay
+        url = urlsplit(self.path)
+        if url.path == "/ws":
+            self.handle_websocket(overlay)
+        elif url.path in overlay.pages:
+            self.send_body(overlay.page(url.path), CONTENT_TYPES[".html"])
+        elif url.path == "/file":
+            path = parse_qs(url.query).get("path", [""])[0]
+            data = overlay.read_file(path)
+            if data is None:
+                self.send_error(404)
+                return
+            ext = os.path.splitext(path)[1].lower()
+            self.send_body(
+                data, CONTENT_TYPES.get(ext, "application/octet-stream"), True
+            )
+        else:
+            self.send_error(404)
+
+    def handle_websocket(self, overlay: "OverlayServer"):
+        key = self.headers.get("Sec-WebSocket-Key")
+        if self.headers.get("Upgrade", "").lower() != "websocket" or not key:
+            self.send_error(400)
+            return
+        accept = base64.b64encode(
+            hashlib.sha1((key + WS_GUID).encode("ascii")).digest()
+        ).decode("ascii")
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+        self.connection.settimeout(SEND_TIMEOUT)
+        ws = _WebSocket(self.connection)
+        ws.writer.start()
+        overlay.join(ws)
+        try:
+            ws.serve()
+        except (OSError, ConnectionError, struct.error):
+            pass
+        finally:
+            overlay.leave(ws)
+
+
+class _OverlayHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class OverlayServer:
+    # 内置的网页叠加层, OBS 浏览器源打开页面后通过 WebSocket 接收状态, 由浏览器渲染
+    # 方法与 ReqClientEx 的同名方法参数一致, 可以和OBS客户端一样调用
+    def __init__(
+        self, roots: list[str], host: str = "127.0.0.1", port: int = OVERLAY_PORT
+    ):
+        self.roots = [os.path.abspath(root) for root in roots]  # 允许访问的文件夹
+        self.server = _OverlayHTTPServer((host, port), _OverlayHandler)
+        self.server.overlay = self
+        self.pages = {"/": OVERLAY_PAGE, LOWER_PATH: LOWER_PAGE}
+        self.page_cache: dict[str, bytes] = {}
+        self.clients: set[_WebSocket] = set()
+        self.state: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.paused = False
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def lan(self) -> bool:
+        return self.server.server_address[0] == LAN_HOST
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        if self.lan:
+            host = lan_address()
+        return f"http://{host}:{port}/"
+
+    def lower_url(self, obs_host: str) -> str | None:
+        """
+        地址为 obs_host 的OBS可以打开的字幕条地址, 其他电脑的OBS需要允许局域网访问, 否则返回 None
+        """
+        port = self.server.server_address[1]
+        if is_loopback(obs_host):
+            return f"http://{LOCAL_HOST}:{port}{LOWER_PATH}"
+        if self.lan:
+            return f"http://{lan_address()}:{port}{LOWER_PATH}"
+        return None
+
+    def start(self):
+        self.thread.start()
+        logger.success(f"Overlay server listening on {self.url}")
+
+    def stop(self):
+        self.server.shutdown()
+        with self.lock:
+            for ws in self.clients:
+                ws.close()
+            self.clients.clear()
+        self.server.server_close()
+        logger.info("Overlay server stopped")
+
+    def page(self, path: str) -> bytes:
+        """
+        页面只读取一次, 之后只通过 WebSocket 推送参数
+        """
+        data = self.page_cache.get(path)
+        if data is None:
+            with open(self.pages[path], "rb") as f:
+                data = f.read()
+            self.page_cache[path] = data
+        return data
+
+    def allowed(self, path: str) -> bool:
+        for root in self.roots:
+            try:
+                if os.path.commonpath([root, path]) == root:
+                    return True
+            except ValueError:  # 不同盘符
+                pass
+        return False
+
+    def read_file(self, path: str) -> bytes | None:
+        path = os.path.abspath(path)
+        if not self.allowed(path):
+            logger.warning(f"Overlay refused file outside resource folders: {path}")
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def file_url(self, path: str) -> str:
+        """
+        本地文件的页面地址, 带上修改时间, 文件变化后浏览器重新载入
+        """
+        if not path:
+            return ""
+        try:
+            mtime = int(os.path.getmtime(path))
+        except OSError:
+            return ""
+        return f"/file?path={quote(os.path.abspath(path))}&v={mtime}"
+
+    def join(self, ws: _WebSocket):
+        with self.lock:
+            state = {"type": "state", **self.state}
+            ws.queue_text(json.dumps(state, ensure_ascii=False))
+            self.clients.add(ws)
+        logger.info(f"Overlay page connected ({len(self.clients)} open)")
+
+    def leave(self, ws: _WebSocket):
+        with self.lock:
+            self.clients.discard(ws)
+        ws.close()
+        logger.info(f"Overlay page disconnected ({len(self.clients)} open)")
+
+    def push(self, msg: dict):
+        """
+        推送一条消息到所有页面, 状态类消息会保存下来发给之后连接的页面
+        只放入各页面的发件队列, 在主线程调用也不会等待网络; 积压过多的页面被断开
+        """
+        if self.paused:
+            return
+        text = json.dumps(msg, ensure_ascii=False)
+        with self.lock:
+            if msg["type"] in RETAINED:
+                self.state[msg["type"]] = msg
+            for ws in list(self.clients):
+                if not ws.queue_text(text):
+                    logger.warning("Overlay page dropped: not keeping up")
+                    self.clients.discard(ws)
+                    ws.close()
+
+    def set_pause(self, pause: bool):
+        self.paused = pause
+
+    def clear(self):
+        self.push({"type": "clear"})
+
+    def set_player(self, name: str, avatar_path: str):
+        self.push(
+            {"type": "player", "name": name, "avatar": self.file_url(avatar_path)}
+        )
+
+    def set_start(self, team_path: str, operator_path: str):
+        self.push(
+            {
+                "type": "start",
+                "team": self.file_url(team_path),
+                "operator": self.file_url(operator_path),
+            }
+        )
+
+    def set_score(self, score: str):
+        self.push({"type": "score", "score": str(score)})
+
+    def display_lower(
+        self,
+        line1: str,
+        line2: str,
+        num: int,
+        duration: float = 3,
+        animation: float = 1,
+        plus_bk_path: str = "plus.png",
+        minus_bk_path: str = "minus.png",
+    ):
+        self.push(
+            {
+                "type": "lower",
+                "line1": line1,
+                "line2": line2,
+                "num": num,
+                "duration": duration,
+                "animation": animation,
+                "background": self.file_url(
+                    plus_bk_path if num >= 0 else minus_bk_path
+                ),
+            }
+        )
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+
+from loguru import logger
+from PySide6.QtCore import QSize, Qt, QThread, Signal
+from PySide6.QtGui import QIcon, QImage, QPainter
+from PySide6.QtWidgets import QComboBox
+
+MANIFEST_VERSION = 1
+ICON_CACHE_VERSION = 1  # 修改缩放逻辑后需要递增, 旧缓存自动失效
+
+
+@dataclass
+class ResourceEntry:
+    name: str  # 资源名, 即不带扩展名的文件名
+    path: str  # 绝对路径
+    size: int  # 文件大小
+    mtime: float  # 修改时间
+    hash: str  # 内容哈希
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ResourceManifest:
+    # 资源文件夹清单, 缓存到磁盘, 启动时只需 stat 即可校验, 内容变化的文件才重新计算哈希
+    def __init__(self, directory: str, cache_path: str, ext: str = ".png"):
+        self.directory = directory
+        self.cache_path = cache_path
+        self.ext = ext
+        self.entries: dict[str, ResourceEntry] = {}
+        self.names: list[str] = []
+        self.index: dict[str, int] = {}  # 资源名 -> names 中的位置
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, name: str) -> ResourceEntry:
+        return self.entries[name]
+
+    def path(self, name: str) -> str:
+        """
+        资源路径, 资源不存在时返回空字符串
+        """
+        entry = self.entries.get(name)
+        return entry.path if entry else ""
+
+    def index_of(self, name: str) -> int:
+        return self.index.get(name, -1)
+
+    def _load_cache(self) -> dict[str, dict]:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if cache.get("version") != MANIFEST_VERSION:
+            return {}
+        return cache.get("dirs", {}).get(self.directory, {})
+
+    def _save_cache(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if cache.get("version") != MANIFEST_VERSION:
+                raise ValueError
+        except (OSError, ValueError):
+            cache = {"version": MANIFEST_VERSION, "dirs": {}}
+        cache["dirs"][self.directory] = {
+            name: asdict(entry) for name, entry in self.entries.items()
+        }
+        temp_path = self.cache_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(temp_path, self.cache_path)
+
+    def load(self) -> "ResourceManifest":
+        """
+        扫描资源文件夹, 与磁盘缓存比对后更新清单
+        """
+        cached = self._load_cache()
+        entries = {}
+        hashed = 0
+        if os.path.isdir(self.directory):
+            for item in os.scandir(self.directory):
+                if not item.is_file() or not item.name.endswith(self.ext):
+                    continue
+                name = os.path.splitext(item.name)[0]
+                stat = item.stat()
+                old = cached.get(name)
+                if (
+                    old is not None
+                    and old["size"] == stat.st_size
+                    and old["mtime"] == stat.st_mtime
+                ):
+                    entries[name] = ResourceEntry(**old)
+                    continue
+                entries[name] = ResourceEntry(
+                    name,
+                    os.path.abspath(item.path),
+                    stat.st_size,
+                    stat.st_mtime,
+                    file_hash(item.path),
+                )
+                hashed += 1
+        self.entries = entries
+        self.names = sorted(entries)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        if hashed or len(entries) != len(cached):
+            try:
+                self._save_cache()
+            except OSError as e:
+                logger.warning(f"Resource manifest cache save failed: {e}")
+        logger.debug(
+            f"Resource manifest for {self.directory} loaded: "
+            f"{len(self.names)} files, {hashed} rehashed"
+        )
+        return self
+
+
+def fill_combobox(combobox: QComboBox, names: list[str]):
+    """
+    一次性添加全部选项, 期间屏蔽信号
+    """
+    combobox.blockSignals(True)
+    try:
+        combobox.addItems(names)
+    finally:
+        combobox.blockSignals(False)
+
+
+class IconCache:
+    # 预缩放图标缓存, 路径包含版本号/尺寸/内容哈希, 源文件变化后自动使用新文件
+    def __init__(self, cache_dir: str):
+        self.cache_dir = os.path.join(cache_dir, f"v{ICON_CACHE_VERSION}")
+
+    def cached_path(self, entry: ResourceEntry, size: int) -> str:
+        return os.path.join(self.cache_dir, str(size), f"{entry.hash}.png")
+
+    def path(self, entry: ResourceEntry, size: int) -> str:
+        """
+        已缓存则返回预缩放的图标, 否则返回原图
+        """
+        path = self.cached_path(entry, size)
+        return path if os.path.exists(path) else entry.path
+
+    def build(self, entry: ResourceEntry, size: int) -> bool:
+        """
+        生成 size x size 的图标, 非正方形的原图等比缩放后居中, 返回是否新生成
+        """
+        path = self.cached_path(entry, size)
+        if os.path.exists(path):
+            return False
+        image = QImage(entry.path)
+        if image.isNull():
+            raise ValueError(f"Failed to decode {entry.path}")
+        scaled = image.scaled(
+            size,
+            size,
+            Qt.AspectRatioMode.KeepAspectRatio,
+            Qt.TransformationMode.SmoothTransformation,
+        )
+        canvas = QImage(size, size, QImage.Format.Format_ARGB32_Premultiplied)
+        canvas.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(canvas)
+        painter.drawImage(
+            (size - scaled.width()) // 2, (size - scaled.height()) // 2, scaled
+        )
+        painter.end()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp.png"
+        if not canvas.save(temp_path, "PNG"):
+            raise OSError(f"Failed to save {temp_path}")
+        os.replace(temp_path, path)
+        return True
+
+
+class IconPrepareThread(QThread):
+    # 后台生成全部图标, QImage 可以在非GUI线程使用
+    prepared = Signal(int, float)  # 新生成数量, 耗时
+
+    def __init__(self, cache: IconCache, jobs: list[tuple[ResourceManifest, int]]):
+        super().__init__()
+        self.cache = cache
+        self.jobs = jobs
+
+    def run(self):
+        t0 = time.perf_counter()
+        count = 0
+        for manifest, size in self.jobs:
+            for name in manifest.names:
+                try:
+                    count += self.cache.build(manifest[name], size)
+                except Exception as e:
+                    logger.warning(f"Icon {name} ({size}px) prepare failed: {e}")
+        cost = time.perf_counter() - t0
+        logger.debug(f"Icon cache prepared: {count} new icons in {cost:.3f}s")
+        self.prepared.emit(count, cost)
+
+
+def set_combobox_icons(
+    combobox: QComboBox,
+    manifest: ResourceManifest,
+    cache: IconCache,
+    size: int,
+    offset: int = 0,
+):
+    """
+    为选项设置缩略图, offset 为资源前的固定选项数
+    """
+    combobox.setIconSize(QSize(size, size))
+    for i, name in enumerate(manifest.names):
+        combobox.setItemIcon(i + offset, QIcon(cache.path(manifest[name], size)))
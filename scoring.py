@@ -0,0 +1,66 @@
+def parse_entry(text: str) -> tuple[str, float]:
+    """
+    解析一条计分记录文本, 返回 (类型, 数值)
+
+    类型: "multi" 乘算倍率, "add" 加分, "sub" 减分, "" 无法识别
+    """
+    token = text.rsplit(" ", 1)[-1]
+    try:
+        if token.startswith("x"):
+            return "multi", float(token[1:])
+        elif token.startswith("+"):
+            return "add", int(token[1:])
+        elif token.startswith("-"):
+            return "sub", int(token[1:])
+    except ValueError:
+        pass
+    return "", 0
+
+
+STAR_TAGS = ("六星", "五星", "四星")  # 统计临时招募星级
+
+
+class ScoreAggregate:
+    # 总分的增量计算, 增删一条记录只需 O(1) 更新
+    def __init__(self, base_score: int = 0, data: list[str] = ()):
+        self.base_score = base_score
+        self.add = 0  # 加减分之和
+        self.multi = 0.0  # 乘算倍率之和
+        self.stars = dict.fromkeys(STAR_TAGS, 0)
+        for text in data:
+            self.update(text)
+
+    def update(self, text: str, sign: int = 1):
+        """
+        添加 (sign=1) 或移除 (sign=-1) 一条记录
+        """
+        kind, value = parse_entry(text)
+        if kind == "multi":
+            self.multi += sign * value
+        elif kind == "add":
+            self.add += sign * value
+        elif kind == "sub":
+            self.add -= sign * value
+        for tag in STAR_TAGS:
+            if tag in text:
+                self.stars[tag] += sign
+                break
+
+    @property
+    def score(self) -> float:
+        """
+        总分: (基础分 + 加减分) * (1 + 乘算倍率之和)
+        """
+        score = self.base_score + self.add
+        multi = round(self.multi, 8)  # 消除增删带来的浮点误差
+        if multi != 0:
+            score *= 1 + multi
+        return score
+
+
+def calc_score(base_score: int, data: list[str]) -> float:
+    return ScoreAggregate(base_score, data).score
+
+
+def format_score(score: float) -> str:
+    return f"{score:.4f}".rstrip("0").rstrip(".")
@@ -0,0 +1,199 @@
+from bisect import bisect_left
+from typing import Iterable
+
+# GB2312 一级汉字按拼音排序, 每个声母第一个字的 GBK 编码
+PINYIN_BOUNDARIES = (
+    (0xB0A1, "a"),
+    (0xB0C5, "b"),
+    (0xB2C1, "c"),
+    (0xB4EE, "d"),
+    (0xB6EA, "e"),
+    (0xB7A2, "f"),
+    (0xB8C1, "g"),
+    (0xB9FE, "h"),
+    (0xBBF7, "j"),
+    (0xBFA6, "k"),
+    (0xC0AC, "l"),
+    (0xC2E8, "m"),
+    (0xC4C3, "n"),
+    (0xC5B6, "o"),
+    (0xC5BE, "p"),
+    (0xC6DA, "q"),
+    (0xC8BB, "r"),
+    (0xC8F6, "s"),
+    (0xCBFA, "t"),
+    (0xCDDA, "w"),
+    (0xCEF4, "x"),
+    (0xD1B9, "y"),
+    (0xD4D1, "z"),
+)
+PINYIN_END = 0xD7FA  # 一级汉字结束, 二级汉字按部首排序无法取声母
+PINYIN_CODES = [code for code, _ in PINYIN_BOUNDARIES]
+
+GRAM = 3
+MAX_RESULTS = 20
+
+
+def pinyin_initial(char: str) -> str:
+    """
+    汉字的拼音首字母, 只支持 GB2312 一级汉字, 多音字取编码表中的读音
+    """
+    try:
+        data = char.encode("gbk")
+    except UnicodeEncodeError:
+        return ""
+    if len(data) != 2:
+        return ""
+    code = data[0] << 8 | data[1]
+    if not PINYIN_CODES[0] <= code < PINYIN_END:
+        return ""
+    return PINYIN_BOUNDARIES[bisect_left(PINYIN_CODES, code + 1) - 1][1]
+
+
+def pinyin_initials(text: str) -> str:
+    """
+    "迷迭香" -> "mdx", 字母数字原样保留, 其他字符丢弃
+    """
+    result = []
+    for char in text.casefold():
+        if char.isascii():
+            if char.isalnum():
+                result.append(char)
+        else:
+            result.append(pinyin_initial(char))
+    return "".join(result)
+
+
+def grams(text: str) -> set[str]:
+    # 单字, 二元和三元片段, 一两个字的查询直接命中对应的片段
+    return {text[i : i + n] for n in (1, 2, GRAM) for i in range(len(text) - n + 1)}
+
+
+class PlayerIndex:
+    # 选手搜索索引: 名字, 拼音首字母, 备注和UUID, 排序时靠前的字段优先
+    # 一两个字的查询直接取单字/二元片段, 更长的查询用三元片段求交集后再核对
+    def __init__(self, default_note: str = ""):
+        self.default_note = default_note  # 默认备注不参与搜索
+        self.keys: dict[str, tuple[str, ...]] = {}
+        self.postings: dict[str, set[str]] = {}
+        self.pending: list = None  # rebuild 传入, 第一次使用时才建立索引
+
+    def __len__(self) -> int:
+        self.build()
+        return len(self.keys)
+
+    def __contains__(self, name: str) -> bool:
+        self.build()
+        return name in self.keys
+
+    def fields(self, player) -> tuple[str, ...]:
+        note = "" if player.note == self.default_note else player.note
+        return (
+            player.name.casefold(),
+            pinyin_initials(player.name),
+            note.casefold(),
+            player.uuid.casefold(),
+        )
+
+    def rebuild(self, players: Iterable):
+        """
+        重建索引, 推迟到第一次搜索或修改时进行, 启动时不占用时间
+        """
+        self.keys.clear()
+        self.postings.clear()
+        self.pending = list(players)
+
+    def build(self):
+        if self.pending is None:
+            return
+        players, self.pending = self.pending, None
+        for player in players:
+            if player.name not in self.keys:
+                self.index(player)
+
+    def index(self, player):
+        """
+        登记选手的字段和片段
+        """
+        name = player.name
+        keys = self.fields(player)
+        self.keys[name] = keys
+        for key in keys:
+            for gram in grams(key):
+                self.postings.setdefault(gram, set()).add(name)
+
+    def add(self, player):
+        """
+        添加选手, 已存在的同名选手会先移除, 修改备注后重新调用即可
+        """
+        self.build()
+        if player.name in self.keys:
+            self.remove(player.name)
+        self.index(player)
+
+    def remove(self, name: str):
+        self.build()
+        keys = self.keys.pop(name, None)
+        if keys is None:
+            return
+        for key in keys:
+            for gram in grams(key):
+                names = self.postings.get(gram)
+                if names is None:
+                    continue
+                names.discard(name)
+                if not names:
+                    del self.postings[gram]
+
+    def rename(self, old_name: str, player):
+        self.remove(old_name)
+        self.add(player)
+
+    def candidates(self, query: str) -> set[str]:
+        if len(query) <= 2:
+            return set(self.postings.get(query, ()))
+        names = None
+        for gram in {query[i : i + GRAM] for i in range(len(query) - GRAM + 1)}:
+            posting = self.postings.get(gram)
+            if not posting:
+                return set()
+            names = set(posting) if names is None else names & posting
+            if not names:
+                break
+        return names
+
+    def rank(self, name: str, query: str) -> tuple | None:
+        """
+        完全匹配 < 前缀匹配 < 包含, 同一档按字段顺序, 再按名字长短
+        """
+        best = None
+        for field, key in enumerate(self.keys[name]):
+            if key == query:
+                kind = 0
+            elif key.startswith(query):
+                kind = 1
+            elif query in key:
+                kind = 2
+            else:
+                continue
+            if best is None or (kind, field) < best:
+                best = (kind, field)
+        if best is None:
+            return None
+        return (*best, len(name), name)
+
+    def search(self, query: str, limit: int = MAX_RESULTS) -> list[str]:
+        """
+        返回按相关度排序的选手名
+        """
+        query = query.strip().casefold()
+        if not query:
+            return []
+        self.build()
+        ranked = []
+        for name in self.candidates(query):
+            rank = self.rank(name, query)
+            if rank is not None:
+                ranked.append(rank)
+        ranked.sort()
+        return [rank[-1] for rank in ranked[:limit]]
@@ -0,0 +1,393 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from collections.abc import MutableMapping
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+MAGIC = b"ARKSNAP\0"
+FORMAT_VERSION = 1  # 列的布局改变时加一
+ALIGN = 8
+
+# 文件头: 魔数, 格式版本, 保留, 数据库版本(字符串ID), 选手数, 记录数, 明细数, 字符串数
+HEADER = struct.Struct("<8sHHIIIII")
+# 定宽的列 (名字, array 类型码), 字符串字段保存字符串表中的ID
+PLAYER_COLUMNS = (
+    ("name", "I"),
+    ("note", "I"),
+    ("uuid", "I"),
+    ("size", "I"),  # 槽位数
+    ("record_start", "I"),
+    ("record_count", "I"),
+)
+# 只保存非空的记录, 计分明细是明细列中 [item_start, item_start + item_count) 的字符串ID
+RECORD_COLUMNS = (
+    ("slot", "I"),
+    ("flags", "I"),
+    ("base_score", "q"),
+    ("score", "d"),
+    ("time", "q"),
+    ("start_operator", "I"),
+    ("start_team", "I"),
+    ("item_start", "I"),
+    ("item_count", "I"),
+)
+OFFSET_TYPE = "Q"
+ITEM_TYPE = "I"
+FLAG_VALID = 1
+FLAG_INT_SCORE = 2  # 总分是整数, 读取时还原为 int
+
+
+class SnapshotError(Exception):
+    # 文件不是快照或已损坏
+    pass
+
+
+class RecordRow(NamedTuple):
+    slot: int
+    data: list
+    base_score: int
+    score: float
+    start_operator: str
+    start_team: str
+    time: int
+    valid: bool
+
+
+class PlayerRow(NamedTuple):
+    # 与具体的 Player/Record 类无关的选手数据, 字符串可以是 str 或 UTF-8 bytes
+    name: str
+    note: str
+    uuid: str
+    size: int
+    records: list[RecordRow]
+
+
+class PlayerHeader(NamedTuple):
+    # 不解码记录时可以读取的字段, 用于建立搜索索引等
+    name: str
+    note: str
+    uuid: str
+
+
+def aligned(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def itemsize(typecode: str) -> int:
+    return array(typecode).itemsize
+
+
+def is_snapshot(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class StringTable:
+    # 写入时去重, 开局干员, 计分明细等大量重复的字符串只保存一次
+    def __init__(self):
+        self.ids: dict[bytes, int] = {}
+        self.data: list[bytes] = []
+
+    def add(self, text: str | bytes) -> int:
+        if isinstance(text, str):
+            text = text.encode("utf-8")
+        index = self.ids.get(text)
+        if index is None:
+            index = self.ids[text] = len(self.data)
+            self.data.append(text)
+        return index
+
+
+def write_snapshot(path: str, version: str, rows: Iterable[PlayerRow]) -> int:
+    """
+    把选手写入快照文件, 返回选手数
+
+    布局: 文件头 | 字符串偏移 | 字符串 | 选手的各列 | 记录的各列 | 明细列, 每段按 8 字节对齐
+    所有数值按小端序保存
+    """
+    strings = StringTable()
+    version_id = strings.add(version)
+    players = {name: array(code) for name, code in PLAYER_COLUMNS}
+    records = {name: array(code) for name, code in RECORD_COLUMNS}
+    items = array(ITEM_TYPE)
+    for row in rows:
+        players["name"].append(strings.add(row.name))
+        players["note"].append(strings.add(row.note))
+        players["uuid"].append(strings.add(row.uuid))
+        players["size"].append(row.size)
+        players["record_start"].append(len(records["slot"]))
+        players["record_count"].append(len(row.records))
+        for record in row.records:
+            records["slot"].append(record.slot)
+            records["flags"].append(
+                (FLAG_VALID if record.valid else 0)
+                | (FLAG_INT_SCORE if isinstance(record.score, int) else 0)
+            )
+            records["base_score"].append(record.base_score)
+            records["score"].append(record.score)
+            records["time"].append(record.time)
+            records["start_operator"].append(strings.add(record.start_operator))
+            records["start_team"].append(strings.add(record.start_team))
+            records["item_start"].append(len(items))
+            records["item_count"].append(len(record.data))
+            items.extend(strings.add(text) for text in record.data)
+
+    offsets = array(OFFSET_TYPE, [0])
+    for text in strings.data:
+        offsets.append(offsets[-1] + len(text))
+    columns = [offsets, *players.values(), *records.values(), items]
+    if sys.byteorder != "little":
+        for column in columns:
+            column.byteswap()
+    sections = [
+        offsets.tobytes(),
+        b"".join(strings.data),
+        *(column.tobytes() for column in columns[1:]),
+    ]
+    header = HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        0,
+        version_id,
+        len(players["name"]),
+        len(records["slot"]),
+        len(items),
+        len(strings.data),
+    )
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(b"\0" * (aligned(HEADER.size) - HEADER.size))
+        for data in sections:
+            f.write(data)
+            f.write(b"\0" * (aligned(len(data)) - len(data)))
+        f.flush()
+        os.fsync(f.fileno())
+    return len(players["name"])
+
+
+class SnapshotReader:
+    # 内存映射打开快照, 每列是映射上的 memoryview, 只在读取某个选手时解码字符串
+    def __init__(self, path: str):
+        self.path = path
+        self.views: list[memoryview] = []
+        if sys.byteorder != "little":
+            raise SnapshotError("snapshots can only be mapped on little-endian hosts")
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise SnapshotError(f"{path} is too small")
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.map_columns(size)
+        except Exception:
+            self.close()
+            raise
+
+    def column(self, pos: int, typecode: str, count: int) -> tuple[memoryview, int]:
+        """
+        从 pos 开始的一列, 返回列和下一段的位置
+        """
+        end = pos + count * itemsize(typecode)
+        if end > len(self.mm):
+            raise SnapshotError(f"{self.path} is truncated")
+        view = memoryview(self.mm)[pos:end].cast(typecode)
+        self.views.append(view)
+        return view, aligned(end)
+
+    def map_columns(self, size: int):
+        magic, fmt, _, version_id, n_players, n_records, n_items, n_strings = (
+            HEADER.unpack_from(self.mm)
+        )
+        if magic != MAGIC:
+            raise SnapshotError(f"{self.path} is not a snapshot")
+        if fmt != FORMAT_VERSION:
+            raise SnapshotError(f"snapshot format {fmt}, expect {FORMAT_VERSION}")
+        self.offsets, pos = self.column(aligned(HEADER.size), OFFSET_TYPE, n_strings + 1)
+        self.strings_pos = pos
+        pos = aligned(pos + self.offsets[-1])
+        self.players = {}
+        for name, code in PLAYER_COLUMNS:
+            self.players[name], pos = self.column(pos, code, n_players)
+        self.records = {}
+        for name, code in RECORD_COLUMNS:
+            self.records[name], pos = self.column(pos, code, n_records)
+        self.items, pos = self.column(pos, ITEM_TYPE, n_items)
+        if pos != size:
+            raise SnapshotError(f"{self.path} size {size}, expect {pos}")
+        self.version = self.string(version_id)
+
+    def __len__(self) -> int:
+        return len(self.players["name"])
+
+    def close(self):
+        # 列引用着映射, 先释放才能关闭
+        for view in self.views:
+            view.release()
+        self.views.clear()
+        self.mm.close()
+
+    def raw_string(self, index: int) -> bytes:
+        start = self.strings_pos + self.offsets[index]
+        return self.mm[start : self.strings_pos + self.offsets[index + 1]]
+
+    def string(self, index: int) -> str:
+        return self.raw_string(index).decode("utf-8")
+
+    def names(self) -> list[str]:
+        return [self.string(i) for i in self.players["name"].tolist()]
+
+    def header(self, index: int) -> PlayerHeader:
+        players = self.players
+        return PlayerHeader(
+            self.string(players["name"][index]),
+            self.string(players["note"][index]),
+            self.string(players["uuid"][index]),
+        )
+
+    def row(self, index: int, raw: bool = False) -> PlayerRow:
+        """
+        解码一个选手, raw 为真时字符串保持为 bytes, 用于原样写入新的快照
+        """
+        text = self.raw_string if raw else self.string
+        players, columns = self.players, self.records
+        start = players["record_start"][index]
+        records = []
+        for i in range(start, start + players["record_count"][index]):
+            flags = columns["flags"][i]
+            score = columns["score"][i]
+            item_start = columns["item_start"][i]
+            items = self.items[item_start : item_start + columns["item_count"][i]]
+            records.append(
+                RecordRow(
+                    columns["slot"][i],
+                    [text(item) for item in items.tolist()],
+                    columns["base_score"][i],
+                    int(score) if flags & FLAG_INT_SCORE else score,
+                    text(columns["start_operator"][i]),
+                    text(columns["start_team"][i]),
+                    columns["time"][i],
+                    bool(flags & FLAG_VALID),
+                )
+            )
+        return PlayerRow(
+            text(players["name"][index]),
+            text(players["note"][index]),
+            text(players["uuid"][index]),
+            players["size"][index],
+            records,
+        )
+
+
+class PlayerStore(MutableMapping):
+    # 选手表, 用法与字典相同; 快照中的选手第一次访问时才解码, 之后保留解码后的对象
+    # 保存时已解码的选手重新编码, 没有访问过的选手直接从旧快照复制
+    def __init__(
+        self,
+        decode: Callable[[PlayerRow], object],
+        encode: Callable[[object], PlayerRow],
+    ):
+        self.decode = decode
+        self.encode = encode
+        self.reader: SnapshotReader = None
+        self.entries: dict[str, int | object] = {}  # 选手名 -> 快照中的序号或选手对象
+        self.lock = threading.RLock()  # 导出等后台线程也会读取
+
+    @classmethod
+    def open(
+        cls,
+        path: str,
+        decode: Callable[[PlayerRow], object],
+        encode: Callable[[object], PlayerRow],
+    ) -> "PlayerStore":
+        store = cls(decode, encode)
+        store.reader = SnapshotReader(path)
+        store.entries = {name: i for i, name in enumerate(store.reader.names())}
+        return store
+
+    @property
+    def version(self) -> str | None:
+        return self.reader.version if self.reader is not None else None
+
+    def __getitem__(self, name: str):
+        with self.lock:
+            value = self.entries[name]
+            if isinstance(value, int):
+                value = self.entries[name] = self.decode(self.reader.row(value))
+            return value
+
+    def __setitem__(self, name: str, player):
+        with self.lock:
+            self.entries[name] = player
+
+    def __delitem__(self, name: str):
+        with self.lock:
+            del self.entries[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self.entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __enter__(self) -> "PlayerStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def decoded(self) -> int:
+        return sum(not isinstance(v, int) for v in self.entries.values())
+
+    def headers(self) -> Iterator:
+        """
+        逐个产出选手的名字, 备注和UUID, 不解码记录
+        """
+        with self.lock:
+            items = list(self.entries.items())
+        for name, value in items:
+            yield self.reader.header(value) if isinstance(value, int) else value
+
+    def save(self, path: str, version: str) -> int:
+        """
+        写入新的快照并替换 path, 之后从新快照继续按需读取, 返回选手数
+        """
+        temp_path = path + ".tmp"
+        with self.lock:
+            rows = (
+                self.reader.row(value, raw=True)
+                if isinstance(value, int)
+                else self.encode(value)
+                for value in self.entries.values()
+            )
+            count = write_snapshot(temp_path, version, rows)
+            # Windows 下不能替换正在映射的文件, 先关闭旧快照
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+            try:
+                os.replace(temp_path, path)
+            except OSError:
+                if os.path.exists(path) and is_snapshot(path):
+                    self.reader = SnapshotReader(path)
+                raise
+            self.reader = SnapshotReader(path)
+            # 新快照按 entries 的顺序写入, 未解码的选手序号即位置
+            for i, (name, value) in enumerate(self.entries.items()):
+                if isinstance(value, int):
+                    self.entries[name] = i
+        return count
+
+    def close(self):
+        with self.lock:
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
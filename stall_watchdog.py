@@ -0,0 +1,160 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+
+from loguru import logger
+from PySide6.QtCore import QObject, Qt, QTimer
+
+TICK_INTERVAL = 10  # 主线程心跳间隔(ms)
+STALL_THRESHOLD = 0.1  # 心跳延迟超过这个时间记为卡顿(s)
+SAMPLE_INTERVAL = 0.005  # 后台采样间隔(s)
+STALL_STACK_DEPTH = 12  # 日志中显示的调用栈层数
+
+
+def frame_label(frame: FrameType, line: bool = False) -> str:
+    code = frame.f_code
+    name = os.path.basename(code.co_filename)
+    if line:
+        return f"{code.co_name} ({name}:{frame.f_lineno})"
+    return f"{code.co_name} ({name})"
+
+
+def frame_stack(frame: FrameType | None) -> list[FrameType]:
+    """
+    调用栈, 从最外层到最内层
+    """
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+class StallWatchdog(QObject):
+    # 主线程卡顿监控: 主线程定时心跳, 后台线程发现心跳停止时采集主线程的调用栈
+    # 开启性能采样后, 后台线程持续采集主线程调用栈, 停止时写出折叠栈文件
+    def __init__(self, parent: QObject = None, threshold: float = STALL_THRESHOLD):
+        super().__init__(parent)
+        self.threshold = threshold
+        self.main_id = threading.main_thread().ident
+        self.base_depth: int = None  # 事件循环所在的栈深度, 更深的一层是槽函数
+        self.last_tick = time.perf_counter()
+        self.lock = threading.Lock()
+        self.stall_samples: list[tuple[str, ...]] = []
+        self.profile: Counter[str] | None = None
+        self.idle_samples = 0
+        self.stalls = 0
+        self.running = False
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.thread = threading.Thread(target=self.sample_loop, daemon=True)
+
+    def start(self):
+        self.running = True
+        self.last_tick = time.perf_counter()
+        self.timer.start(TICK_INTERVAL)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.timer.stop()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def tick(self):
+        now = time.perf_counter()
+        if self.base_depth is None:
+            # 第一次心跳: 记录事件循环的栈深度, 启动过程的耗时不算卡顿
+            self.base_depth = len(frame_stack(sys._getframe(1)))
+            self.last_tick = now
+            with self.lock:
+                self.stall_samples.clear()
+            return
+        lag = now - self.last_tick - TICK_INTERVAL / 1000
+        self.last_tick = now
+        with self.lock:
+            samples, self.stall_samples = self.stall_samples, []
+        if lag >= self.threshold:
+            self.report_stall(lag, samples)
+
+    def handler(self, stack: tuple[str, ...]) -> str:
+        """
+        卡顿时正在执行的槽函数, 即事件循环上一层的函数, 跳过 lambda
+        """
+        for label in stack[self.base_depth or 0 :]:
+            if not label.startswith("<lambda> "):
+                return label
+        return "event loop"
+
+    def report_stall(self, lag: float, samples: list[tuple[str, ...]]):
+        self.stalls += 1
+        if not samples:
+            logger.warning(f"UI stall {lag * 1000:.0f}ms (no stack sampled)")
+            return
+        # 采样次数最多的调用栈最能说明卡在哪里
+        common, count = Counter(samples).most_common(1)[0]
+        depth = self.base_depth or 0
+        lines = "\n".join(f"    {label}" for label in common[depth:][-STALL_STACK_DEPTH:])
+        logger.warning(
+            f"UI stall {lag * 1000:.0f}ms in {self.handler(samples[0])}, "
+            f"{count}/{len(samples)} samples at:\n{lines}"
+        )
+
+    def sample_loop(self):
+        while self.running:
+            time.sleep(SAMPLE_INTERVAL)
+            stalled = time.perf_counter() - self.last_tick > self.threshold
+            if not stalled and self.profile is None:
+                continue
+            frame = sys._current_frames().get(self.main_id)
+            if frame is None:
+                continue
+            # 立即转为文字, 之后帧的行号会继续变化
+            stack = frame_stack(frame)
+            del frame
+            with self.lock:
+                if stalled:
+                    self.stall_samples.append(
+                        tuple(frame_label(frame, True) for frame in stack)
+                    )
+                if self.profile is not None:
+                    self.add_profile_sample(stack)
+
+    def add_profile_sample(self, stack: list[FrameType]):
+        if len(stack) <= (self.base_depth or 0):
+            self.idle_samples += 1  # 主线程在事件循环中空闲
+            return
+        self.profile[";".join(frame_label(frame) for frame in stack)] += 1
+
+    @property
+    def profiling(self) -> bool:
+        return self.profile is not None
+
+    def start_profile(self):
+        with self.lock:
+            self.profile = Counter()
+            self.idle_samples = 0
+        logger.info("Profiling started")
+
+    def stop_profile(self, path: str) -> int:
+        """
+        停止性能采样, 写出 flamegraph.pl / speedscope 可以读取的折叠栈文件, 返回采样数
+        """
+        with self.lock:
+            profile, self.profile = self.profile, None
+        if profile is None:
+            return 0
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in profile.most_common():
+                f.write(f"{stack} {count}\n")
+        busy = sum(profile.values())
+        logger.info(
+            f"Profile saved to {path}: {busy} busy samples, "
+            f"{self.idle_samples} idle samples"
+        )
+        return busy
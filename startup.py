@@ -0,0 +1,52 @@
+import time
+from contextlib import contextmanager
+
+from loguru import logger
+
+
+class StartupTimeline:
+    # 记录启动各阶段耗时, 起点为本模块被导入的时刻
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.last = self.t0
+        self.marks: list[tuple[str, float, float]] = []  # (阶段, 结束时刻, 耗时)
+        self.reported = False
+
+    def mark(self, name: str):
+        """
+        标记一个阶段结束, 耗时为距上一个标记的时间
+        """
+        now = time.perf_counter()
+        self.marks.append((name, now - self.t0, now - self.last))
+        self.last = now
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        计时一个阶段, 阶段开始前的空闲时间记为 "(idle)"
+        """
+        if time.perf_counter() - self.last > 0.001:
+            self.mark("(idle)")
+        try:
+            yield
+        finally:
+            self.mark(name)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.t0
+
+    def report(self) -> str:
+        lines = [f"{'stage':<24}{'at(ms)':>10}{'cost(ms)':>10}"]
+        for name, at, cost in self.marks:
+            lines.append(f"{name:<24}{at * 1000:>10.1f}{cost * 1000:>10.1f}")
+        return "\n".join(lines)
+
+    def log_report(self):
+        if self.reported:
+            return
+        self.reported = True
+        logger.info(f"Startup finished in {self.elapsed:.3f}s\n{self.report()}")
+
+
+timeline = StartupTimeline()
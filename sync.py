@@ -0,0 +1,395 @@
+import hashlib
+import hmac
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from collections import deque
+
+from loguru import logger
+from PySide6.QtCore import QThread, Signal
+
+SYNC_PROTOCOL = 3  # 2: 连接时用同步口令验证; 3: 缺少事件时向发送方请求补发
+SYNC_PORT = 4460  # 默认同步端口
+HUB_LOG_LIMIT = 10000  # 主机保存的事件数, 用于给新连接的终端重放
+NODE_LOG_LIMIT = 2000  # 每个终端保存的本机事件数, 随同步状态一起保存, 用于补发
+REPLAY_RETRY = 5  # 同一个缺口重新请求补发的间隔(s)
+CONTROL_TYPES = ("replay", "gap")  # 主机只转发不记录的消息
+SOCKET_TIMEOUT = 5
+
+
+def encode(msg: dict) -> bytes:
+    return (json.dumps(msg, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def sign(secret: str, nonce: str) -> str:
+    """
+    用同步口令对主机发来的随机数签名, 口令本身不在网络上传输
+    """
+    return hmac.new(
+        secret.encode("utf-8"), nonce.encode("ascii"), hashlib.sha256
+    ).hexdigest()
+
+
+class _HubHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.send_lock = threading.Lock()
+
+    def send(self, data: bytes):
+        with self.send_lock:
+            self.wfile.write(data)
+
+    def handshake(self, hub: "SyncHub") -> dict | None:
+        """
+        发送随机数, 检查终端的协议版本和口令签名, 通过时返回 hello 消息
+        """
+        nonce = os.urandom(16).hex()
+        self.connection.settimeout(SOCKET_TIMEOUT)  # 握手期间不能无限等待
+        try:
+            challenge = {"type": "challenge", "protocol": SYNC_PROTOCOL, "nonce": nonce}
+            self.send(encode(challenge))
+            hello = json.loads(self.rfile.readline() or b"{}")
+        except (OSError, ValueError):
+            return None
+        if hello.get("type") != "hello" or hello.get("protocol") != SYNC_PROTOCOL:
+            reason = "protocol mismatch"
+        elif not hmac.compare_digest(
+            str(hello.get("auth", "")), sign(hub.secret, nonce)
+        ):
+            reason = "wrong secret"
+        else:
+            return hello
+        logger.warning(f"Sync hub rejected {self.client_address}: {reason}")
+        try:
+            self.send(encode({"type": "rejected", "reason": reason}))
+        except OSError:
+            pass
+        return None
+
+    def handle(self):
+        hub: SyncHub = self.server.hub
+        hello = self.handshake(hub)
+        if hello is None:
+            return
+        logger.info(f"Sync hub: terminal {hello.get('node')} joined")
+        hub.join(self)
+        try:
+            for line in self.rfile:
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                if msg.get("type") == "event":
+                    hub.broadcast(line, self)
+                elif msg.get("type") in CONTROL_TYPES:
+                    hub.broadcast(line, self, log=False)
+        except OSError:
+            pass
+        finally:
+            hub.leave(self)
+            logger.info(f"Sync hub: terminal {hello.get('node')} left")
+
+
+class _HubServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SyncHub:
+    # 同步主机, 可以在任意一台终端上运行, 转发事件并给新连接的终端重放历史事件
+    # 监听所有网卡, 只接受知道同步口令的终端
+    def __init__(self, secret: str, host: str = "0.0.0.0", port: int = SYNC_PORT):
+        if not secret:
+            raise ValueError("sync hub needs a secret")
+        self.secret = secret
+        self.server = _HubServer((host, port), _HubHandler)
+        self.server.hub = self
+        self.clients: set[_HubHandler] = set()
+        self.log: deque[bytes] = deque(maxlen=HUB_LOG_LIMIT)
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        logger.success(f"Sync hub listening on {self.server.server_address}")
+
+    def stop(self):
+        self.server.shutdown()
+        with self.lock:
+            for client in self.clients:
+                try:
+                    client.connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        self.server.server_close()
+        logger.info("Sync hub stopped")
+
+    def join(self, client: _HubHandler):
+        client.connection.settimeout(SOCKET_TIMEOUT)
+        with self.lock:
+            client.send(encode({"type": "welcome"}))
+            for data in self.log:
+                client.send(data)
+            self.clients.add(client)
+        client.connection.settimeout(None)
+
+    def leave(self, client: _HubHandler):
+        with self.lock:
+            self.clients.discard(client)
+
+    def broadcast(self, data: bytes, sender: _HubHandler, log: bool = True):
+        with self.lock:
+            if log:
+                self.log.append(data)
+            for client in list(self.clients):
+                if client is sender:
+                    continue
+                try:
+                    client.send(data)
+                except OSError:
+                    self.clients.discard(client)
+
+
+class SyncClient(QThread):
+    # 连接同步主机, 收到的事件通过信号交给主线程处理
+    received = Signal(dict)
+    control = Signal(dict)  # 补发请求和缺口通知, 见 CONTROL_TYPES
+    state_changed = Signal(bool, str)  # 是否已连接, 说明
+
+    def __init__(self, host: str, port: int, node: str, secret: str):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.node = node
+        self.secret = secret
+        self.sock: socket.socket = None
+        self.reader = None  # 握手和接收共用一个缓冲, 避免丢失握手后紧跟的重放事件
+        self.send_lock = threading.Lock()
+        self.running = True
+
+    def connect_hub(self):
+        """
+        在调用线程中建立连接并验证口令, 失败时抛出 OSError (口令错误为 PermissionError)
+        """
+        self.sock = socket.create_connection((self.host, self.port), SOCKET_TIMEOUT)
+        try:
+            self.reader = self.sock.makefile("rb")
+            challenge = self.read_message()
+            if challenge.get("type") != "challenge":
+                raise ConnectionError("不是同步主机")
+            if challenge.get("protocol") != SYNC_PROTOCOL:
+                raise ConnectionError(
+                    f"主机协议版本 {challenge.get('protocol')}, 本机 {SYNC_PROTOCOL}"
+                )
+            hello = {
+                "type": "hello",
+                "protocol": SYNC_PROTOCOL,
+                "node": self.node,
+                "auth": sign(self.secret, str(challenge.get("nonce", ""))),
+            }
+            with self.send_lock:
+                self.sock.sendall(encode(hello))
+            reply = self.read_message()
+            if reply.get("type") == "rejected":
+                raise PermissionError(f"主机拒绝连接: {reply.get('reason')}")
+            if reply.get("type") != "welcome":
+                raise ConnectionError("握手失败")
+        except ValueError as e:
+            self.close_socket(True)
+            raise ConnectionError(f"握手消息无效: {e}") from e
+        except OSError:
+            self.close_socket(True)
+            raise
+        self.sock.settimeout(None)
+
+    def read_message(self) -> dict:
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("主机关闭了连接")
+        return json.loads(line)
+
+    def close_socket(self, close_reader: bool = False):
+        """
+        接收线程正在读取时只能关闭 socket, 读取缓冲由接收线程退出时关闭
+        """
+        if close_reader and self.reader is not None:
+            self.reader.close()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def send(self, msg: dict) -> bool:
+        if self.sock is None:
+            return False
+        try:
+            with self.send_lock:
+                self.sock.sendall(encode(msg))
+            return True
+        except OSError as e:
+            logger.error(f"Sync send failed: {e}")
+            return False
+
+    def run(self):
+        self.state_changed.emit(True, f"{self.host}:{self.port}")
+        reason = "closed"
+        try:
+            with self.reader as f:
+                for line in f:
+                    try:
+                        msg = json.loads(line)
+                    except ValueError:
+                        continue
+                    if msg.get("type") == "event":
+                        self.received.emit(msg)
+                    elif msg.get("type") in CONTROL_TYPES:
+                        self.control.emit(msg)
+        except OSError as e:
+            reason = str(e)
+        if self.running:
+            logger.warning(f"Sync connection lost: {reason}")
+        self.state_changed.emit(False, reason)
+
+    def stop(self):
+        self.running = False
+        if self.sock is not None:
+            self.close_socket()
+        self.wait()
+
+
+class SyncState:
+    # 本终端的同步状态: 节点ID, 事件序号, 已收到的各节点序号, 每条记录的版本向量
+    # 以及最近的本机事件, 其他终端发现缺少事件时从这里补发
+    def __init__(self, path: str):
+        self.path = path
+        self.node = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.seen: dict[str, int] = {}  # 节点 -> 连续处理到的序号
+        self.vectors: dict[str, dict[str, int]] = {}  # "uuid/slot" -> 版本向量
+        self.log: list[dict] = []  # 本机最近的事件, 按序号排列
+        self.requested: dict[str, tuple[int, float]] = {}  # 节点 -> (请求补发的起点, 时间)
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.node = data["node"]
+            self.seq = data["seq"]
+            self.seen = data["seen"]
+            self.vectors = data["vectors"]
+            self.log = data.get("log", [])
+        except Exception as e:
+            logger.warning(f"Sync state load failed, starting fresh: {e}")
+
+    def save(self):
+        if not self.dirty:
+            return
+        data = {
+            "node": self.node,
+            "seq": self.seq,
+            "seen": self.seen,
+            "vectors": self.vectors,
+            "log": self.log,
+        }
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
+        self.dirty = False
+
+    def local_event(self, cmd: dict, undo: bool, player: dict) -> dict:
+        """
+        为本地执行的命令生成事件, 递增本节点在该记录上的版本
+        """
+        key = f"{cmd['uuid']}/{cmd['slot']}"
+        vector = self.vectors.setdefault(key, {})
+        vector[self.node] = vector.get(self.node, 0) + 1
+        self.seq += 1
+        self.dirty = True
+        msg = {
+            "type": "event",
+            "node": self.node,
+            "seq": self.seq,
+            "vv": dict(vector),
+            "undo": undo,
+            "cmd": cmd,
+            "player": player,
+        }
+        self.log.append(msg)
+        del self.log[:-NODE_LOG_LIMIT]
+        return msg
+
+    def replay_request(self, msg: dict) -> dict | None:
+        """
+        收到的事件与已处理的序号不连续时, 返回向发送方请求补发的消息
+
+        同一个缺口在 REPLAY_RETRY 秒内只请求一次, 发送方不在线时之后的事件会再次触发请求
+        """
+        node, seq = msg["node"], msg["seq"]
+        after = self.seen.get(node, 0)
+        if node == self.node or seq <= after + 1:
+            return None
+        last = self.requested.get(node)
+        now = time.monotonic()
+        if last is not None and last[0] == after and now - last[1] < REPLAY_RETRY:
+            return None
+        self.requested[node] = (after, now)
+        logger.warning(f"Sync events {after + 1}..{seq - 1} from {node} missing")
+        return {"type": "replay", "node": node, "after": after, "from": self.node}
+
+    def replay(self, after: int) -> list[dict]:
+        """
+        补发本机序号大于 after 的事件; 太早的事件已经不在日志中时,
+        先发送缺口通知, 接收方跳过这些事件
+        """
+        events = [msg for msg in self.log if msg["seq"] > after]
+        first = events[0]["seq"] if events else self.seq + 1
+        if first == after + 1:
+            return events
+        gap = {"type": "gap", "node": self.node, "after": after, "until": first - 1}
+        return [gap] + events
+
+    def skip(self, msg: dict) -> bool:
+        """
+        处理缺口通知, 发送方已经无法补发的事件视为已处理, 返回是否跳过了事件
+        """
+        node, until = msg["node"], msg["until"]
+        if node == self.node or until <= self.seen.get(node, 0):
+            return False
+        logger.warning(
+            f"Sync events {self.seen.get(node, 0) + 1}..{until} from {node} lost"
+        )
+        self.seen[node] = until
+        self.dirty = True
+        return True
+
+    def accept(self, msg: dict) -> tuple[bool, bool]:
+        """
+        处理收到的事件, 返回 (是否需要应用, 是否与本地修改冲突)
+
+        只按序号连续地应用事件, 前面还缺少事件时丢弃, 等待补发 (见 replay_request)
+        发送方执行前的版本向量不包含本地已有的某些修改时, 说明两边并发修改了同一条记录
+        """
+        node, seq = msg["node"], msg["seq"]
+        if node == self.node or seq != self.seen.get(node, 0) + 1:
+            return False, False
+        self.seen[node] = seq
+        key = f"{msg['cmd']['uuid']}/{msg['cmd']['slot']}"
+        local = self.vectors.setdefault(key, {})
+        incoming = msg["vv"]
+        before = dict(incoming)
+        before[node] = before.get(node, 1) - 1
+        conflict = any(v > before.get(n, 0) for n, v in local.items())
+        for n, v in incoming.items():
+            local[n] = max(local.get(n, 0), v)
+        self.dirty = True
+        return True, conflict
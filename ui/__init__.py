@@ -1 +1,5 @@
 from .main_ui import Ui_MainWindow as MainUITemplate  # noqa
+from .player_finder import PlayerFinder  # noqa
+from .record_model import RecordListModel  # noqa
+from .text_report import TextReportDialog  # noqa
+from .widgets import count_widgets  # noqa
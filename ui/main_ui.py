@@ -17,7 +17,7 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
     QPalette, QPixmap, QRadialGradient, QTransform)
 from PySide6.QtWidgets import (QAbstractItemView, QApplication, QCheckBox, QComboBox,
     QFrame, QHBoxLayout, QLabel, QLineEdit,
-    QListWidget, QListWidgetItem, QMainWindow, QPushButton,
+    QListView, QMainWindow, QPushButton,
     QRadioButton, QSizePolicy, QSpacerItem, QSpinBox,
     QVBoxLayout, QWidget)
 
@@ -974,7 +974,7 @@ class Ui_MainWindow(object):
 
         self.verticalLayout_9.addWidget(self.label_9)
 
-        self.listRecord = QListWidget(self.frame_5)
+        self.listRecord = QListView(self.frame_5)
         self.listRecord.setObjectName(u"listRecord")
         sizePolicy3 = QSizePolicy(QSizePolicy.Ignored, QSizePolicy.Expanding)
         sizePolicy3.setHorizontalStretch(0)
@@ -991,7 +991,7 @@ class Ui_MainWindow(object):
         self.listRecord.setAlternatingRowColors(False)
         self.listRecord.setSelectionMode(QAbstractItemView.SingleSelection)
         self.listRecord.setSpacing(2)
-        self.listRecord.setSortingEnabled(False)
+        self.listRecord.setUniformItemSizes(True)
 
         self.verticalLayout_9.addWidget(self.listRecord)
 
@@ -0,0 +1,46 @@
+from typing import Callable
+
+from PySide6.QtCore import QStringListModel, Qt, Signal
+from PySide6.QtWidgets import QCompleter, QLineEdit, QWidget
+
+
+class PlayerFinder(QLineEdit):
+    # 选手搜索框, 每次输入都重新查询索引, 补全列表按相关度排序
+    chosen = Signal(str)
+
+    def __init__(self, search: Callable[[str], list[str]], parent: QWidget = None):
+        super().__init__(parent)
+        self.search = search
+        self.setPlaceholderText("搜索干员")
+        self.setClearButtonEnabled(True)
+        self.model = QStringListModel(self)
+        self.completer = QCompleter(self.model, self)
+        # 结果已经排好序, 补全器不再按前缀过滤
+        self.completer.setCompletionMode(
+            QCompleter.CompletionMode.UnfilteredPopupCompletion
+        )
+        self.completer.setCaseSensitivity(Qt.CaseInsensitive)
+        self.completer.setMaxVisibleItems(12)
+        self.completer.setWidget(self)
+        self.completer.activated.connect(self.choose)
+        self.textEdited.connect(self.update_matches)
+        self.returnPressed.connect(self.choose_first)
+
+    def update_matches(self, text: str):
+        matches = self.search(text)
+        self.model.setStringList(matches)
+        if matches:
+            self.completer.complete()
+        else:
+            self.completer.popup().hide()
+
+    def choose_first(self):
+        matches = self.model.stringList()
+        if matches and self.text():
+            self.choose(matches[0])
+
+    def choose(self, name: str):
+        self.completer.popup().hide()
+        self.clear()
+        self.model.setStringList([])
+        self.chosen.emit(name)
@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+
+from PySide6.QtCore import QAbstractListModel, QModelIndex, QPersistentModelIndex, Qt
+
+
+class RecordListModel(QAbstractListModel):
+    # 直接引用 Record.data 的列表模型, 切换记录只替换引用, 不复制条目
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries: list[str] = []
+
+    def set_entries(self, entries: list[str]):
+        self.beginResetModel()
+        self.entries = entries
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index: QModelIndex | QPersistentModelIndex, role=Qt.DisplayRole):
+        if role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        row = index.row()
+        if not index.isValid() or row >= len(self.entries):
+            return None
+        return self.entries[row]
+
+    @contextmanager
+    def changing(self, change: tuple = None):
+        """
+        在 with 块内修改 entries, 按 change 发出增删行通知
+
+        change: ("insert", 位置, ...) / ("remove", 位置, ...) / ("reset",) / None
+        """
+        kind = change[0] if change else None
+        if kind == "insert":
+            self.beginInsertRows(QModelIndex(), change[1], change[1])
+        elif kind == "remove":
+            self.beginRemoveRows(QModelIndex(), change[1], change[1])
+        elif kind == "reset":
+            self.beginResetModel()
+        try:
+            yield
+        finally:
+            if kind == "insert":
+                self.endInsertRows()
+            elif kind == "remove":
+                self.endRemoveRows()
+            elif kind == "reset":
+                self.endResetModel()
@@ -0,0 +1,35 @@
+from typing import Callable
+
+from PySide6.QtGui import QFontDatabase
+from PySide6.QtWidgets import (
+    QDialog,
+    QDialogButtonBox,
+    QPlainTextEdit,
+    QVBoxLayout,
+    QWidget,
+)
+
+
+class TextReportDialog(QDialog):
+    # 显示等宽文本报表的对话框, 点击刷新重新生成
+    def __init__(self, title: str, builder: Callable[[], str], parent: QWidget = None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.resize(900, 640)
+        self.builder = builder
+        self.text = QPlainTextEdit(self)
+        self.text.setReadOnly(True)
+        self.text.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.text.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Close, self)
+        buttons.addButton(
+            "刷新", QDialogButtonBox.ButtonRole.ActionRole
+        ).clicked.connect(self.refresh)
+        buttons.rejected.connect(self.reject)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.text)
+        layout.addWidget(buttons)
+        self.refresh()
+
+    def refresh(self):
+        self.text.setPlainText(self.builder())
@@ -0,0 +1,8 @@
+from PySide6.QtWidgets import QWidget
+
+
+def count_widgets(widget: QWidget) -> int:
+    """
+    统计子控件数, 用于记录界面创建的开销
+    """
+    return len(widget.findChildren(QWidget))
@@ -1,17 +1,179 @@
 import os
+import re
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from queue import Empty as QueueEmptyError
 from queue import Queue
-from typing import Literal
+from typing import Callable, Literal
+from urllib.parse import urlencode, urlsplit
 
 import obsws_python as obs
 from loguru import logger
 from PySide6.QtCore import QObject, QThread
 
+from layout import (
+    MAIN_SCENE,
+    PLAYER_TEXT_SOURCES,
+    PLAYER_X_MIN,
+    PLAYER_Y_SINGLE,
+    SCORE_CHAR_WIDTH,
+    SCORE_DOT_WIDTH,
+    Anchor,
+    SceneLayout,
+    TextLayoutCache,
+    TextStyle,
+    player_text_jobs,
+    split_name,
+)
+
+UNHEALTHY_FAILURES = 3  # 连续失败这么多次的OBS视为异常
+TEXT_MEASURE_DELAY = 0.15  # 修改文字后等待OBS重新排版的时间(s)
+MEASURE_SCENE = "ark_measure"  # 后台测量文字宽度时临时创建的场景, 不影响直播画面
+MEASURE_INPUT_PREFIX = "ark_measure_"  # 后台测量文字宽度时临时创建的隐藏源
+MEASURE_BATCH = 4  # 每个文字源同时测量的文字数
+CLEAR_CANCELS = ("display_lower",)  # 清空弹窗时可以中途取消的动作
+WEB_LOWER_NAME = "web_lower"  # 场景中的字幕条浏览器源
+PENDING_ECHOES = 16  # 每个源最多记住这么多次还没收到修改事件的写入
+
+
+class Cancelled(Exception):
+    # 动作已被取消, 由工作线程捕获
+    pass
+
+
+class CancelToken:
+    # 每个排队的OBS动作一个令牌, 清空队列或断开连接时取消
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def check(self):
+        if self.event.is_set():
+            raise Cancelled()
+
+    def sleep(self, seconds: float):
+        """
+        等待 seconds 秒, 期间被取消立即抛出 Cancelled
+        """
+        if self.event.wait(seconds):
+            raise Cancelled()
+
 
 class ReqClientEx(obs.ReqClient):
     __find_source_cache = None
 
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.token: CancelToken = None  # 工作线程正在执行的动作的令牌
+        self.layout: SceneLayout = None  # 主场景的源表, 见 load_layout
+        self.missing: list[str] = []  # 主场景中缺少的源
+        self.text_cache: TextLayoutCache = None  # 文字宽度缓存, 为空时每次都测量
+        self.text_styles: dict[str, TextStyle] = {}  # 选手名文字源的样式
+        # 终端设置过的源的期望状态, 用于发现并修复在OBS中被手动修改的源
+        self.expected_settings: dict[str, dict] = {}  # 源名 -> 设置
+        self.expected_enabled: dict[tuple[str, int], bool] = {}  # (场景, ID) -> 显示
+        # 终端自己的写入也会产生修改事件, 收到对应的事件前记在这里, 不当作被手动修改
+        self.pending_echoes: dict[object, deque] = {}  # 源名或 (场景, ID) -> 写入的值
+        self.echo_lock = threading.Lock()  # 工作线程写入, 事件线程读取
+
+    def send(self, param, data=None, raw=False):
+        # 每个请求发送前检查令牌, 多个请求组成的动作在请求之间取消
+        if self.token is not None:
+            self.token.check()
+        return super().send(param, data, raw)
+
+    def sleep(self, seconds: float):
+        if self.token is None:
+            time.sleep(seconds)
+        else:
+            self.token.sleep(seconds)
+
+    def expect_echo(self, key, value):
+        with self.echo_lock:
+            echoes = self.pending_echoes.get(key)
+            if echoes is None:
+                echoes = self.pending_echoes[key] = deque(maxlen=PENDING_ECHOES)
+            echoes.append(value)
+
+    def is_echo(self, key, matches: Callable[[object], bool]) -> bool:
+        """
+        修改事件是否是终端自己某次写入的回显, 是则移除这次及更早的写入
+        """
+        with self.echo_lock:
+            echoes = self.pending_echoes.get(key)
+            if not echoes:
+                return False
+            for i, value in enumerate(echoes):
+                if matches(value):
+                    for _ in range(i + 1):
+                        echoes.popleft()
+                    return True
+        return False
+
+    def is_settings_echo(self, name: str, settings: dict) -> bool:
+        # 与 repair_input 相同, OBS 没有返回的字段视为一致
+        return self.is_echo(
+            name,
+            lambda written: all(
+                settings.get(key, value) == value for key, value in written.items()
+            ),
+        )
+
+    def is_enabled_echo(self, scene_name: str, item_id: int, enabled: bool) -> bool:
+        return self.is_echo((scene_name, item_id), lambda written: written == enabled)
+
+    def set_input_settings(self, name: str, settings: dict, overlay: bool):
+        if overlay:
+            self.expected_settings.setdefault(name, {}).update(settings)
+        else:
+            self.expected_settings[name] = dict(settings)
+        self.expect_echo(name, dict(settings))
+        super().set_input_settings(name, settings, overlay)
+
+    def set_scene_item_enabled(self, scene_name: str, item_id: int, enabled: bool):
+        self.expected_enabled[(scene_name, item_id)] = enabled
+        self.expect_echo((scene_name, item_id), enabled)
+        super().set_scene_item_enabled(scene_name, item_id, enabled)
+
+    def repair_input(self, name: str, settings: dict):
+        """
+        对比OBS中源的设置与期望值, 只重新发送不一致的字段
+
+        OBS 不返回默认值的字段, 缺失的字段视为一致, 避免反复修复
+        """
+        expected = self.expected_settings.get(name)
+        if not expected:
+            return
+        drifted = {
+            key: value
+            for key, value in expected.items()
+            if key in settings and settings[key] != value
+        }
+        if not drifted:
+            return
+        logger.warning(f"OBS source {name} drifted: {list(drifted)}, repairing")
+        self.expect_echo(name, drifted)
+        super().set_input_settings(name, drifted, True)
+
+    def repair_enabled(self, scene_name: str, item_id: int, enabled: bool):
+        expected = self.expected_enabled.get((scene_name, item_id))
+        if expected is None or expected == enabled:
+            return
+        logger.warning(
+            f"OBS scene item {scene_name}/{item_id} "
+            f"{'shown' if enabled else 'hidden'} manually, repairing"
+        )
+        self.expect_echo((scene_name, item_id), expected)
+        super().set_scene_item_enabled(scene_name, item_id, expected)
+
     @property
     def current_scene(self) -> str:
         return self.get_current_program_scene().current_program_scene_name
@@ -41,12 +203,168 @@ class ReqClientEx(obs.ReqClient):
         else:
             return self.get_sources(scene_name)[item_name]
 
+    def load_layout(self, collection: SceneLayout = None) -> list[str]:
+        """
+        连接后读取一次主场景的场景项 (包括分组成员), 生成源表并检查缺少的源
+
+        读取失败时使用场景集合 JSON 中的源表, 字体等样式也从中补全
+        """
+        try:
+            items = self.get_scene_item_list(MAIN_SCENE).scene_items
+            self.layout = SceneLayout.from_scene_items(
+                MAIN_SCENE,
+                items,
+                lambda group: self.get_group_scene_item_list(group).scene_items,
+            )
+        except Exception as e:
+            logger.warning(f"OBS scene {MAIN_SCENE} snapshot failed: {e}")
+            self.layout = collection or SceneLayout(MAIN_SCENE)
+        if collection is not None and self.layout is not collection:
+            self.layout.merge_styles(collection)
+        self.missing = self.layout.missing()
+        if self.missing:
+            logger.warning(f"OBS scene {MAIN_SCENE} is missing: {self.missing}")
+        else:
+            logger.info(f"OBS scene layout loaded: {len(self.layout.sources)} sources")
+        return self.missing
+
+    def remove_measure_leftovers(self):
+        """
+        删除上次测量文字宽度时异常退出遗留的临时场景和源 (旧版本在主场景中创建)
+        """
+        for item in self.get_input_list().inputs:
+            if item["inputName"].startswith(MEASURE_INPUT_PREFIX):
+                logger.info(f"Removing leftover OBS input {item['inputName']}")
+                self.remove_input(item["inputName"])
+        scenes = [scene["sceneName"] for scene in self.get_scene_list().scenes]
+        if MEASURE_SCENE in scenes:
+            logger.info(f"Removing leftover OBS scene {MEASURE_SCENE}")
+            self.remove_scene(MEASURE_SCENE)
+
+    def load_text_styles(self) -> dict[str, TextStyle]:
+        """
+        读取选手名文字源的字体等设置, 作为文字宽度缓存的键, OBS中修改字体后重新连接即可
+        """
+        self.text_styles = {}
+        for name in PLAYER_TEXT_SOURCES:
+            source = self.layout.get(name) if self.layout is not None else None
+            if source is None:
+                continue
+            try:
+                response = self.get_input_settings(name)
+            except Exception as e:
+                logger.warning(f"OBS text style of {name} unavailable: {e}")
+                continue
+            settings = dict(response.input_settings)
+            settings.pop("text", None)
+            self.text_styles[name] = TextStyle(
+                response.input_kind, settings, source.scale
+            )
+        return self.text_styles
+
+    def layout_anchor(self, name: str) -> Anchor:
+        if self.layout is None:
+            return SceneLayout().anchor(name)
+        return self.layout.anchor(name)
+
+    def scene_item(self, scene_name: str, item_name: str) -> tuple[str, int] | None:
+        """
+        源所在的场景 (分组内的源为分组名) 和场景项ID, 主场景的源不存在时返回 None
+        """
+        if self.layout is not None and scene_name == self.layout.scene:
+            source = self.layout.get(item_name)
+            if source is None:
+                logger.debug(f"OBS source {item_name} not in scene, skipped")
+                return None
+            return source.scene, source.item_id
+        return scene_name, self.find_source(scene_name, item_name)["sceneItemId"]
+
+    def has_source(self, name: str) -> bool:
+        """
+        主场景中是否有这个源, 还没有读取源表时视为存在
+        """
+        return self.layout is None or name in self.layout
+
+    def update_input(self, name: str, settings: dict):
+        """
+        修改主场景中的源的设置, 源不存在时跳过, 不向OBS发送注定失败的请求
+        """
+        if not self.has_source(name):
+            logger.debug(f"OBS source {name} not in scene, skipped")
+            return
+        self.set_input_settings(name, settings, True)
+
+    def item_width(self, scene_name: str, item_name: str) -> float:
+        item = self.scene_item(scene_name, item_name)
+        if item is None:
+            return 0
+        return self.get_scene_item_transform(*item).scene_item_transform["width"]
+
+    def move_item(self, scene_name: str, item_name: str, x: float, y: float):
+        item = self.scene_item(scene_name, item_name)
+        if item is not None:
+            self.set_scene_item_transform(*item, {"positionX": x, "positionY": y})
+
     def set_source_enabled(self, scene_name: str, item_name: str, enabled: bool):
-        self.set_scene_item_enabled(
-            scene_name, self.find_source(scene_name, item_name)["sceneItemId"], enabled
-        )
+        item = self.scene_item(scene_name, item_name)
+        if item is not None:
+            self.set_scene_item_enabled(*item, enabled)
+
+    def text_widths(self, texts: list[tuple[str, str]]) -> list[float]:
+        """
+        文字源显示 (源, 文字) 时的宽度, 优先使用缓存
+
+        未命中的文字先全部写入对应的源, 统一等待排版后读取宽度并存入缓存
+        """
+        cache = self.text_cache
+        widths: list[float | None] = []
+        for name, text in texts:
+            style = self.text_styles.get(name)
+            if not self.has_source(name):
+                widths.append(0)  # 场景中没有的源不测量
+            elif cache is not None and style is not None:
+                widths.append(cache.get(style.key, text))
+            else:
+                widths.append(None)
+        misses = [i for i, width in enumerate(widths) if width is None]
+        if not misses:
+            return widths
+        for i in misses:
+            name, text = texts[i]
+            self.update_input(name, {"text": text})
+        self.sleep(TEXT_MEASURE_DELAY)
+        for i in misses:
+            name, text = texts[i]
+            widths[i] = self.item_width(MAIN_SCENE, name)
+            style = self.text_styles.get(name)
+            if cache is not None and style is not None and widths[i] > 0:
+                cache.put(style.key, text, widths[i])
+        return widths
+
+    def show_text(self, name: str, text: str, x: float, y: float):
+        self.update_input(name, {"text": text})
+        self.move_item(MAIN_SCENE, name, x, y)
+        self.set_source_enabled(MAIN_SCENE, name, True)
+
+    def web_lower_url(self, web_item_name: str = WEB_LOWER_NAME) -> str:
+        return self.get_input_settings(web_item_name).input_settings.get("url", "")
 
-    # https://obs.infor-r.com/lower?id=3&line1=OBS&color1=ffffff&line2=Studio&color2=cf4c4e
+    def point_web_lower(self, base_url: str, web_item_name: str = WEB_LOWER_NAME):
+        """
+        把字幕条浏览器源指向这台OBS能访问的页面地址, 保留原有的字幕参数
+        """
+        if not self.has_source(web_item_name):
+            return
+        url = self.web_lower_url(web_item_name)
+        query = urlsplit(url).query
+        target = f"{base_url}?{query}" if query else base_url
+        if target != url:
+            logger.info(f"OBS {web_item_name} -> {base_url}")
+            self.set_input_settings(web_item_name, {"url": target}, True)
+
+    # http://127.0.0.1:4470/lower?id=3&line1=OBS&color1=ffffff&line2=Studio&color2=cf4c4e
+    # 由终端内置的叠加层服务器提供 (见 overlay.py), 不再依赖 obs.infor-r.com
+    # base_url 为空时沿用源当前的页面地址 (见 point_web_lower)
     def display_web_lower_thirds(
         self,
         scene_name: str,
@@ -56,8 +374,20 @@ class ReqClientEx(obs.ReqClient):
         color1: str = "ffffff",
         color2: str = "ffffff",
         style: Literal[1, 2, 3, 4, 5] = 1,
+        base_url: str = "",
     ):
-        addr = f"https://obs.infor-r.com/lower?id={style}&line1={line1}&color1={color1}&line2={line2}&color2={color2}"
+        if not base_url:
+            base_url = self.web_lower_url(web_item_name).split("?")[0]
+        query = urlencode(
+            {
+                "id": style,
+                "line1": line1,
+                "color1": color1,
+                "line2": line2,
+                "color2": color2,
+            }
+        )
+        addr = f"{base_url}?{query}"
         self.set_scene_item_enabled(
             scene_name,
             self.find_source(scene_name, web_item_name)["sceneItemId"],
@@ -103,114 +433,80 @@ class ReqClientEx(obs.ReqClient):
         else:
             path = minus_bk_path
             color = MINUS_COLOR
-        self.set_input_settings(LINE1_NAME, {"text": line1, "color": color}, True)
-        self.set_input_settings(LINE2_NAME, {"text": line2, "color": color}, True)
+        self.update_input(LINE1_NAME, {"text": line1, "color": color})
+        self.update_input(LINE2_NAME, {"text": line2, "color": color})
         if num == 0:
-            self.set_input_settings(name, {"text": " +", "color": color}, True)
+            self.update_input(name, {"text": " +", "color": color})
         else:
-            self.set_input_settings(
-                name, {"text": f"{abs(num):d}", "color": color}, True
-            )
-        self.set_input_settings(name_o, {"text": " "}, True)
+            self.update_input(name, {"text": f"{abs(num):d}", "color": color})
+        self.update_input(name_o, {"text": " "})
         path = os.path.abspath(path)
-        self.set_input_settings(BK_NAME, {"file": path}, True)
-        self.set_source_enabled("main", GROUP_NAME, True)
-        time.sleep(animation)
-        time.sleep(duration)
-        self.set_source_enabled("main", GROUP_NAME, False)
-        time.sleep(animation)
+        self.update_input(BK_NAME, {"file": path})
+        self.set_source_enabled(MAIN_SCENE, GROUP_NAME, True)
+        try:
+            self.sleep(animation + duration)
+        finally:
+            # 取消时也要立即隐藏浮窗, 隐藏请求本身不可取消
+            token, self.token = self.token, None
+            try:
+                self.set_source_enabled(MAIN_SCENE, GROUP_NAME, False)
+            finally:
+                self.token = token
+        self.sleep(animation)
 
     def set_score(self, score: str):
-        MID_X = 625  # 文字的对齐中心X
-        Y = 963  # 文字的Y
+        anchor = self.layout_anchor("text_score")
         score = str(score)
-        self.set_input_settings("text_score", {"text": score}, True)
+        self.update_input("text_score", {"text": score})
         # time.sleep(0.15)
-        width = 35 * len(score)
+        width = SCORE_CHAR_WIDTH * len(score)
         if "." in score:
-            width -= 14
-        x = MID_X - width / 2
-        self.set_scene_item_transform(
-            "main",
-            self.find_source("main", "text_score")["sceneItemId"],
-            {"positionX": x, "positionY": Y},
-        )
+            width -= SCORE_DOT_WIDTH
+        self.move_item(MAIN_SCENE, "text_score", anchor.mid_x - width / 2, anchor.y)
 
     def set_player(self, name: str, avatar_path: str):
-        MID_X = 130  # 文字的对齐中心X
-        X_MIN = 28  # 文字的左换行边界
-        Y1 = 390  # 第一行文字的Y
-        Y2 = 377  # 第二行文字的Y
-        Y3 = 415  # 第三行文字的Y
-        Y2_ONLY = 395  # 只有第二行文字的Y
-
-        self.set_input_settings("icon_player", {"file": avatar_path}, True)
-        self.set_source_enabled("main", "text_player1", False)
-        self.set_source_enabled("main", "text_player2", False)
-        self.set_source_enabled("main", "text_player3", False)
-        self.set_input_settings("text_player1", {"text": name}, True)
-        time.sleep(0.15)
-        width = self.find_source("main", "text_player1", cache=False)[
-            "sceneItemTransform"
-        ]["width"]
-        x = MID_X - width / 2
-        if x >= X_MIN:
-            self.set_scene_item_transform(
-                "main",
-                self.find_source("main", "text_player1")["sceneItemId"],
-                {"positionX": x, "positionY": Y1},
-            )
-            self.set_source_enabled("main", "text_player1", True)
+        line1 = self.layout_anchor("text_player1")
+        line2 = self.layout_anchor("text_player2")
+        line3 = self.layout_anchor("text_player3")
+
+        self.update_input("icon_player", {"file": avatar_path})
+        missing = [name for name in PLAYER_TEXT_SOURCES if not self.has_source(name)]
+        if missing:
+            # 排版需要全部三个文字源, 缺少时不显示选手名
+            logger.debug(f"OBS player name skipped, missing {missing}")
             return
-        self.set_input_settings("text_player2", {"text": name}, True)
-        time.sleep(0.15)
-        width = self.find_source("main", "text_player2", cache=False)[
-            "sceneItemTransform"
-        ]["width"]
-        x = MID_X - width / 2
-        if x >= X_MIN:
-            self.set_scene_item_transform(
-                "main",
-                self.find_source("main", "text_player2")["sceneItemId"],
-                {"positionX": x, "positionY": Y2_ONLY},
-            )
-            self.set_source_enabled("main", "text_player2", True)
+        self.set_source_enabled(MAIN_SCENE, "text_player1", False)
+        self.set_source_enabled(MAIN_SCENE, "text_player2", False)
+        self.set_source_enabled(MAIN_SCENE, "text_player3", False)
+        # 宽度已缓存时直接摆放, 不再等待OBS排版
+        (width,) = self.text_widths([("text_player1", name)])
+        x = line1.mid_x - width / 2
+        if x >= PLAYER_X_MIN:
+            self.show_text("text_player1", name, x, line1.y)
             return
-        text1 = name[: len(name) // 2 + 1]
-        text2 = name[len(name) // 2 + 1 :]
-        self.set_input_settings("text_player2", {"text": text1}, True)
-        self.set_input_settings("text_player3", {"text": text2}, True)
-        time.sleep(0.15)
-        width1 = self.find_source("main", "text_player2", cache=False)[
-            "sceneItemTransform"
-        ]["width"]
-        width2 = self.find_source("main", "text_player3", cache=False)[
-            "sceneItemTransform"
-        ]["width"]
-        self.set_scene_item_transform(
-            "main",
-            self.find_source("main", "text_player2")["sceneItemId"],
-            {"positionX": MID_X - width1 / 2, "positionY": Y2},
-        )
-        self.set_scene_item_transform(
-            "main",
-            self.find_source("main", "text_player3")["sceneItemId"],
-            {"positionX": MID_X - width2 / 2, "positionY": Y3},
+        (width,) = self.text_widths([("text_player2", name)])
+        x = line2.mid_x - width / 2
+        if x >= PLAYER_X_MIN:
+            self.show_text("text_player2", name, x, PLAYER_Y_SINGLE)
+            return
+        text1, text2 = split_name(name)
+        width1, width2 = self.text_widths(
+            [("text_player2", text1), ("text_player3", text2)]
         )
-        self.set_source_enabled("main", "text_player2", True)
-        self.set_source_enabled("main", "text_player3", True)
+        self.show_text("text_player2", text1, line2.mid_x - width1 / 2, line2.y)
+        self.show_text("text_player3", text2, line3.mid_x - width2 / 2, line3.y)
 
     def set_start(self, team_path: str, operator_path: str):
         if team_path:
-            self.set_input_settings("icon_team", {"file": team_path}, True)
-            self.set_source_enabled("main", "icon_team", True)
+            self.update_input("icon_team", {"file": team_path})
+            self.set_source_enabled(MAIN_SCENE, "icon_team", True)
         else:
-            self.set_source_enabled("main", "icon_team", False)
+            self.set_source_enabled(MAIN_SCENE, "icon_team", False)
         if operator_path:
-            self.set_input_settings("icon_operator", {"file": operator_path}, True)
-            self.set_source_enabled("main", "icon_operator", True)
+            self.update_input("icon_operator", {"file": operator_path})
+            self.set_source_enabled(MAIN_SCENE, "icon_operator", True)
         else:
-            self.set_source_enabled("main", "icon_operator", False)
+            self.set_source_enabled(MAIN_SCENE, "icon_operator", False)
 
 
 class Worker(QObject):
@@ -220,65 +516,338 @@ class Worker(QObject):
         self.client = client
         self.action_queue = Queue()
         self.running = True
+        self.current: CancelToken = None  # 正在执行的动作的令牌
+        self.current_action = ""
+        self.failures = 0  # 连续失败次数
+        self.last_error = ""
 
-    def action(self, action: str, args: tuple, kwargs: dict):
-        self.action_queue.put((action, args, kwargs))
-        logger.debug(f"OBS Client received action: {action}")
+    def action(self, action: str, args: tuple, kwargs: dict) -> CancelToken:
+        token = CancelToken()
+        self.action_queue.put((action, args, kwargs, token))
+        logger.trace(f"OBS Client received action: {action}")
+        return token
 
     def stop(self):
-        self.running = False
-        while not self.action_queue.empty():
-            self.action_queue.get()
-        self.client.disconnect()
+        """
+        取消所有动作并唤醒工作线程, 工作线程退出时断开连接
+        """
         logger.info("OBS Client worker requested to stop")
+        self.running = False
+        self.clear(cancel_running=True)
+        self.action_queue.put(None)
 
-    def clear(self):
-        while not self.action_queue.empty():
-            self.action_queue.get()
-        logger.info("OBS Client queue cleared")
+    def clear(self, cancel_running: bool = False):
+        """
+        丢弃未开始的动作, 正在执行的弹窗在下一个请求或等待时中止
+
+        cancel_running: 中止任何正在执行的动作; 否则其他动作执行完, 如切换选手中途取消会留下隐藏的选手名
+        """
+        dropped = 0
+        while True:
+            try:
+                item = self.action_queue.get_nowait()
+            except QueueEmptyError:
+                break
+            if item is not None:
+                item[3].cancel()
+                dropped += 1
+        current = self.current
+        if current is not None and (
+            cancel_running or self.current_action in CLEAR_CANCELS
+        ):
+            current.cancel()
+        else:
+            current = None
+        logger.info(
+            f"OBS Client queue cleared: {dropped} dropped"
+            + (", running action cancelled" if current is not None else "")
+        )
 
     def run(self):
         logger.success("OBS Client worker started")
         while self.running:
             try:
-                action, args, kwargs = self.action_queue.get(timeout=1)
+                item = self.action_queue.get(timeout=1)
+            except QueueEmptyError:
+                continue
+            if item is None:
+                continue
+            action, args, kwargs, token = item
+            if token.cancelled:
+                continue
+            self.current = self.client.token = token
+            self.current_action = action
+            try:
                 logger.debug(f"OBS Client worker running: {action}")
                 getattr(self.client, action)(*args, **kwargs)
-            except (TimeoutError, QueueEmptyError):
-                pass
-            except Exception:
+                self.failures = 0
+            except Cancelled:
+                logger.info(f"OBS Client action cancelled: {action}")
+            except TimeoutError as e:
+                self.failures += 1
+                self.last_error = f"timeout: {e}"
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
                 logger.exception("Error in worker")
+            finally:
+                self.current = self.client.token = None
+                self.current_action = ""
+        self.client.disconnect()
         logger.info("OBS Client worker exited")
 
 
+class TextLayoutPrefill(QThread):
+    # 连接后在后台测量所有选手名的宽度并存入缓存, 之后切换选手时直接命中
+    # 使用独立的连接, 在临时场景中创建隐藏的文字源, 不占用动作队列, 也不改动直播的场景
+    def __init__(
+        self,
+        params: dict,
+        styles: dict[str, TextStyle],
+        cache: TextLayoutCache,
+        names: list[str],
+    ):
+        super().__init__()
+        self.params = params  # ReqClientEx 的连接参数
+        self.styles = styles
+        self.cache = cache
+        self.names = names
+        self.token = CancelToken()
+
+    def cancel(self):
+        self.token.cancel()
+
+    def jobs(self) -> dict[str, list[str]]:
+        """
+        每个文字源需要测量的文字, 已缓存的跳过
+        """
+        jobs: dict[str, list[str]] = {name: [] for name in self.styles}
+        for player in self.names:
+            for name, text in player_text_jobs(player):
+                style = self.styles.get(name)
+                if style is None or text in jobs[name]:
+                    continue
+                if self.cache.get(style.key, text) is None:
+                    jobs[name].append(text)
+        return jobs
+
+    def run(self):
+        try:
+            self.measure()
+        except Cancelled:
+            logger.info("OBS text layout prefill cancelled")
+        except Exception as e:
+            logger.warning(f"OBS text layout prefill failed: {e}")
+
+    def measure(self):
+        jobs = self.jobs()
+        total = sum(len(texts) for texts in jobs.values())
+        if not total:
+            logger.info(f"OBS text layouts of {len(self.names)} players all cached")
+            return
+        t0 = time.perf_counter()
+        client = ReqClientEx(**self.params)
+        client.token = self.token
+        inputs: dict[str, list[tuple[str, int]]] = {}  # 文字源 -> [(临时源, ID)]
+        scene_created = False
+        try:
+            # 上次异常退出时遗留的场景和源在连接时已删除 (见 remove_measure_leftovers)
+            client.create_scene(MEASURE_SCENE)
+            scene_created = True
+            for name, texts in jobs.items():
+                style = self.styles[name]
+                inputs[name] = []
+                for i in range(min(MEASURE_BATCH, len(texts))):
+                    input_name = f"{MEASURE_INPUT_PREFIX}{name}_{i}"
+                    response = client.create_input(
+                        MEASURE_SCENE, input_name, style.kind, style.settings, False
+                    )
+                    inputs[name].append((input_name, response.scene_item_id))
+            measured = 0
+            while any(jobs.values()):
+                batch = []
+                for name, texts in jobs.items():
+                    for input_name, item_id in inputs[name]:
+                        if not texts:
+                            break
+                        text = texts.pop()
+                        client.set_input_settings(input_name, {"text": text}, True)
+                        batch.append((name, item_id, text))
+                client.sleep(TEXT_MEASURE_DELAY)
+                for name, item_id, text in batch:
+                    transform = client.get_scene_item_transform(MEASURE_SCENE, item_id)
+                    style = self.styles[name]
+                    width = transform.scene_item_transform["sourceWidth"] * style.scale
+                    if width > 0:
+                        self.cache.put(style.key, text, width)
+                        measured += 1
+        finally:
+            client.token = None
+            for created in inputs.values():
+                for input_name, _ in created:
+                    try:
+                        client.remove_input(input_name)
+                    except Exception:
+                        pass
+            if scene_created:
+                try:
+                    client.remove_scene(MEASURE_SCENE)
+                except Exception:
+                    pass
+            client.disconnect()
+        logger.success(
+            f"OBS text layout prefill: {measured} texts for {len(self.names)} players "
+            f"in {time.perf_counter() - t0:.2f}s"
+        )
+
+
 class ReqClientExQThread(QThread):
-    def __init__(self, host: str, port: int, password: str, timeout: float):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        password: str,
+        timeout: float,
+        connection: tuple[ReqClientEx, obs.EventClient | None] = None,
+    ):
+        """
+        connection: 已在其他线程中建立的连接 (见 open), 为空时在这里连接
+        """
         self.inited = False
         super().__init__()
-        self.client = ReqClientEx(
-            host=host, port=port, password=password, timeout=timeout
-        )
+        self.address = f"{host}:{port}"
+        self.params = dict(host=host, port=port, password=password, timeout=timeout)
+        self.prefill: TextLayoutPrefill = None
+        if connection is None:
+            connection = self.open(host, port, password, timeout)
+        self.client, self.events = connection
         self.worker = Worker(self.client)
         self.worker_thread = QThread()
         self.worker.moveToThread(self.worker_thread)
         self.worker_thread.started.connect(self.worker.run)
         self.worker_thread.start()
-        self.inited = True
         self.paused = False
-        logger.success("OBS Client prepared")
+        if self.events is not None:
+            self.events.callback.register(
+                [self.on_input_settings_changed, self.on_scene_item_enable_state_changed]
+            )
+        self.inited = True
+        logger.success(f"OBS Client prepared: {self.address}")
 
     def __del__(self):
         if self.inited:
             self.stop()
 
-    def stop(self):
+    @staticmethod
+    def open(
+        host: str,
+        port: int,
+        password: str,
+        timeout: float,
+        collection: SceneLayout = None,
+        text_cache: TextLayoutCache = None,
+    ) -> tuple[ReqClientEx, obs.EventClient | None]:
+        """
+        建立请求连接和事件连接并读取场景的源表, 只涉及网络, 可以在任意线程中调用
+        """
+        client = ReqClientEx(host=host, port=port, password=password, timeout=timeout)
+        client.load_layout(collection)
+        client.text_cache = text_cache
+        client.load_text_styles()
+        try:
+            client.remove_measure_leftovers()
+        except Exception as e:
+            logger.warning(f"OBS leftover measure sources not removed: {e}")
+        return client, ReqClientExQThread.subscribe_events(host, port, password, timeout)
+
+    @staticmethod
+    def subscribe_events(
+        host: str, port: int, password: str, timeout: float
+    ) -> obs.EventClient | None:
+        """
+        订阅终端管理的源的修改事件, 不支持时只记录警告, 不影响正常使用
+        """
+        try:
+            events = obs.EventClient(
+                host=host,
+                port=port,
+                password=password,
+                timeout=timeout,
+                subs=obs.Subs.INPUTS | obs.Subs.SCENEITEMS,
+            )
+        except Exception as e:
+            logger.warning(f"OBS event subscription unavailable: {e}")
+            return None
+        logger.success("OBS event subscription started")
+        return events
+
+    # 以下回调在事件线程中执行, 修复操作放入队列, 与其他请求按顺序执行
+    # 终端自己写入产生的事件直接忽略, 否则排在后续写入之后的旧设置会被当作漂移
+    def on_input_settings_changed(self, data):
+        name = data.input_name
+        if name not in self.client.expected_settings:
+            return
+        if self.client.is_settings_echo(name, data.input_settings):
+            return
+        self.run_action("repair_input", name, data.input_settings)
+
+    def on_scene_item_enable_state_changed(self, data):
+        key = (data.scene_name, data.scene_item_id)
+        if key not in self.client.expected_enabled:
+            return
+        if self.client.is_enabled_echo(*key, data.scene_item_enabled):
+            return
+        self.run_action(
+            "repair_enabled",
+            data.scene_name,
+            data.scene_item_id,
+            data.scene_item_enabled,
+        )
+
+    def prefill_text_layouts(self, names: list[str]):
+        """
+        在后台测量选手名的宽度, 重复调用时取消上一次
+        """
+        if self.client.text_cache is None or not self.client.text_styles:
+            return
+        if self.prefill is not None:
+            self.prefill.cancel()
+            self.prefill.wait()
+        self.prefill = TextLayoutPrefill(
+            self.params, dict(self.client.text_styles), self.client.text_cache, names
+        )
+        self.prefill.start()
+
+    def stop(self, wait: bool = True):
+        self.inited = False  # 已经停止, 析构时不再重复停止
+        if self.events is not None:
+            self.events.disconnect()
+            self.events = None
+        if self.prefill is not None:
+            self.prefill.cancel()
         self.worker.stop()
         self.worker_thread.quit()
+        if wait:
+            self.wait_stopped()
+
+    def wait_stopped(self):
         self.worker_thread.wait()
+        if self.prefill is not None:
+            self.prefill.wait()
 
     def clear(self):
         self.worker.clear()
 
+    @property
+    def healthy(self) -> bool:
+        return self.worker.failures < UNHEALTHY_FAILURES
+
+    def status(self) -> str:
+        text = f"{self.address} 队列 {self.worker.action_queue.qsize()}"
+        if self.worker.failures:
+            text += f", 连续失败 {self.worker.failures} 次: {self.worker.last_error}"
+        return text
+
     @property
     def fake(self) -> ReqClientEx:
         return self
@@ -286,13 +855,136 @@ class ReqClientExQThread(QThread):
     def set_pause(self, pause: bool):
         self.paused = pause
 
-    def run_action(self, action: str, *args, **kwargs):
+    def run_action(self, action: str, *args, **kwargs) -> CancelToken | None:
         if not self.paused:
-            self.worker.action(action, args, kwargs)
+            return self.worker.action(action, args, kwargs)
+        return None
 
     def __getattr__(self, item):
         if item in dir(self.client):
-            logger.debug(f"OBS Try request: {item}")
+            logger.trace(f"OBS Try request: {item}")
             return lambda *args, **kwargs: self.run_action(item, *args, **kwargs)
         else:
             return super().__getattr__(item)
+
+
+def parse_endpoints(text: str, default_port: int) -> list[tuple[str, int]]:
+    """
+    "127.0.0.1, 192.168.1.20:4456" -> [("127.0.0.1", 默认端口), ("192.168.1.20", 4456)]
+    """
+    endpoints = []
+    for item in re.split(r"[,;\s]+", text.strip()):
+        if not item:
+            continue
+        host, sep, port = item.rpartition(":")
+        if not sep or not port.isdigit():
+            host, port = item, default_port
+        if (host, int(port)) not in endpoints:
+            endpoints.append((host, int(port)))
+    return endpoints
+
+
+class ReqClientExGroup:
+    # 同时控制多个OBS (如直播机和录制机), 每个OBS有独立的连接, 队列和工作线程
+    # 每个动作分发到所有OBS的队列后立即返回, 一个OBS卡住或断开不影响其他OBS
+    def __init__(self, clients: list[ReqClientExQThread]):
+        self.clients = clients
+
+    @classmethod
+    def connect(
+        cls,
+        endpoints: list[tuple[str, int]],
+        password: str,
+        timeout: float,
+        collection: SceneLayout = None,
+        text_cache: TextLayoutCache = None,
+    ) -> tuple["ReqClientExGroup", list[tuple[str, Exception]]]:
+        """
+        并行连接所有OBS, 总耗时取决于最慢的一个, 返回连接成功的组和失败列表
+        """
+        with ThreadPoolExecutor(max_workers=max(len(endpoints), 1)) as pool:
+            futures = [
+                pool.submit(
+                    ReqClientExQThread.open,
+                    host,
+                    port,
+                    password,
+                    timeout,
+                    collection,
+                    text_cache,
+                )
+                for host, port in endpoints
+            ]
+        clients, failures = [], []
+        for (host, port), future in zip(endpoints, futures):
+            try:
+                connection = future.result()
+            except Exception as e:
+                logger.error(f"OBS Client connection to {host}:{port} failed: {e}")
+                failures.append((f"{host}:{port}", e))
+                continue
+            clients.append(
+                ReqClientExQThread(host, port, password, timeout, connection)
+            )
+        return cls(clients), failures
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    def stop(self):
+        # 先通知所有工作线程退出, 再统一等待
+        for client in self.clients:
+            client.stop(wait=False)
+        for client in self.clients:
+            client.wait_stopped()
+
+    def clear(self):
+        for client in self.clients:
+            client.clear()
+
+    @property
+    def fake(self) -> "ReqClientExGroup":
+        return self
+
+    def set_pause(self, pause: bool):
+        for client in self.clients:
+            client.set_pause(pause)
+
+    def prefill_text_layouts(self, names: list[str]):
+        for client in self.clients:
+            client.prefill_text_layouts(names)
+
+    def point_web_lower(self, lower_url: Callable[[str], str | None]) -> list[str]:
+        """
+        各个OBS的字幕条指向 lower_url(OBS地址), 返回无法访问页面的OBS
+        """
+        unreachable = []
+        for client in self.clients:
+            url = lower_url(client.params["host"])
+            if url is None:
+                unreachable.append(client.address)
+            else:
+                client.run_action("point_web_lower", url)
+        return unreachable
+
+    def pending(self) -> int:
+        return sum(client.worker.action_queue.qsize() for client in self.clients)
+
+    def missing(self) -> dict[str, list[str]]:
+        """
+        各个OBS主场景中缺少的源
+        """
+        return {c.address: c.client.missing for c in self.clients if c.client.missing}
+
+    def unhealthy(self) -> list[ReqClientExQThread]:
+        return [client for client in self.clients if not client.healthy]
+
+    def status(self) -> str:
+        return "\n".join(client.status() for client in self.clients)
+
+    def __getattr__(self, item):
+        if item in dir(ReqClientEx):
+            return lambda *args, **kwargs: [
+                client.run_action(item, *args, **kwargs) for client in self.clients
+            ]
+        raise AttributeError(item)